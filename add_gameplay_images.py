@@ -6,6 +6,8 @@ Add the gameplay image to each course's additional images array
 import json
 from pathlib import Path
 
+from course_backend import open_course_store, save_course_store
+
 COURSES_FILE = Path('courses.json')
 PUBLIC_COURSES_FILE = Path('public') / 'courses.json'
 GAMEPLAY_IMAGE = 'Courses Gameplay.png'
@@ -41,8 +43,10 @@ def add_gameplay_image(courses):
 def main():
     # Load courses from source file
     print(f"Loading courses from {COURSES_FILE}...")
-    with open(COURSES_FILE, 'r', encoding='utf-8') as f:
-        courses = json.load(f)
+    # Through the app's catalog backend (COURSE_BACKEND), so edits still in courses.json.wal
+    # (or the SQLite database) are applied first and these ones are versioned like edits made in the app
+    store = open_course_store(COURSES_FILE)
+    courses = json.loads(json.dumps(store.all()))
     
     print(f"Found {len(courses)} courses")
     
@@ -51,8 +55,8 @@ def main():
     
     # Save updated courses
     print(f"\nSaving updated courses to {COURSES_FILE}...")
-    with open(COURSES_FILE, 'w', encoding='utf-8') as f:
-        json.dump(courses, f, indent=2, ensure_ascii=False)
+    store.commit([(course['id'], lambda current, course=course: course, None) for course in courses])
+    save_course_store(store, COURSES_FILE)
     
     print(f"✓ Updated {updated_count} courses with gameplay image")
     
@@ -1,24 +1,90 @@
+import hashlib
+import math
 import os
 import json
 import re
-import requests
-from flask import Flask, jsonify, send_from_directory, request
+import tempfile
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
 from bs4 import BeautifulSoup
 import urllib.parse
-import time
 from pathlib import Path
 
+from autocomplete import SOURCE_FIELDS as AUTOCOMPLETE_FIELDS, Autocomplete
+from course_backend import COURSE_BACKEND, open_course_store
+from course_query import CourseIndex, QueryError, parse_query, project, wants_query
+from course_store import DerivedValue, JsonFileCache, PatchError, VersionConflict
+import http_client
+from image_hash import NEAR_DUPLICATE_DISTANCE, FingerprintIndex, fingerprint_file, is_duplicate
+from image_store import ImageStore
+from image_variants import VariantCache, VariantError, negotiate_format, parse_variant_params
+from jobs import JobManager, process_items
+from map_clusters import ClusterIndex
+from media_files import IMMUTABLE, REVALIDATE, FileHasher, VideoLibrary, send_media
+from response_cache import PrecomputedJSON
+from search_cache import SearchCache
+from search_index import SearchIndex
+
 app = Flask(__name__)
 CORS(app)
 
 # Configuration
 BASE_DIR = Path(__file__).parent
-COURSES_FILE = BASE_DIR / 'courses.json'
-IMAGES_DIR = BASE_DIR / 'images'
+# Catalog, images, caches and job state live here (COURSE_DATA_DIR points the app at another copy, e.g. in tests)
+DATA_DIR = Path(os.environ.get('COURSE_DATA_DIR', BASE_DIR))
+COURSES_FILE = DATA_DIR / 'courses.json'
+IMAGES_DIR = DATA_DIR / 'images'
+DESCRIPTIONS_FILE = DATA_DIR / 'course_descriptions.json'
+CACHE_DIR = DATA_DIR / 'cache'
+JOBS_DIR = DATA_DIR / 'jobs'
+# Courses processed concurrently by the bulk jobs (politeness is enforced per host by http_client)
+BULK_WORKERS = int(os.environ.get('BULK_WORKERS', '8'))
+
+course_store = open_course_store(COURSES_FILE, COURSE_BACKEND)
+descriptions_cache = JsonFileCache(DESCRIPTIONS_FILE, default={})
+
+@app.before_request
+def refresh_course_store():
+    """Pick up catalog changes made by other processes once per request, not on every read"""
+    course_store.refresh()
+
+# Downloads are streamed here first (same filesystem, so the final rename is atomic)
+PARTIAL_DIR = IMAGES_DIR / '.partial'
 
 # Ensure images directory exists
 os.makedirs(IMAGES_DIR, exist_ok=True)
+os.makedirs(PARTIAL_DIR, exist_ok=True)
+
+# Content-addressed image blobs plus the (course_id, slot) -> blob table
+image_store = ImageStore(IMAGES_DIR)
+if image_store.legacy_files():
+    print(f"{IMAGES_DIR} has images under old {{course_id}}_{{slot}} names that the app ignores; run migrate_images.py to import them")
+# blob name -> (md5, perceptual hash, dimensions, format), persisted so dedupe checks never re-read images
+image_fingerprints = FingerprintIndex(image_store.blobs_dir, str(CACHE_DIR / 'image_fingerprints.sqlite3'))
+
+# Resized variants for /api/blobs/<name>?w=&h=&fit=, capped by total bytes (LRU)
+image_variants = VariantCache(
+    CACHE_DIR / 'variants',
+    max_bytes=int(os.environ.get('IMAGE_VARIANT_CACHE_BYTES', 512 * 1024 * 1024)),
+)
+
+# Content digests for ETags of variants and videos (originals use their fingerprint md5)
+media_hasher = FileHasher()
+# Video filename -> path across BASE_DIR (*.mp4), Videos/ and videos/
+video_library = VideoLibrary(BASE_DIR)
+# Videos are not content-addressed by URL; cache for a day, then revalidate by ETag
+VIDEO_CACHE_CONTROL = 'public, max-age=86400'
+
+# Course fields the editor may change (single and batch updates)
+EDITABLE_FIELDS = ('blurb', 'description')
+
+# Image search results shared by the picker, single downloads and bulk jobs
+image_search_cache = SearchCache(
+    str(CACHE_DIR / 'image_search.sqlite3'),
+    ttl=float(os.environ.get('SEARCH_CACHE_TTL', 7 * 24 * 3600)),
+    stale_while_revalidate=float(os.environ.get('SEARCH_CACHE_STALE', 30 * 24 * 3600)),
+    max_entries=int(os.environ.get('SEARCH_CACHE_MAX_ENTRIES', 5000)),
+)
 
 
 def json_error(message, status=400, detail=None):
@@ -29,40 +95,29 @@ def json_error(message, status=400, detail=None):
     return jsonify(payload), status
 
 def load_courses():
-    """Load courses from JSON file, resilient to cwd changes"""
-    try:
-        with open(COURSES_FILE, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"courses.json not found at {COURSES_FILE}")
-        return []
-
-def get_image_path(course_id, slot='hero', extension='.jpg'):
-    """
-    Get the path to an image for a course
-    slot can be 'hero', '1', or '2'
-    """
-    if slot == 'hero':
-        return IMAGES_DIR / f"{course_id}_hero{extension}"
-    else:
-        return IMAGES_DIR / f"{course_id}_{slot}{extension}"
+    """Return the cached course list (shared; copy a course before mutating it for a response)"""
+    return course_store.all()
 
 def find_image_paths(course_id):
     """
     Find all existing images for a course (hero, 1, 2)
-    Returns dict with 'hero', '1', '2' keys containing (path, extension) or None
+    Returns dict with 'hero', '1', '2' keys containing (blob path, extension) or None
     """
-    images = {'hero': None, '1': None, '2': None}
-    extensions = ['.jpg', '.jpeg', '.png', '.gif', '.webp']
-    
-    for slot in ['hero', '1', '2']:
-        for ext in extensions:
-            path = get_image_path(course_id, slot, ext)
-            if path.exists():
-                images[slot] = (path, ext)
-                break
-    
-    return images
+    return image_store.find(course_id)
+
+def release_blobs(blobs):
+    """Drop index and variant entries for blobs the store just deleted"""
+    for blob in blobs:
+        image_fingerprints.discard(blob)
+        image_variants.discard_source(blob)
+
+def clear_slot(course_id, slot):
+    """Empty an image slot (the blob is deleted once no other slot uses it)"""
+    release_blobs(image_store.clear(course_id, slot))
+
+def blob_url(path):
+    """URL of a stored blob; its content never changes, so it is served as immutable"""
+    return f"/api/blobs/{path.name}"
 
 def search_google_images(query, num_images=1):
     """
@@ -82,7 +137,7 @@ def search_google_images(query, num_images=1):
             'Connection': 'keep-alive',
         }
         
-        response = requests.get(url, headers=headers, timeout=15)
+        response = http_client.get(url, headers=headers)
         response.raise_for_status()
         
         soup = BeautifulSoup(response.text, 'html.parser')
@@ -156,8 +211,20 @@ def search_google_images(query, num_images=1):
         print(f"Error searching Google Images: {e}")
         return []
 
-def download_image(url, filepath, header_variants=None):
-    """Download an image from a URL and save it. Returns (success, actual_filepath, error_message)"""
+def course_search_query(course):
+    return f"{course['name']} {course['location']} golf course"
+
+def find_image_urls(course, num_images, refresh=False):
+    """Candidate image URLs for a course, served from the search cache when possible"""
+    return image_search_cache.fetch(course_search_query(course), num_images, search_google_images, refresh=refresh)
+
+def download_image(url, course_id, slot, header_variants=None, reject_hashes=None):
+    """
+    Download an image from a URL into a course's slot. Returns (success, blob_path, error_message, fingerprint)
+    The MD5 is computed while streaming into a temp file, which is moved into
+    the image store only if it is not an exact or near duplicate of any
+    fingerprint in reject_hashes (so duplicates never land on disk)
+    """
     # Build header attempts
     default_headers = {
         'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
@@ -169,134 +236,333 @@ def download_image(url, filepath, header_variants=None):
 
     last_err = None
     for hdrs in attempts:
+        tmp_path = None
         try:
             headers = default_headers.copy()
             headers.update(hdrs)
-            response = requests.get(url, headers=headers, timeout=15, stream=True, allow_redirects=True)
-            response.raise_for_status()
+            # Context manager returns the connection to the shared pool even on early exit
+            with http_client.get(url, headers=headers, stream=True, allow_redirects=True) as response:
+                response.raise_for_status()
             
-            content_type = response.headers.get('content-type', '').lower()
-            if 'image' not in content_type:
-                last_err = f"Content-Type not image: {content_type}"
-                continue
-            
-            extension = '.jpg'
-            if 'png' in content_type:
-                extension = '.png'
-            elif 'gif' in content_type:
-                extension = '.gif'
-            elif 'webp' in content_type:
-                extension = '.webp'
-            elif url.lower().endswith(('.png', '.gif', '.webp', '.jpeg')):
-                url_ext = Path(url).suffix.lower()
-                if url_ext:
-                    extension = url_ext
+                content_type = response.headers.get('content-type', '').lower()
+                if 'image' not in content_type:
+                    last_err = f"Content-Type not image: {content_type}"
+                    continue
             
-            actual_filepath = filepath
-            if extension != filepath.suffix:
-                actual_filepath = filepath.with_suffix(extension)
+                extension = '.jpg'
+                if 'png' in content_type:
+                    extension = '.png'
+                elif 'gif' in content_type:
+                    extension = '.gif'
+                elif 'webp' in content_type:
+                    extension = '.webp'
+                elif url.lower().endswith(('.png', '.gif', '.webp', '.jpeg')):
+                    url_ext = Path(url).suffix.lower()
+                    if url_ext:
+                        extension = url_ext
             
-            with open(actual_filepath, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
+                digest = hashlib.md5()
+                size = 0
+                fd, tmp_path = tempfile.mkstemp(dir=PARTIAL_DIR, prefix=f"{course_id}_{slot}.", suffix='.part')
+                with os.fdopen(fd, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=8192):
+                        if chunk:
+                            digest.update(chunk)
+                            size += len(chunk)
+                            f.write(chunk)
             
-            if actual_filepath.exists() and actual_filepath.stat().st_size > 0:
-                return (True, actual_filepath, None)
-            else:
-                if actual_filepath.exists():
-                    actual_filepath.unlink()
+            if size == 0:
                 last_err = "Empty file"
+                continue
+            fingerprint = fingerprint_file(tmp_path, md5=digest.hexdigest())
+            if reject_hashes and is_duplicate(fingerprint, reject_hashes):
+                # Same picture from another header variant won't help; let the caller try the next URL
+                return (False, None, "Duplicate image", fingerprint)
+            blob, released = image_store.put(course_id, slot, tmp_path, fingerprint.md5, extension)
+            tmp_path = None
+            release_blobs(released)
+            blob_path = image_store.blob_path(blob)
+            image_fingerprints.add(blob_path, fingerprint)
+            image_variants.pregenerate(blob_path)
+            return (True, blob_path, None, fingerprint)
         except Exception as e:
             print(f"Error downloading image from {url}: {e}")
             last_err = str(e)
-            if filepath.exists():
-                try:
-                    filepath.unlink()
-                except:
-                    pass
             continue
+        finally:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
 
-    return (False, None, last_err)
+    return (False, None, last_err, None)
 
 def load_descriptions():
-    """Load course descriptions from JSON file if it exists"""
-    descriptions_file = BASE_DIR / 'course_descriptions.json'
-    if descriptions_file.exists():
-        try:
-            with open(descriptions_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+    """Return cached course descriptions (empty if the file is missing)"""
+    return descriptions_cache.data
 
-@app.route('/api/courses', methods=['GET'])
-def get_courses():
-    """Get all courses with their image status"""
-    courses = load_courses()
-    descriptions = load_descriptions()
+def decorate_course(stored, descriptions, version=None):
+    """Copy a stored course and add its image status, version and description"""
+    # Shallow copy so the shared store is not polluted with response-only keys
+    course = dict(stored)
+    # Check for images in all slots
+    image_paths = find_image_paths(course['id'])
     
-    # Add image status and descriptions to each course
-    for course in courses:
-        # Check for images in all slots
-        image_paths = find_image_paths(course['id'])
-        
-        # Build images object
-        images = {
-            'hero': None,
-            'additional': []
-        }
-        
-        # Hero image
-        if image_paths['hero']:
-            path, ext = image_paths['hero']
-            images['hero'] = f"/api/images/{path.name}"
-        
-        # Additional images
-        for slot in ['1', '2']:
-            if image_paths[slot]:
-                path, ext = image_paths[slot]
-                images['additional'].append(f"/api/images/{path.name}")
-        
-        course['images'] = images
-        
-        # Backward compatibility: set hasImage and imageUrl from hero
-        course['hasImage'] = images['hero'] is not None
-        course['imageUrl'] = images['hero']
-        
-        # Add descriptions if available
-        if course['id'] in descriptions:
-            course['blurb'] = descriptions[course['id']]
+    # Build images object
+    images = {
+        'hero': None,
+        'additional': []
+    }
+    
+    # Hero image
+    if image_paths['hero']:
+        path, ext = image_paths['hero']
+        images['hero'] = blob_url(path)
+    
+    # Additional images
+    for slot in ['1', '2']:
+        if image_paths[slot]:
+            path, ext = image_paths[slot]
+            images['additional'].append(blob_url(path))
+    
+    course['images'] = images
     
-    return jsonify(courses)
+    # Backward compatibility: set hasImage and imageUrl from hero
+    course['hasImage'] = images['hero'] is not None
+    course['imageUrl'] = images['hero']
+    # Sent back with edits so a stale edit is rejected (409) instead of overwriting a newer one
+    course['version'] = course_store.course_version(course['id']) if version is None else version
+    
+    # Add descriptions if available
+    if course['id'] in descriptions:
+        course['blurb'] = descriptions[course['id']]
+    
+    return course
+
+def build_course_payload():
+    """Merge courses with their image status and descriptions"""
+    descriptions = load_descriptions()
+    return [decorate_course(stored, descriptions) for stored in load_courses()]
+
+def course_payload_version():
+    """Cheap key that changes whenever any input of build_course_payload changes"""
+    return (
+        course_store.signature, course_store.version,
+        descriptions_cache.signature, descriptions_cache.version,
+        image_store.version,
+    )
+
+# Serialized and compressed once per version; the editor polls this constantly
+courses_response = PrecomputedJSON(build_course_payload, course_payload_version)
+
+# Facet/range/sort indexes over the same payload, rebuilt with it
+course_index = DerivedValue(lambda entry: CourseIndex(entry.payload, entry.version))
+
+def current_course_index():
+    entry = courses_response.current()
+    return course_index.get(entry.version, entry)
+
+def course_text_version():
+    """Like course_payload_version, minus the image table (images are not searchable)"""
+    return (
+        course_store.signature, course_store.version,
+        descriptions_cache.signature, descriptions_cache.version,
+    )
+
+def build_search_index():
+    index = SearchIndex()
+    index.build(courses_response.current().payload)
+    return index
+
+# Full-text index; rebuilt if the files change underneath us, patched in place by update_course
+search_index = DerivedValue(build_search_index)
+
+def current_search_index():
+    return search_index.get(course_text_version())
+
+def reindex_courses(index, courses):
+    """
+    Patch edited courses into `index`, fetched before the edit was committed
+    (the edit changes the catalog version, so fetching it afterwards would
+    rebuild it from scratch), and key it to the new version
+    """
+    descriptions = load_descriptions()
+    for course in courses:
+        index.update(decorate_course(course, descriptions))
+    search_index.touch(course_text_version())
+
+# Prefix index over names/locations/architects; blurb and description edits leave it alone
+autocomplete_index = DerivedValue(lambda: Autocomplete(load_courses()))
+
+def current_autocomplete():
+    return autocomplete_index.get(course_store.fields_version(AUTOCOMPLETE_FIELDS))
+
+# Marker cluster pyramid; catalog changes only recompute the cells they touch
+map_clusters = ClusterIndex()
+
+def current_clusters():
+    map_clusters.sync(load_courses(), key=(course_store.signature, course_store.version))
+    return map_clusters
+
+@app.route('/api/courses', methods=['GET'])
+def get_courses():
+    """
+    Get all courses with their image status (answers If-None-Match with 304)
+    With any filter/sort/cursor/limit/fields parameter, returns one page:
+    {'courses': [...], 'total': n, 'nextCursor': token or null}
+    """
+    if not wants_query(request.args):
+        return courses_response.respond(request)
+    try:
+        params = parse_query(request.args)
+        if COURSE_BACKEND == 'sqlite':
+            # Filtered, sorted and paged in SQL; only the returned page is decorated
+            descriptions = load_descriptions()
+            return jsonify(course_store.db.query(
+                params, decorate=lambda stored, version: decorate_course(stored, descriptions, version)))
+        return jsonify(current_course_index().query(params))
+    except QueryError as e:
+        return json_error('Invalid query', 400, str(e))
+
+@app.route('/api/courses/near', methods=['GET'])
+def courses_near():
+    """
+    Courses nearest a point: ?lat=&lng=&radius_km=&k=&fields=
+    At least one of radius_km or k is required; results carry distanceKm
+    """
+    try:
+        lat = float(request.args['lat'])
+        lng = float(request.args['lng'])
+        radius_km = float(request.args['radius_km']) if request.args.get('radius_km') else None
+        k = int(request.args['k']) if request.args.get('k') else None
+    except (KeyError, ValueError):
+        return json_error('lat and lng are required; radius_km and k must be numbers', 400)
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return json_error('lat/lng out of range', 400)
+    if radius_km is None and not k:
+        return json_error('Provide radius_km, k, or both', 400)
+    if k is not None:
+        k = max(1, min(k, 500))
+    fields = None
+    if request.args.get('fields'):
+        fields = ['id'] + [f.strip() for f in request.args['fields'].split(',') if f.strip()]
+
+    index = current_course_index()
+    results = []
+    for i, distance in index.spatial.near(lat, lng, radius_km=radius_km, k=k):
+        course = dict(project(index.courses[i], fields))
+        course['distanceKm'] = round(distance, 3)
+        results.append(course)
+    return jsonify({'courses': results, 'total': len(results)})
+
+@app.route('/api/map/clusters', methods=['GET'])
+def get_map_clusters():
+    """Precomputed marker clusters for a viewport: ?bbox=west,south,east,north&zoom="""
+    try:
+        west, south, east, north = (float(v) for v in request.args.get('bbox', '-180,-90,180,90').split(','))
+        zoom = int(request.args.get('zoom', 0))
+    except ValueError:
+        return json_error('bbox must be west,south,east,north and zoom an integer', 400)
+    if not all(math.isfinite(v) for v in (west, south, east, north)) or south > north:
+        return json_error('bbox must be four finite numbers west,south,east,north with south <= north', 400)
+    clusters = current_clusters().query(west, south, east, north, zoom)
+    return jsonify({'zoom': zoom, 'clusters': clusters})
+
+@app.route('/api/search', methods=['GET'])
+def search_courses():
+    """
+    Ranked full-text search over names, locations, architects and blurbs
+    ?q=...&limit=20&prefix=1 (last term matches as a prefix)&fields=...
+    """
+    query = request.args.get('q', '')
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), 100))
+    except ValueError:
+        return json_error('limit must be an integer', 400)
+    prefix = request.args.get('prefix', '1').lower() not in ('0', 'false', 'no')
+    if request.args.get('fields'):
+        fields = ['id'] + [f.strip() for f in request.args['fields'].split(',') if f.strip()]
+    else:
+        fields = ['id', 'name', 'location', 'rating', 'imageUrl']
+
+    index = current_course_index()
+    results = []
+    for course_id, score in current_search_index().search(query, limit=limit, prefix=prefix):
+        i = index.position.get(course_id)
+        if i is None:
+            continue
+        result = dict(project(index.courses[i], fields))
+        result['score'] = round(score, 4)
+        results.append(result)
+    return jsonify({'query': query, 'results': results})
+
+@app.route('/api/autocomplete', methods=['GET'])
+def autocomplete():
+    """Top-rated completions for course names, locations and architects (?q=prefix)"""
+    index = current_autocomplete()
+    return jsonify({'suggestions': [index.describe(e) for e in index.complete(request.args.get('q', ''))]})
+
+@app.route('/api/autocomplete/stats', methods=['GET'])
+def autocomplete_stats():
+    """Size of the autocomplete index, including bytes per 100k entries"""
+    return jsonify(current_autocomplete().memory_usage())
+
+def serve_image(source, md5, cache_control):
+    """
+    Send a stored image (?w=&h=&fit=contain|cover for a resized variant).
+    Clients that accept AVIF/WebP get a transcoded variant; the response varies on Accept.
+    """
+    try:
+        params = parse_variant_params(request.args)
+    except VariantError as e:
+        return json_error(str(e))
+    fmt = negotiate_format(request.accept_mimetypes, source)
+    if params is None and fmt is None:
+        response = send_media(source, media_hasher, cache_control, digest=md5)
+    else:
+        width, height, fit = params or (None, None, 'contain')
+        try:
+            variant = image_variants.get(source, width, height, fit, fmt=fmt)
+        except (OSError, ValueError) as e:
+            return json_error('Could not resize image', 500, str(e))
+        digest = md5 if variant == source else None
+        response = send_media(variant, media_hasher, cache_control, digest=digest)
+    response.vary.add('Accept')
+    return response
+
+@app.route('/api/blobs/<name>', methods=['GET'])
+def get_blob(name):
+    """Serve an image blob by content hash; the URL never changes meaning, so it is immutable"""
+    source = image_store.resolve_blob(name)
+    if source is None:
+        return jsonify({'error': 'Image not found'}), 404
+    return serve_image(source, source.stem, IMMUTABLE)
 
 @app.route('/api/images/<filename>', methods=['GET'])
 def get_image(filename):
-    """Serve images from the images directory"""
-    # Support various image extensions
-    image_path = IMAGES_DIR / filename
-    if not image_path.exists():
-        # Try different extensions
-        base_name = Path(filename).stem
-        for ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp']:
-            alt_path = IMAGES_DIR / f"{base_name}{ext}"
-            if alt_path.exists():
-                return send_from_directory(IMAGES_DIR, alt_path.name)
+    """
+    Serve the image currently in a slot by its old-style {course_id}_{slot}{ext}
+    name (any extension). What the name points at changes, so clients revalidate.
+    """
+    source = image_store.resolve(filename)
+    if source is None or not source.exists():
         return jsonify({'error': 'Image not found'}), 404
-    return send_from_directory(IMAGES_DIR, filename)
+    return serve_image(source, source.stem, REVALIDATE)
+
+@app.route('/api/images/variants/stats', methods=['GET'])
+def image_variant_stats():
+    """Size of the resized-variant cache"""
+    return jsonify(image_variants.stats())
 
 @app.route('/api/search-images/<course_id>', methods=['GET'])
 def search_images(course_id):
     """Return a list of candidate image URLs for a course without downloading"""
     limit = int(request.args.get('limit', 20))  # Default to 20 instead of 6
-    courses = load_courses()
-    course = next((c for c in courses if c['id'] == course_id), None)
+    course = course_store.get(course_id)
     if not course:
         return jsonify({'error': 'Course not found'}), 404
 
-    search_query = f"{course['name']} {course['location']} golf course"
-    # Search for more images to ensure we have enough unique ones
-    image_urls = search_google_images(search_query, num_images=limit * 2)  # Get more to filter duplicates
+    # Search for more images to ensure we have enough unique ones (?refresh=1 bypasses the cache)
+    refresh = request.args.get('refresh', '').lower() in ('1', 'true', 'yes')
+    image_urls = find_image_urls(course, num_images=limit * 2, refresh=refresh)  # Get more to filter duplicates
     # Deduplicate while preserving order
     seen = set()
     deduped = []
@@ -317,8 +583,7 @@ def download_course_image(course_id, slot='hero'):
         if slot not in ['hero', '1', '2']:
             return json_error('Invalid slot. Must be hero, 1, or 2', 400)
         
-        courses = load_courses()
-        course = next((c for c in courses if c['id'] == course_id), None)
+        course = course_store.get(course_id)
         
         if not course:
             return json_error('Course not found', 404)
@@ -333,18 +598,13 @@ def download_course_image(course_id, slot='hero'):
                 if img_hash:
                     existing_hashes.append(img_hash)
         
-        # Create search query from course name and location
-        search_query = f"{course['name']} {course['location']} golf course"
-        
         # Search for more images to ensure we can find a unique one
-        image_urls = search_google_images(search_query, num_images=15)
+        image_urls = find_image_urls(course, num_images=15)
         
         if not image_urls:
             return json_error('No images found', 404)
         
         # Try to download a unique image
-        # Start with .jpg extension, download_image will adjust if needed
-        image_path = get_image_path(course_id, slot, '.jpg')
         success = False
         actual_filepath = None
         
@@ -358,29 +618,22 @@ def download_course_image(course_id, slot='hero'):
                 {'Referer': domain_referer} if domain_referer else {},
                 {'Referer': ''},
             ]
-            success, actual_filepath, err = download_image(url, image_path, header_variants=header_variants)
+            # Duplicates of existing images are rejected before they are written
+            success, actual_filepath, err, _ = download_image(
+                url, course_id, slot, header_variants=header_variants, reject_hashes=existing_hashes
+            )
             
             if success and actual_filepath:
-                # Check if this image is different from existing ones
-                new_hash = get_image_hash(actual_filepath)
-                if new_hash and new_hash not in existing_hashes:
-                    # Unique image, we're done
-                    break
-                else:
-                    # Duplicate image, delete it and try next
-                    if actual_filepath.exists():
-                        actual_filepath.unlink()
-                    success = False
-                    actual_filepath = None
+                # Unique image, we're done
+                break
             
             error_msg = err
-            time.sleep(0.5)  # Small delay between attempts
         
         if success and actual_filepath:
             return jsonify({
                 'success': True,
                 'message': 'Image downloaded successfully',
-                'imageUrl': f"/api/images/{actual_filepath.name}",
+                'imageUrl': blob_url(actual_filepath),
                 'slot': slot
             })
         else:
@@ -403,12 +656,10 @@ def download_from_url(course_id):
         if slot not in ['hero', '1', '2']:
             return json_error('Invalid slot. Must be hero, 1, or 2', 400)
 
-        courses = load_courses()
-        course = next((c for c in courses if c['id'] == course_id), None)
+        course = course_store.get(course_id)
         if not course:
             return json_error('Course not found', 404)
 
-        image_path = get_image_path(course_id, slot, '.jpg')
         # Try with Google referer, then domain referer, then blank referer
         parsed = urllib.parse.urlparse(url)
         domain_referer = f"{parsed.scheme}://{parsed.netloc}/" if parsed.scheme and parsed.netloc else ''
@@ -417,13 +668,13 @@ def download_from_url(course_id):
             {'Referer': domain_referer} if domain_referer else {},
             {'Referer': ''},
         ]
-        success, actual_filepath, err = download_image(url, image_path, header_variants=header_variants)
+        success, actual_filepath, err, _ = download_image(url, course_id, slot, header_variants=header_variants)
 
         if success and actual_filepath:
             return jsonify({
                 'success': True,
                 'message': 'Image downloaded successfully',
-                'imageUrl': f"/api/images/{actual_filepath.name}",
+                'imageUrl': blob_url(actual_filepath),
                 'slot': slot
             })
         return json_error('Failed to download image', 500, err)
@@ -437,58 +688,78 @@ def regenerate_image(course_id, slot='hero'):
     if slot not in ['hero', '1', '2']:
         return json_error('Invalid slot. Must be hero, 1, or 2', 400)
     
-    # Delete existing image for this slot if it exists (try all extensions)
-    for ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp']:
-        image_path = get_image_path(course_id, slot, ext)
-        if image_path.exists():
-            image_path.unlink()
+    # Empty the slot first so the old image is not offered back as a candidate
+    clear_slot(course_id, slot)
     
     # Download new image
     return download_course_image(course_id, slot)
 
-@app.route('/api/download-all', methods=['POST'])
-def download_all_images():
-    """Download images for all courses that don't have images yet"""
-    courses = load_courses()
-    results = []
+def fill_hero_image(course):
+    """
+    Download a hero image for a course that has none
+    Returns the result entry, or None if the course already has a hero image
+    """
+    # Check if image already exists with any extension
+    if find_image_paths(course['id'])['hero'] is not None:
+        return None
     
-    for course in courses:
-        # Check if image already exists with any extension
-        has_image = False
-        for ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp']:
-            if get_image_path(course['id'], 'hero', ext).exists():
-                has_image = True
-                break
-        
-        if not has_image:
-            search_query = f"{course['name']} {course['location']} golf course"
-            image_urls = search_google_images(search_query, num_images=5)
-            
-            success = False
-            image_path = get_image_path(course['id'], 'hero', '.jpg')
-            for url in image_urls:
-                success, _, _ = download_image(url, image_path)
-                if success:
-                    break
-                time.sleep(0.5)
-            
-            results.append({
-                'courseId': course['id'],
-                'courseName': course['name'],
-                'success': success
-            })
-            
-            time.sleep(1)  # Rate limiting
+    image_urls = find_image_urls(course, num_images=5)
     
-    return jsonify(results)
+    success = False
+    for url in image_urls:
+        success, _, _, _ = download_image(url, course['id'], 'hero')
+        if success:
+            break
+    
+    return {
+        'courseId': course['id'],
+        'courseName': course['name'],
+        'success': success
+    }
+
+def course_failure(course, error):
+    """Job result entry for a course whose handler raised (the job carries on with the next one)"""
+    return {
+        'courseId': course['id'],
+        'courseName': course.get('name'),
+        'success': False,
+        'error': str(error)
+    }
+
+def run_download_all(job):
+    """Job handler: hero images for all courses that don't have images yet"""
+    courses = load_courses()
+    job.set_total(len(courses))
+    process_items(
+        job, courses,
+        item_id=lambda course: course['id'],
+        work=fill_hero_image,
+        is_success=lambda result: bool(result and result['success']),
+        workers=BULK_WORKERS,
+        failed=course_failure,
+    )
+
+def start_job(kind):
+    """Start (or join) a background job and return its handle immediately"""
+    job = job_manager.submit(kind)
+    return jsonify({
+        'jobId': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'statusUrl': f"/api/jobs/{job.id}",
+        'eventsUrl': f"/api/jobs/{job.id}/events"
+    }), 202
+
+@app.route('/api/download-all', methods=['POST'])
+def download_all_images():
+    """Download images for all courses that don't have images yet (background job)"""
+    return start_job('download-all')
 
 def get_image_hash(filepath):
-    """Get a simple hash of image file for comparison"""
+    """Get the indexed fingerprint of an image file for comparison (no image I/O unless the file changed)"""
     try:
-        import hashlib
-        with open(filepath, 'rb') as f:
-            return hashlib.md5(f.read()).hexdigest()
-    except:
+        return image_fingerprints.get(filepath)
+    except OSError:
         return None
 
 def images_are_different(image_paths):
@@ -502,152 +773,239 @@ def images_are_different(image_paths):
         path, _ = path_tuple
         img_hash = get_image_hash(path)
         if img_hash:
-            if img_hash in hashes:
-                return False  # Duplicate found
+            if is_duplicate(img_hash, hashes):
+                return False  # Duplicate (or near-duplicate) found
             hashes.append(img_hash)
     
     return True  # All images are different
 
-@app.route('/api/download-secondary-images', methods=['POST'])
-def download_secondary_images():
-    """Download secondary images (slots 1 and 2) for all courses that have hero images"""
-    courses = load_courses()
-    results = []
+def fill_secondary_images(course):
+    """
+    Download secondary images (slots 1 and 2) for a course that has a hero image
+    Returns the result entry, or None if there was nothing to do
+    """
+    # Check if hero image exists
+    image_paths = find_image_paths(course['id'])
+    if not image_paths['hero']:
+        return None  # Skip courses without hero images
     
-    for course in courses:
-        # Check if hero image exists
-        has_hero = False
-        for ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp']:
-            if get_image_path(course['id'], 'hero', ext).exists():
-                has_hero = True
-                break
-        
-        if not has_hero:
-            continue  # Skip courses without hero images
-        
-        # Check which secondary slots need images
-        image_paths = find_image_paths(course['id'])
-        slots_to_download = []
-        
-        if not image_paths['1']:
-            slots_to_download.append('1')
-        if not image_paths['2']:
-            slots_to_download.append('2')
-        
-        if not slots_to_download:
-            # Check if existing images are different, if not, regenerate
-            if not images_are_different(image_paths):
-                # Find which images are duplicates and regenerate them
-                existing_paths = {k: v for k, v in image_paths.items() if v}
-                hashes = {}
-                duplicates = []
-                
-                for slot, path_tuple in existing_paths.items():
-                    path, _ = path_tuple
-                    img_hash = get_image_hash(path)
-                    if img_hash:
-                        if img_hash in hashes.values():
-                            # This is a duplicate
-                            duplicates.append(slot)
-                        else:
-                            hashes[slot] = img_hash
-                
-                # Regenerate duplicate images
-                for dup_slot in duplicates:
-                    slots_to_download.append(dup_slot)
-                    # Delete the duplicate
-                    path, ext = image_paths[dup_slot]
-                    if path.exists():
-                        path.unlink()
+    # Check which secondary slots need images
+    slots_to_download = []
+    
+    if not image_paths['1']:
+        slots_to_download.append('1')
+    if not image_paths['2']:
+        slots_to_download.append('2')
+    
+    if not slots_to_download:
+        # Check if existing images are different, if not, regenerate
+        if not images_are_different(image_paths):
+            # Find which images are duplicates and regenerate them
+            existing_paths = {k: v for k, v in image_paths.items() if v}
+            hashes = {}
+            duplicates = []
             
-            if not slots_to_download:
-                continue  # All images exist and are different
-        
-        # Search for more images to ensure we have enough unique ones
-        search_query = f"{course['name']} {course['location']} golf course"
-        image_urls = search_google_images(search_query, num_images=20)
-        
-        # Download images for missing slots, ensuring uniqueness
-        slot_results = {}
-        url_index = 0
-        downloaded_hashes = []
-        
-        # Get hashes of existing images to avoid duplicates
-        for slot, path_tuple in image_paths.items():
-            if path_tuple:
+            for slot, path_tuple in existing_paths.items():
                 path, _ = path_tuple
                 img_hash = get_image_hash(path)
                 if img_hash:
-                    downloaded_hashes.append(img_hash)
-        
-        for slot in slots_to_download:
-            success = False
-            image_path = get_image_path(course['id'], slot, '.jpg')
-            attempts = 0
-            max_attempts = min(15, len(image_urls))  # Try up to 15 URLs
-            
-            # Try to download from available URLs, ensuring uniqueness
-            for i in range(url_index, min(url_index + max_attempts, len(image_urls))):
-                url = image_urls[i]
-                success, actual_filepath, _ = download_image(url, image_path)
-                
-                if success and actual_filepath:
-                    # Check if this image is different from existing ones
-                    new_hash = get_image_hash(actual_filepath)
-                    if new_hash and new_hash not in downloaded_hashes:
-                        downloaded_hashes.append(new_hash)
-                        url_index = i + 1
-                        break
+                    if is_duplicate(img_hash, hashes.values()):
+                        # This is a duplicate
+                        duplicates.append(slot)
                     else:
-                        # Duplicate image, delete it and try next
-                        if actual_filepath.exists():
-                            actual_filepath.unlink()
-                        success = False
-                        attempts += 1
-                        if attempts >= max_attempts:
-                            break
-                else:
-                    attempts += 1
-                    if attempts >= max_attempts:
-                        break
-                time.sleep(0.5)
+                        hashes[slot] = img_hash
             
-            slot_results[slot] = success
+            # Regenerate duplicate images
+            for dup_slot in duplicates:
+                slots_to_download.append(dup_slot)
+                # Empty the duplicate slot (the blob stays while another slot uses it)
+                clear_slot(course['id'], dup_slot)
         
-        results.append({
-            'courseId': course['id'],
-            'courseName': course['name'],
-            'slot1': slot_results.get('1', False),
-            'slot2': slot_results.get('2', False)
-        })
+        if not slots_to_download:
+            return None  # All images exist and are different
+    
+    # Search for more images to ensure we have enough unique ones
+    image_urls = find_image_urls(course, num_images=20)
+    
+    # Download images for missing slots, ensuring uniqueness
+    slot_results = {}
+    url_index = 0
+    downloaded_hashes = []
+    
+    # Get hashes of existing images to avoid duplicates
+    for slot, path_tuple in image_paths.items():
+        if path_tuple:
+            path, _ = path_tuple
+            img_hash = get_image_hash(path)
+            if img_hash:
+                downloaded_hashes.append(img_hash)
+    
+    for slot in slots_to_download:
+        success = False
+        attempts = 0
+        max_attempts = min(15, len(image_urls))  # Try up to 15 URLs
         
-        time.sleep(1)  # Rate limiting
+        # Try to download from available URLs, ensuring uniqueness
+        for i in range(url_index, min(url_index + max_attempts, len(image_urls))):
+            url = image_urls[i]
+            # Duplicates of images already in the course are rejected before they are written
+            success, actual_filepath, _, new_hash = download_image(url, course['id'], slot, reject_hashes=downloaded_hashes)
+            
+            if success and actual_filepath:
+                downloaded_hashes.append(new_hash)
+                url_index = i + 1
+                break
+            else:
+                attempts += 1
+                if attempts >= max_attempts:
+                    break
+        
+        slot_results[slot] = success
     
-    return jsonify(results)
+    return {
+        'courseId': course['id'],
+        'courseName': course['name'],
+        'slot1': slot_results.get('1', False),
+        'slot2': slot_results.get('2', False)
+    }
+
+def run_download_secondary(job):
+    """Job handler: secondary images for all courses that have hero images"""
+    courses = load_courses()
+    job.set_total(len(courses))
+    process_items(
+        job, courses,
+        item_id=lambda course: course['id'],
+        work=fill_secondary_images,
+        is_success=lambda result: bool(result and (result['slot1'] or result['slot2'])),
+        workers=BULK_WORKERS,
+        failed=course_failure,
+    )
+
+@app.route('/api/download-secondary-images', methods=['POST'])
+def download_secondary_images():
+    """Download secondary images (slots 1 and 2) for all courses that have hero images (background job)"""
+    return start_job('download-secondary')
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """Summaries of known background jobs, newest first"""
+    return jsonify([job.summary() for job in job_manager.list()])
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status, progress and results of a background job (?results=0 to omit the results)"""
+    job = job_manager.get(job_id)
+    if not job:
+        return json_error('Job not found', 404)
+    return jsonify(job.to_json(include_results=request.args.get('results') != '0'))
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """
+    Server-Sent Events stream of a job's per-course results as they complete.
+    Each 'result' event carries the result entry plus running progress
+    (processed/total, rate in courses per second, ETA in seconds) and uses the
+    result's sequence number as its id, so a reconnecting EventSource resumes
+    after Last-Event-ID. 'progress' events keep the ETA fresh between results;
+    a final 'done' event carries the job summary.
+    """
+    job = job_manager.get(job_id)
+    if not job:
+        return json_error('Job not found', 404)
+    after = request.headers.get('Last-Event-ID') or request.args.get('lastEventId') or '0'
+    try:
+        after = max(int(after), 0)
+    except ValueError:
+        return json_error('Invalid Last-Event-ID')
+
+    def sse(event, data, event_id=None):
+        lines = [f"event: {event}"]
+        if event_id is not None:
+            lines.append(f"id: {event_id}")
+        lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+        return '\n'.join(lines) + '\n\n'
+
+    def stream():
+        yield 'retry: 3000\n\n'
+        for event, seq, result in job.follow(after=after):
+            if event == 'result':
+                yield sse('result', {'result': result, 'progress': job.progress()}, seq)
+            elif event == 'progress':
+                yield sse('progress', {'status': job.status, 'progress': job.progress()})
+            else:
+                yield sse('done', job.summary())
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Ask a running job to stop after the current course"""
+    job = job_manager.cancel(job_id)
+    if not job:
+        return json_error('Job not found', 404)
+    return jsonify(job.summary())
+
+@app.route('/api/image-duplicates', methods=['GET'])
+def image_duplicates():
+    """
+    Catalog-wide report of exact and near-duplicate images (?distance=N sets
+    the max Hamming distance between perceptual hashes, default 10 of 64 bits)
+    """
+    try:
+        distance = int(request.args.get('distance', NEAR_DUPLICATE_DISTANCE))
+    except ValueError:
+        return json_error('distance must be an integer')
+    if not 0 <= distance <= 64:
+        return json_error('distance must be between 0 and 64')
+
+    blobs = image_store.blobs()
+    image_fingerprints.sync(image_store.blob_path(blob) for blob in blobs)
+    fingerprints = image_fingerprints.entries()
+    # Near-duplicate blobs, plus single blobs shared by several slots (exact duplicates are stored once)
+    blob_groups = image_fingerprints.duplicate_groups(distance)
+    grouped = {blob for names in blob_groups for blob in names}
+    blob_groups += [[blob] for blob, refs in sorted(blobs.items()) if len(refs) > 1 and blob not in grouped]
+    groups = []
+    for names in blob_groups:
+        members = []
+        for name in names:
+            fingerprint = fingerprints.get(name)
+            for course_id, slot in blobs.get(name, []):
+                members.append({
+                    'courseId': course_id,
+                    'slot': slot,
+                    'imageUrl': f"/api/blobs/{name}",
+                    'width': fingerprint.width if fingerprint else None,
+                    'height': fingerprint.height if fingerprint else None,
+                    'format': fingerprint.format if fingerprint else None,
+                })
+        if len(members) < 2:
+            continue
+        groups.append({
+            'images': members,
+            'crossCourse': len({m['courseId'] for m in members}) > 1,
+        })
+    groups.sort(key=lambda g: -len(g['images']))
+    return jsonify({
+        'distance': distance,
+        'imagesScanned': len(blobs),
+        'groups': groups,
+    })
 
 @app.route('/api/video/<filename>', methods=['GET'])
 def get_video(filename):
-    """Serve video files"""
+    """Serve video files (ETag, Range requests for seeking)"""
     try:
-        # Try to find video in root directory first
-        video_path = BASE_DIR / filename
-        if video_path.exists() and video_path.suffix.lower() == '.mp4':
-            return send_from_directory(BASE_DIR, filename)
-        
-        # Try Videos directory (uppercase)
-        videos_dir = BASE_DIR / 'Videos'
-        if videos_dir.exists():
-            video_path = videos_dir / filename
-            if video_path.exists():
-                return send_from_directory(videos_dir, filename)
-        
-        # Try videos directory (lowercase)
-        videos_dir = BASE_DIR / 'videos'
-        if videos_dir.exists():
-            video_path = videos_dir / filename
-            if video_path.exists():
-                return send_from_directory(videos_dir, filename)
-        
+        # Root directory (*.mp4) first, then Videos/, then videos/
+        video_path = video_library.find(filename)
+        if video_path is None:
+            return json_error('Video not found', 404)
+        return send_media(video_path, media_hasher, VIDEO_CACHE_CONTROL)
+    except FileNotFoundError:
         return json_error('Video not found', 404)
     except Exception as e:
         return json_error(f"Error serving video: {e}", 500)
@@ -668,62 +1026,119 @@ def set_hero_image(course_id, slot):
         if not image_paths[slot]:
             return json_error(f'No image found in slot {slot}', 404)
         
-        # Get the image from the specified slot
-        source_path, source_ext = image_paths[slot]
-        
-        # Check if hero image exists
-        hero_path = None
-        if image_paths['hero']:
-            hero_path, _ = image_paths['hero']
-        
-        # Copy source image to hero (or move if hero doesn't exist)
-        import shutil
-        new_hero_path = get_image_path(course_id, 'hero', source_ext)
-        
-        if hero_path and hero_path.exists():
-            # Swap: move hero to the source slot
-            old_hero_slot_path = get_image_path(course_id, slot, hero_path.suffix)
-            shutil.move(str(hero_path), str(old_hero_slot_path))
-        
-        # Move source to hero
-        shutil.move(str(source_path), str(new_hero_path))
+        # Only the slot table changes; both blobs (and their URLs and variants) stay as they are
+        image_store.swap(course_id, 'hero', slot)
+        new_hero_path, _ = image_paths[slot]
         
         return jsonify({
             'success': True,
             'message': f'Image from slot {slot} is now the hero image',
-            'imageUrl': f"/api/images/{new_hero_path.name}"
+            'imageUrl': blob_url(new_hero_path)
         })
     except Exception as e:
         return json_error(f"Error setting hero image: {e}", 500)
 
 @app.route('/api/update-course/<course_id>', methods=['POST'])
 def update_course(course_id):
-    """Update course data (e.g., description/blurb)"""
+    """
+    Update course data (e.g., description/blurb)
+    Pass the course's version (body 'version' or If-Match) to get a 409 instead
+    of overwriting an edit made since it was loaded
+    """
     try:
         data = request.get_json()
         if not data:
             return json_error('No data provided', 400)
         
-        courses = load_courses()
-        course = next((c for c in courses if c.get('id') == course_id), None)
+        # Update allowed fields
+        changes = {field: data[field] for field in EDITABLE_FIELDS if field in data}
+        if not changes:
+            return json_error('Nothing to update', 400, f"Editable fields: {', '.join(EDITABLE_FIELDS)}")
+        expected = data.get('version', request.headers.get('If-Match', '').strip('"') or None)
+        try:
+            expected = int(expected) if expected is not None else None
+        except ValueError:
+            return json_error('version must be an integer', 400)
+        
+        # Logged and applied in memory; courses.json is rewritten only on compaction
+        index = current_search_index()
+        try:
+            course, version = course_store.update(course_id, changes, expected_version=expected)
+        except VersionConflict as e:
+            return json_error('Course was changed by another edit', 409, str(e))
         
         if not course:
             return json_error('Course not found', 404)
         
-        # Update allowed fields
-        if 'blurb' in data:
-            course['blurb'] = data['blurb']
-        if 'description' in data:
-            course['description'] = data['description']
-        
-        # Save updated courses
-        with open(COURSES_FILE, 'w', encoding='utf-8') as f:
-            json.dump(courses, f, indent=2, ensure_ascii=False)
+        # Re-index just this course instead of rebuilding the search index
+        reindex_courses(index, [course])
         
-        return jsonify({'success': True, 'course': course})
+        return jsonify({'success': True, 'course': course, 'version': version})
     except Exception as e:
         return json_error(f"Error updating course: {e}", 500)
 
+@app.route('/api/update-courses', methods=['POST'])
+def update_courses():
+    """
+    Apply a batch of JSON-patch style changes in one transaction, e.g.
+    [{"id": "pebble-beach", "op": "replace", "path": "/blurb/0", "value": "...", "version": 3}]
+    (or {"changes": [...]}). Every change is validated first; if any fails
+    (400/404/409) nothing is applied. version, if given, is checked once per course.
+    """
+    data = request.get_json(silent=True)
+    changes = data.get('changes') if isinstance(data, dict) else data
+    if not isinstance(changes, list) or not changes:
+        return json_error('Expected a non-empty list of changes', 400)
+
+    patches = {}  # course id -> [operations, expected version], in first-seen order
+    for position, change in enumerate(changes):
+        if not isinstance(change, dict) or not isinstance(change.get('id'), str):
+            return json_error(f'Change {position} needs a course id', 400)
+        entry = patches.setdefault(change['id'], [[], None])
+        entry[0].append({key: value for key, value in change.items() if key not in ('id', 'version')})
+        if change.get('version') is not None:
+            if not isinstance(change['version'], int):
+                return json_error(f'Change {position}: version must be an integer', 400)
+            if entry[1] is not None and entry[1] != change['version']:
+                return json_error(f"Change {position}: conflicting versions for {change['id']}", 400)
+            entry[1] = change['version']
+
+    index = current_search_index()
+    try:
+        results = course_store.patch(
+            [(course_id, operations, expected) for course_id, (operations, expected) in patches.items()],
+            allowed=EDITABLE_FIELDS,
+        )
+    except PatchError as e:
+        return json_error('Invalid change', 400, str(e))
+    except KeyError as e:
+        return json_error('Course not found', 404, str(e.args[0]))
+    except VersionConflict as e:
+        return json_error('Course was changed by another edit', 409, str(e))
+
+    # Re-index just the edited courses, once each
+    reindex_courses(index, [course for course, _ in results])
+
+    return jsonify({
+        'success': True,
+        'courses': [{'id': course['id'], 'version': version} for course, version in results],
+    })
+
+# Bulk downloads run as background jobs with persisted, resumable state
+job_manager = JobManager(str(JOBS_DIR))
+job_manager.register('download-all', run_download_all)
+job_manager.register('download-secondary', run_download_secondary)
+
+def resume_jobs():
+    """Carry on with jobs that were running when the server last stopped"""
+    for job in job_manager.resume_interrupted():
+        print(f"Resuming {job.kind} job {job.id} ({job.processed} courses already done)")
+
+# Every serving process resumes on startup (gunicorn workers, plain runs, the reloader's child);
+# the per-job lock lets only one of them run each job. The debug reloader's watcher never serves.
+if not (__name__ == '__main__' and os.environ.get('WERKZEUG_RUN_MAIN') != 'true'):
+    resume_jobs()
+
 if __name__ == '__main__':
     port = int(os.environ.get("PORT", "5001"))
     app.run(debug=True, host="0.0.0.0", port=port)
@@ -0,0 +1,195 @@
+"""
+Type-ahead completions for course names, locations and architects.
+
+Completion keys (every word-start suffix of each folded name/location/architect,
+so "andr" finds "St. Andrews Old Course") are kept in one sorted, '\\0'-joined
+string with an offset array instead of a list of str objects. Entries are
+numbered in ranking order (best rating first), so the top-k for a key range is
+simply its k smallest distinct entry ids.
+
+Every prefix that matches more than SCAN_LIMIT keys has its top-k precomputed
+at build time, which makes popular short prefixes a single dict lookup that
+returns a shared tuple. Rarer prefixes resolve to a range of at most
+SCAN_LIMIT keys found by binary search and scanned directly.
+"""
+
+import heapq
+import sys
+from array import array
+
+from search_index import tokenize
+
+TOP_K = 10
+SCAN_LIMIT = 64
+KINDS = ['name', 'location', 'architect']
+# Course fields the index is built from; edits to any other field leave it valid
+SOURCE_FIELDS = ('id', 'name', 'location', 'architect', 'rating')
+
+
+def normalize(text):
+    """Fold accents/case and collapse punctuation: 'St. Andrews' -> 'st andrews'"""
+    return ' '.join(tokenize(text))
+
+
+class Autocomplete:
+    """Sorted-array prefix index with per-prefix top-k ranked by rating"""
+
+    def __init__(self, courses, top_k=TOP_K):
+        self.top_k = top_k
+
+        # Gather entries: one per course name, one per distinct location/architect
+        grouped = {}
+        for course in courses:
+            rating = course.get('rating')
+            rating = rating if isinstance(rating, (int, float)) else 0.0
+            if course.get('name'):
+                grouped[('name', course['id'])] = [course['name'], rating, 1]
+            for kind in ('location', 'architect'):
+                text = course.get(kind)
+                if not isinstance(text, str) or not text.strip():
+                    continue
+                entry = grouped.get((kind, text))
+                if entry is None:
+                    grouped[(kind, text)] = [text, rating, 1]
+                else:
+                    entry[1] = max(entry[1], rating)
+                    entry[2] += 1
+
+        ranked = sorted(grouped.items(), key=lambda item: (-item[1][1], item[1][0]))
+        self.entry_text = [text for _, (text, _, _) in ranked]
+        self.entry_kind = array('b', (KINDS.index(kind) for (kind, _), _ in ranked))
+        self.entry_id = [ref if kind == 'name' else None for (kind, ref), _ in ranked]
+        self.entry_count = array('i', (count for _, (_, _, count) in ranked))
+
+        # Keys: every word-start suffix of every entry's normalized text
+        keys = []
+        for entry, text in enumerate(self.entry_text):
+            words = normalize(text).split(' ')
+            for start in range(len(words)):
+                key = ' '.join(words[start:])
+                if key:
+                    keys.append((key, entry))
+        keys.sort()
+
+        self._blob = '\0'.join(key for key, _ in keys)
+        self._offsets = array('I')
+        pos = 0
+        for key, _ in keys:
+            self._offsets.append(pos)
+            pos += len(key) + 1
+        self._offsets.append(pos)
+        self._key_entry = array('i', (entry for _, entry in keys))
+
+        self._heavy = self._build_heavy_prefixes([key for key, _ in keys])
+
+    def _top(self, lo, hi):
+        """k smallest distinct entry ids among keys[lo:hi]"""
+        seen = set()
+        result = []
+        for entry in heapq.nsmallest(self.top_k * 2, self._key_entry[lo:hi]):
+            if entry not in seen:
+                seen.add(entry)
+                result.append(entry)
+                if len(result) == self.top_k:
+                    break
+        if len(result) < self.top_k and hi - lo > self.top_k * 2:
+            # Many suffix keys of the same entry crowded the candidates; fall back to a full pass
+            result = sorted(set(self._key_entry[lo:hi]))[:self.top_k]
+        return tuple(result)
+
+    def _build_heavy_prefixes(self, keys):
+        heavy = {}
+        depth = 1
+        while True:
+            found = False
+            i, n = 0, len(keys)
+            while i < n:
+                if len(keys[i]) < depth:
+                    i += 1
+                    continue
+                prefix = keys[i][:depth]
+                j = i + 1
+                while j < n and keys[j].startswith(prefix):
+                    j += 1
+                if j - i > SCAN_LIMIT:
+                    heavy[prefix] = self._top(i, j)
+                    found = True
+                i = j
+            if not found:
+                return heavy
+            depth += 1
+
+    def _key(self, i):
+        return self._blob[self._offsets[i]:self._offsets[i + 1] - 1]
+
+    def _lower_bound(self, prefix):
+        lo, hi = 0, len(self._key_entry)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < prefix:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def complete(self, query):
+        """Return the top-k entry ids for a query prefix, best first"""
+        prefix = normalize(query)
+        if not prefix:
+            return ()
+        cached = self._heavy.get(prefix)
+        if cached is not None:
+            return cached
+        lo = self._lower_bound(prefix)
+        hi = lo
+        end = min(lo + SCAN_LIMIT, len(self._key_entry))
+        while hi < end and self._key(hi).startswith(prefix):
+            hi += 1
+        return self._top(lo, hi)
+
+    def describe(self, entry):
+        """JSON-ready suggestion for an entry id"""
+        kind = KINDS[self.entry_kind[entry]]
+        suggestion = {'text': self.entry_text[entry], 'kind': kind}
+        if kind == 'name':
+            suggestion['id'] = self.entry_id[entry]
+        else:
+            suggestion['count'] = self.entry_count[entry]
+        return suggestion
+
+    def memory_usage(self):
+        """
+        Bytes held by the index, in total and per 100k entries: the containers
+        plus the strings, tuples and ints inside them, each object counted once
+        """
+        seen = set()
+
+        def size(*objects):
+            total = 0
+            for obj in objects:
+                if obj is not None and id(obj) not in seen:
+                    seen.add(id(obj))
+                    total += sys.getsizeof(obj)
+            return total
+
+        parts = {
+            'keys': size(self._blob, self._offsets, self._key_entry),
+            'entries': (
+                size(self.entry_text, self.entry_kind, self.entry_id, self.entry_count)
+                + size(*self.entry_text) + size(*self.entry_id)
+            ),
+            'topK': (
+                size(self._heavy) + size(*self._heavy) + size(*self._heavy.values())
+                + size(*(entry for top in self._heavy.values() for entry in top))
+            ),
+        }
+        total = sum(parts.values())
+        entries = len(self.entry_text)
+        return {
+            'entries': entries,
+            'keys': len(self._key_entry),
+            'heavyPrefixes': len(self._heavy),
+            'bytes': parts,
+            'totalBytes': total,
+            'bytesPer100kEntries': int(total * 100000 / entries) if entries else 0,
+        }
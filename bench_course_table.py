@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Benchmark the columnar CourseTable against the plain list of course dicts.
+
+Reports, per copy of the catalog (i.e. per worker process):
+    - retained memory after loading (tracemalloc),
+    - time for a few typical scans, and the bytes each representation
+      touches per scan.
+
+Usage: python bench_course_table.py [courses.json] [--scale N] [--repeat N]
+--scale replicates the catalog N times (with distinct ids) to see how the
+numbers grow with catalog size.
+"""
+
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+from course_table import CourseTable
+
+
+def load_courses(path, scale):
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    courses = json.loads(text)
+    for copy in range(1, scale):
+        # Parse again so replicas don't share string objects with the original
+        for course in json.loads(text):
+            course['id'] = f"{course['id']}-{copy}"
+            courses.append(course)
+    return courses
+
+
+def retained(build):
+    """(result, bytes still allocated once build() returns)"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, value
+
+
+def dict_scans(courses):
+    return {
+        'europe, rating >= 4.5': lambda: sum(
+            1 for c in courses if c.get('continent') == 'Europe' and c.get('rating', 0) >= 4.5),
+        'mean yardage': lambda: (lambda ys: sum(ys) / len(ys))(
+            [c['yardage'] for c in courses if 'yardage' in c]),
+        'bbox (British Isles)': lambda: sum(
+            1 for c in courses if 'latitude' in c and 49 <= c['latitude'] <= 61 and -11 <= c['longitude'] <= 2),
+    }
+
+
+def table_scans(table):
+    rating, yardage = table.array('rating'), table.array('yardage')
+    latitude, longitude = table.array('latitude'), table.array('longitude')
+    has_yardage = table.has('yardage')
+    return {
+        'europe, rating >= 4.5': lambda: int(np.count_nonzero(
+            table.mask('continent', 'Europe') & (rating >= 4.5))),
+        'mean yardage': lambda: float(yardage[has_yardage].mean()),
+        'bbox (British Isles)': lambda: int(np.count_nonzero(
+            table.has('latitude') & (latitude >= 49) & (latitude <= 61) & (longitude >= -11) & (longitude <= 2))),
+    }
+
+
+def table_bytes_touched(table):
+    """Column bytes each table scan reads"""
+    codes = table.key_order_codes.nbytes
+    return {
+        'europe, rating >= 4.5': table.columns['continent'].nbytes + table.columns['rating'].nbytes + codes,
+        'mean yardage': table.columns['yardage'].nbytes + codes,
+        'bbox (British Isles)': table.columns['latitude'].nbytes + table.columns['longitude'].nbytes + codes,
+    }
+
+
+def human(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f'{size:.1f} {unit}'
+        size /= 1024
+
+
+def main(argv):
+    path, options = Path(__file__).parent / 'courses.json', {'--scale': 1, '--repeat': 20}
+    argv = list(argv)
+    while argv:
+        arg = argv.pop(0)
+        if arg in options and argv:
+            options[arg] = int(argv.pop(0))
+        elif not arg.startswith('--'):
+            path = Path(arg)
+        else:
+            print(__doc__.split('Usage: ')[1])
+            sys.exit(1)
+    scale, repeat = options['--scale'], options['--repeat']
+
+    courses, dict_bytes = retained(lambda: load_courses(path, scale))
+    # Built from its own parse (freed before measuring) so strings shared with `courses` are counted
+    table, table_bytes = retained(lambda: CourseTable(load_courses(path, scale)))
+    rows = len(courses)
+    assert all(table.row(i) == courses[i] for i in range(0, rows, max(1, rows // 1000))), 'table is not lossless'
+
+    print(f'{rows} courses from {path.name} (scale {scale})')
+    print(f'  dict list:   {human(dict_bytes):>10}  ({dict_bytes / rows:.0f} B/course)')
+    print(f'  CourseTable: {human(table_bytes):>10}  ({table_bytes / rows:.0f} B/course,'
+          f' {dict_bytes / table_bytes:.1f}x smaller; column buffers {human(table.nbytes())})')
+    print()
+
+    dict_results = {name: timed(fn, repeat) for name, fn in dict_scans(courses).items()}
+    table_results = {name: timed(fn, repeat) for name, fn in table_scans(table).items()}
+    touched = table_bytes_touched(table)
+    print(f"{'scan':<24}{'dict list':>12}{'CourseTable':>14}{'speedup':>9}   table bytes read")
+    for name, (dict_time, dict_value) in dict_results.items():
+        table_time, table_value = table_results[name]
+        assert abs(dict_value - table_value) < 1e-6, f'{name}: {dict_value} != {table_value}'
+        print(f'{name:<24}{dict_time * 1e6:>10.0f}us{table_time * 1e6:>12.0f}us{dict_time / table_time:>8.1f}x'
+              f'   {human(touched[name])} ({touched[name] / table_time / 1e9:.2f} GB/s;'
+              f' dict list {dict_time * 1e9 / rows:.0f} ns/course)')
+
+    start = time.perf_counter()
+    for i in range(rows):
+        table.row(i)
+    print(f'\nmaterializing every row: {(time.perf_counter() - start) * 1e6 / rows:.1f} us/course')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
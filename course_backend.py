@@ -0,0 +1,50 @@
+"""
+Opens the course catalog with whichever backend the environment selects, so
+the app and the scripts that edit courses read and write the same copy.
+
+    COURSE_BACKEND   json (default) or sqlite
+    COURSE_DB        the SQLite database (default: courses.sqlite3 next to courses.json)
+    COURSE_SNAPSHOT  binary copy of courses.json the json backend loads from while
+                     it is current (default: courses.snapshot next to it; empty to disable)
+"""
+
+import os
+from pathlib import Path
+
+from course_db import CourseDB, SqliteCourseStore
+from course_snapshot import SnapshotCourseStore
+from course_store import CourseStore
+
+# COURSE_BACKEND=sqlite keeps the catalog in COURSE_DB instead of courses.json
+COURSE_BACKEND = os.environ.get('COURSE_BACKEND', 'json')
+
+
+def open_course_store(courses_file, backend=None):
+    """The catalog store for courses_file under `backend` (default: COURSE_BACKEND)"""
+    courses_file = Path(courses_file)
+    backend = backend or COURSE_BACKEND
+    if backend == 'sqlite':
+        db_path = Path(os.environ.get('COURSE_DB', courses_file.parent / 'courses.sqlite3'))
+        db = CourseDB(db_path)
+        if db.count() == 0 and courses_file.exists():
+            print(f"Importing {db.import_json(courses_file)} courses from {courses_file.name} into {db_path.name}")
+        return SqliteCourseStore(db)
+    if backend != 'json':
+        raise ValueError(f"COURSE_BACKEND must be json or sqlite, not {backend!r}")
+    # Parsed once per process; reloaded only when the file's mtime/size changes
+    snapshot = os.environ.get('COURSE_SNAPSHOT', str(courses_file.with_suffix('.snapshot')))
+    if snapshot:
+        return SnapshotCourseStore(courses_file, snapshot)
+    return CourseStore(courses_file)
+
+
+def save_course_store(store, courses_file):
+    """
+    Write a script's edits through to courses_file: compact the json
+    backend's log, or export the SQLite catalog, so tools that read
+    courses.json afterwards (update_courses_for_static.py) see them
+    """
+    if isinstance(store, SqliteCourseStore):
+        store.db.export_json(courses_file)
+    else:
+        store.save()
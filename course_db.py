@@ -0,0 +1,528 @@
+#!/usr/bin/env python3
+"""
+SQLite storage for the course catalog, as an alternative to courses.json.
+
+Each course is one row. The fields that are filtered and sorted on (name,
+continent, type, batch, category, rating, yardage, latitude, longitude) get
+their own indexed columns; blurbs and the studio/standard/iGolf feature
+objects are JSON columns; everything else goes into an `extra` JSON object.
+The row also records the course's key order and its position in the catalog,
+so exporting gives back exactly the courses.json that was imported: the same
+keys in the same order, with the same values and types.
+
+The scalar columns are declared without a type, so SQLite keeps every value
+exactly as it was given. An int stays an int, a float stays a float, and a
+string stays a string.
+
+Scripts can read or change a few rows without parsing the whole catalog:
+
+    python course_db.py import [courses.json]
+    python course_db.py export [courses.json]
+    python course_db.py query continent=europe rating_min=4.5 sort=-rating limit=5 fields=name,rating
+    python course_db.py get <course_id>
+    python course_db.py set <course_id> <field> <json value>
+
+The app uses it instead of courses.json when COURSE_BACKEND=sqlite (see
+SqliteCourseStore).
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from course_query import FACETS, NUMERIC_FIELDS, QueryError, encode_cursor, parse_query, project
+from course_store import VersionConflict, changed_fields, patch_fields, write_atomic
+
+# Course key -> column; values that are not str/int/float/None go to `extra` instead
+SCALAR_COLUMNS = {
+    'name': 'name',
+    'continent': 'continent',
+    'type': 'type',
+    'batch': 'batch',
+    'category': 'category',
+    'rating': 'rating',
+    'yardage': 'yardage',
+    'latitude': 'latitude',
+    'longitude': 'longitude',
+}
+# Course key -> JSON column
+JSON_COLUMNS = {
+    'blurb': 'blurb',
+    'studioFeatures': 'studio_features',
+    'standardFeatures': 'standard_features',
+    'igolfFeatures': 'igolf_features',
+}
+COLUMNS = ['id', 'position', 'version'] + list(SCALAR_COLUMNS.values()) + list(JSON_COLUMNS.values()) + ['extra', 'key_order']
+SELECT = f"SELECT {', '.join(COLUMNS)} FROM courses"
+
+SCHEMA = [
+    # Untyped scalar columns keep the exact JSON type of each value (no affinity conversions)
+    'CREATE TABLE IF NOT EXISTS courses ('
+    ' id TEXT PRIMARY KEY,'
+    ' position INTEGER NOT NULL,'
+    ' version INTEGER NOT NULL DEFAULT 0,'
+    ' name, continent, type, batch, category, rating, yardage, latitude, longitude,'
+    ' blurb TEXT, studio_features TEXT, standard_features TEXT, igolf_features TEXT,'
+    ' extra TEXT NOT NULL,'
+    ' key_order TEXT NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS courses_position ON courses (position)',
+    # Facet filters compare lowercased values, like CourseIndex
+    'CREATE INDEX IF NOT EXISTS courses_continent ON courses (lower(continent))',
+    'CREATE INDEX IF NOT EXISTS courses_type ON courses (lower(type))',
+    'CREATE INDEX IF NOT EXISTS courses_batch ON courses (lower(batch))',
+    'CREATE INDEX IF NOT EXISTS courses_category ON courses (lower(category))',
+    'CREATE INDEX IF NOT EXISTS courses_rating ON courses (rating)',
+    'CREATE INDEX IF NOT EXISTS courses_yardage ON courses (yardage)',
+    'CREATE INDEX IF NOT EXISTS courses_coordinates ON courses (latitude, longitude)',
+    # Bumped by every row change, whoever makes it, so readers can tell their copy is stale
+    'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)',
+    "INSERT OR IGNORE INTO meta (key, value) VALUES ('generation', 0)",
+] + [
+    f"CREATE TRIGGER IF NOT EXISTS courses_{event.lower()}_generation AFTER {event} ON courses"
+    " BEGIN UPDATE meta SET value = value + 1 WHERE key = 'generation'; END"
+    for event in ('INSERT', 'UPDATE', 'DELETE')
+]
+
+
+def encode_course(course, position, version=0):
+    """Row values (in COLUMNS order) for a course dict"""
+    row = dict.fromkeys(COLUMNS)
+    row.update(id=course['id'], position=position, version=version)
+    extra = {}
+    for key, value in course.items():
+        if key == 'id':
+            continue
+        if key in SCALAR_COLUMNS and (value is None or type(value) in (str, int, float)):
+            row[SCALAR_COLUMNS[key]] = value
+        elif key in JSON_COLUMNS:
+            row[JSON_COLUMNS[key]] = json.dumps(value, ensure_ascii=False)
+        else:
+            extra[key] = value
+    row['extra'] = json.dumps(extra, ensure_ascii=False)
+    row['key_order'] = json.dumps(list(course), ensure_ascii=False)
+    return [row[column] for column in COLUMNS]
+
+
+def decode_course(row):
+    """(course dict, version) from a row selected with SELECT"""
+    values = dict(zip(COLUMNS, row))
+    extra = json.loads(values['extra'])
+    course = {}
+    for key in json.loads(values['key_order']):
+        if key == 'id':
+            course[key] = values['id']
+        elif key in extra:
+            course[key] = extra[key]
+        elif key in SCALAR_COLUMNS:
+            course[key] = values[SCALAR_COLUMNS[key]]
+        else:
+            course[key] = json.loads(values[JSON_COLUMNS[key]])
+    return course, values['version']
+
+
+def _casefold(value):
+    return value.casefold() if isinstance(value, str) else value
+
+
+def _sort_expr(key):
+    """SQL sort value of a field, as CourseIndex orders it: numbers only for numeric keys, strings casefolded"""
+    expr = _field_expr(key)
+    if key in NUMERIC_FIELDS:
+        return f"(CASE WHEN typeof({expr}) IN ('integer', 'real') THEN {expr} END)"
+    return f'casefold({expr})'
+
+
+def _field_expr(key):
+    """SQL expression for a top-level course field"""
+    if key in SCALAR_COLUMNS:
+        return SCALAR_COLUMNS[key]
+    return f"json_extract(extra, '$.\"{key}\"')"
+
+
+class CourseDB:
+    """The course catalog in a SQLite database; one connection per thread"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        db = self._connect()
+        for statement in SCHEMA:
+            db.execute(statement)
+
+    def _connect(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            # Autocommit; writes use explicit BEGIN IMMEDIATE transactions
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.create_function('casefold', 1, _casefold, deterministic=True)
+            db.execute('PRAGMA journal_mode=WAL')
+            # This is the catalog itself, not a cache: every commit is durable
+            db.execute('PRAGMA synchronous=FULL')
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        db = self._connect()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def generation(self):
+        """Counter bumped by every change to the courses table"""
+        return self._connect().execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()[0]
+
+    def count(self):
+        return self._connect().execute('SELECT COUNT(*) FROM courses').fetchone()[0]
+
+    # --- import / export ---
+
+    def import_courses(self, courses):
+        """Replace the whole catalog with a list of course dicts (versions restart at 0)"""
+        with self._transaction() as db:
+            db.execute('DELETE FROM courses')
+            db.executemany(
+                f"INSERT INTO courses ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                (encode_course(course, position) for position, course in enumerate(courses)),
+            )
+
+    def import_json(self, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            courses = json.load(f)
+        self.import_courses(courses)
+        return len(courses)
+
+    def export_json(self, path):
+        """Write the catalog as courses.json (temp file + fsync + rename)"""
+        courses = [course for course, _ in self.rows()]
+        write_atomic(path, json.dumps(courses, indent=2, ensure_ascii=False))
+        return len(courses)
+
+    # --- reads ---
+
+    def rows(self):
+        """[(course, version)] for the whole catalog, in catalog order"""
+        return [decode_course(row) for row in self._connect().execute(f'{SELECT} ORDER BY position')]
+
+    def get(self, course_id):
+        """(course, version) for one course, or (None, None)"""
+        row = self._connect().execute(f'{SELECT} WHERE id = ?', (course_id,)).fetchone()
+        return decode_course(row) if row else (None, None)
+
+    def versions(self):
+        return dict(self._connect().execute('SELECT id, version FROM courses'))
+
+    def query(self, params, decorate=None):
+        """
+        Run a parse_query() dict (facets, flags, rating/yardage ranges, bbox,
+        sort, cursor, limit, fields) in SQL and return the same payload as
+        CourseIndex.query: {'courses', 'total', 'nextCursor'}, with the same
+        order (missing values last, ties in catalog order, reversed for
+        descending sorts). Pages continue after the cursor's course, looked
+        up again in case it moved. decorate(course, version), if given, turns
+        each stored course into the response course before projection.
+        """
+        where, args = [], []
+        for facet in FACETS:
+            values = params['facets'].get(facet)
+            if values:
+                where.append(f"lower({_field_expr(facet)}) IN ({', '.join('?' * len(values))})")
+                args.extend(values)
+        for flag, wanted in params['flags'].items():
+            # Absent counts as false
+            where.append(f"coalesce({_field_expr(flag)}, 0) {'=' if wanted else '!='} 1")
+        for field, (low, high) in params['ranges'].items():
+            # Only numbers are in range, as in CourseIndex (SQLite would rank text above any number)
+            where.append(f"typeof({_field_expr(field)}) IN ('integer', 'real')")
+            if low is not None:
+                where.append(f'{_field_expr(field)} >= ?')
+                args.append(low)
+            if high is not None:
+                where.append(f'{_field_expr(field)} <= ?')
+                args.append(high)
+        if params['bbox']:
+            west, south, east, north = params['bbox']
+            where.append('latitude BETWEEN ? AND ?')
+            args.extend([south, north])
+            if west <= east:
+                where.append('longitude BETWEEN ? AND ?')
+            else:
+                # The box crosses the antimeridian
+                where.append('(longitude >= ? OR longitude <= ?)')
+            args.extend([west, east])
+
+        db = self._connect()
+        filters = f" WHERE {' AND '.join(where)}" if where else ''
+        total = db.execute(f'SELECT COUNT(*) FROM courses{filters}', args).fetchone()[0]
+
+        sort_key, descending = params['sort']
+        value = _sort_expr(sort_key) if sort_key else 'NULL'
+        # Ties follow catalog order, reversed along with a descending sort; missing values come last in catalog order
+        tiebreak = f'(CASE WHEN {value} IS NULL THEN position ELSE -position END)' if descending else 'position'
+        order = f"{value} IS NULL, {value} {'DESC' if descending else 'ASC'}, {tiebreak}"
+
+        cursor = params['cursor']
+        start = 0
+        if cursor:
+            if cursor.get('s') != sort_key or cursor.get('d') != descending:
+                raise QueryError('cursor does not match sort order')
+            anchor = db.execute(f'SELECT {value}, {tiebreak} FROM courses WHERE id = ?', (cursor.get('id'),)).fetchone()
+            if anchor is None:
+                # The course is gone; fall back to the values it had when the page was served
+                position = cursor.get('p')
+                if not isinstance(position, int):
+                    raise QueryError('invalid cursor')
+                anchor = (cursor.get('v'), -position if descending and cursor.get('v') is not None else position)
+            anchor_value, anchor_tiebreak = anchor
+            if anchor_value is None:
+                where.append(f'({value} IS NULL AND {tiebreak} > ?)')
+                args.append(anchor_tiebreak)
+            else:
+                where.append(f"({value} IS NULL OR {value} {'<' if descending else '>'} ? OR ({value} = ? AND {tiebreak} > ?))")
+                args.extend([anchor_value, anchor_value, anchor_tiebreak])
+            try:
+                start = int(cursor.get('r', -1)) + 1
+            except (TypeError, ValueError):
+                raise QueryError('invalid cursor')
+
+        limit = params['limit']
+        sql = (f"SELECT {', '.join(COLUMNS)}, {value} FROM courses"
+               + (f" WHERE {' AND '.join(where)}" if where else '')
+               + f' ORDER BY {order} LIMIT ?')
+        rows = db.execute(sql, args + [limit + 1]).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = dict(zip(COLUMNS, rows[-1]))
+            next_cursor = encode_cursor(sort_key, descending, start + limit - 1, last['id'],
+                                        v=rows[-1][-1], p=last['position'])
+        courses = []
+        for row in rows:
+            course, version = decode_course(row[:-1])
+            if decorate is not None:
+                course = decorate(course, version)
+            courses.append(project(course, params['fields']))
+        return {'courses': courses, 'total': total, 'nextCursor': next_cursor}
+
+    # --- writes ---
+
+    def commit(self, edits):
+        """
+        Apply [(course_id, build_changes(course), expected_version)] in one
+        transaction (all or nothing; KeyError for an unknown course,
+        VersionConflict for a stale version). Edits that change no value are
+        dropped, and rows they leave unchanged are not written. Returns
+        ([(course, version)], generation before, generation after); both are
+        read inside the transaction, so no other writer comes between them.
+        """
+        with self._transaction() as db:
+            before = self.generation()
+            staged = {}  # course id -> [course, version, position, changed]
+            for course_id, build_changes, expected in edits:
+                if course_id not in staged:
+                    row = db.execute(f'{SELECT} WHERE id = ?', (course_id,)).fetchone()
+                    if row is None:
+                        raise KeyError(course_id)
+                    course, version = decode_course(row)
+                    if expected is not None and expected != version:
+                        raise VersionConflict(course_id, expected, version)
+                    staged[course_id] = [course, version, row[1], False]
+                entry = staged[course_id]
+                changes = changed_fields(entry[0], build_changes(dict(entry[0])))
+                if changes:
+                    entry[0].update(changes)
+                    entry[1] += 1
+                    entry[3] = True
+            assignments = ', '.join(f'{column} = ?' for column in COLUMNS[1:])
+            for course_id, (course, version, position, changed) in staged.items():
+                if changed:
+                    db.execute(f'UPDATE courses SET {assignments} WHERE id = ?',
+                               encode_course(course, position, version)[1:] + [course_id])
+            results = [(staged[course_id][0], staged[course_id][1]) for course_id, _, _ in edits]
+            return results, before, self.generation()
+
+    def update(self, course_id, changes, expected_version=None):
+        """Set fields of one course; returns (course, version), or (None, None) if there is no such course"""
+        try:
+            results, _, _ = self.commit([(course_id, lambda course: changes, expected_version)])
+        except KeyError:
+            return None, None
+        return results[0]
+
+
+class SqliteCourseStore:
+    """
+    CourseStore's interface over a CourseDB. Single-course reads and edits
+    are row queries; the full list (for /api/courses and the indexes) is
+    loaded on first use and kept until another process changes the database.
+    Reads do not look for such changes themselves (that is a query per
+    call); call refresh() once per unit of work, e.g. per request.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.version = 0
+        self._lock = threading.Lock()
+        self._generation = None
+        self._data = None
+        self._by_id = {}
+        self._versions = {}
+        self._reloads = 0
+        self._field_edits = {}  # field -> number of our own edits that set it since the last reload
+
+    def refresh(self):
+        """Drop the cached catalog if the database changed since it was loaded (one query)"""
+        generation = self.db.generation()
+        if generation != self._generation:
+            with self._lock:
+                if generation != self._generation:
+                    self._invalidate(generation)
+
+    def _invalidate(self, generation):
+        self._data = None
+        self._by_id = {}
+        self._versions = {}
+        self._generation = generation
+        self._reloads += 1
+        self._field_edits = {}
+        self.version += 1
+
+    def _checked(self):
+        if self._generation is None:
+            self.refresh()
+
+    @property
+    def signature(self):
+        self._checked()
+        return self._generation
+
+    def _load(self):
+        with self._lock:
+            if self._data is None:
+                rows = self.db.rows()
+                self._data = [course for course, _ in rows]
+                self._by_id = {course['id']: course for course in self._data}
+                self._versions = {course['id']: version for course, version in rows}
+            return self._data
+
+    def all(self):
+        """Return the cached list of course dicts (do not mutate; use update())"""
+        self._checked()
+        return self._data if self._data is not None else self._load()
+
+    def get(self, course_id):
+        """Return the course with the given id, or None"""
+        self._checked()
+        if self._data is not None:
+            return self._by_id.get(course_id)
+        return self.db.get(course_id)[0]
+
+    def course_version(self, course_id):
+        self._checked()
+        if self._data is not None:
+            return self._versions.get(course_id, 0)
+        return self.db.get(course_id)[1] or 0
+
+    def fields_version(self, fields):
+        """Changes when another process changes the database or we edit one of `fields` (see CourseStore)"""
+        self._checked()
+        return self._reloads, sum(self._field_edits.get(field, 0) for field in fields)
+
+    def update(self, course_id, changes, expected_version=None):
+        """Set fields of a course; returns (course, new version), or (None, None)"""
+        try:
+            return self.commit([(course_id, lambda course: changes, expected_version)])[0]
+        except KeyError:
+            return None, None
+
+    def patch(self, patches, allowed=None):
+        """Apply [(course_id, operations, expected_version)] as one transaction (see CourseStore.patch)"""
+        return self.commit([
+            (course_id, lambda course, ops=operations: patch_fields(course, ops, allowed), expected)
+            for course_id, operations, expected in patches
+        ])
+
+    def commit(self, edits):
+        changed = []
+
+        def recording(build_changes):
+            def build(course):
+                changes = changed_fields(course, build_changes(course))
+                changed.extend(changes)
+                return changes
+            return build
+
+        results, before, generation = self.db.commit([(course_id, recording(build), expected)
+                                                      for course_id, build, expected in edits])
+        with self._lock:
+            if before != self._generation:
+                # Someone else changed the database since our copy was loaded
+                self._invalidate(generation)
+                return results
+            if not changed:
+                return [(self._by_id.get(course['id'], course), version) for course, version in results]
+            for field in changed:
+                self._field_edits[field] = self._field_edits.get(field, 0) + 1
+            if self._data is not None:
+                # Update the loaded copy in place instead of reloading everything
+                for course, version in results:
+                    cached = self._by_id[course['id']]
+                    cached.clear()
+                    cached.update(course)
+                    self._versions[course['id']] = version
+                results = [(self._by_id[course['id']], version) for course, version in results]
+            self._generation = generation
+            self.version += 1
+        return results
+
+
+USAGE = """Usage:
+    python course_db.py import [courses.json]
+    python course_db.py export [courses.json]
+    python course_db.py query <param>=<value> ...   (same parameters as /api/courses)
+    python course_db.py get <course_id>
+    python course_db.py set <course_id> <field> <json value>"""
+
+
+if __name__ == '__main__':
+    base_dir = Path(__file__).parent
+    db = CourseDB(os.environ.get('COURSE_DB', base_dir / 'courses.sqlite3'))
+    command, args = (sys.argv[1], sys.argv[2:]) if len(sys.argv) > 1 else (None, [])
+    if command in ('import', 'export') and len(args) <= 1:
+        path = args[0] if args else base_dir / 'courses.json'
+        if command == 'import':
+            print(f"Imported {db.import_json(path)} courses from {path}")
+        else:
+            print(f"Exported {db.export_json(path)} courses to {path}")
+    elif command == 'query':
+        try:
+            params = parse_query(dict(arg.split('=', 1) for arg in args))
+        except (QueryError, ValueError) as e:
+            print(f"Bad query: {e}")
+            sys.exit(1)
+        print(json.dumps(db.query(params), indent=2, ensure_ascii=False))
+    elif command == 'get' and len(args) == 1:
+        course, version = db.get(args[0])
+        if course is None:
+            print(f"No course {args[0]}")
+            sys.exit(1)
+        print(json.dumps(dict(course, version=version), indent=2, ensure_ascii=False))
+    elif command == 'set' and len(args) == 3:
+        course, version = db.update(args[0], {args[1]: json.loads(args[2])})
+        if course is None:
+            print(f"No course {args[0]}")
+            sys.exit(1)
+        print(f"{args[0]} is now at version {version}")
+    else:
+        print(USAGE)
+        sys.exit(1)
@@ -0,0 +1,311 @@
+"""
+Filtering, sorting, cursor pagination and field projection for /api/courses.
+
+A CourseIndex is built once per catalog version from the merged course payload.
+It keeps per-facet posting sets, value-sorted arrays for numeric ranges and a
+precomputed order for every sort key, so a request only pays for intersecting
+the facets it names and for materializing the page it returns.
+"""
+
+import base64
+import json
+from bisect import bisect_left, bisect_right
+
+from spatial_index import SpatialIndex
+
+# Facets filtered by exact value (comma-separated values are OR'ed)
+FACETS = ['continent', 'type', 'batch', 'category']
+# Boolean flags, absent means False
+FLAGS = ['isStudio', 'isIgolf']
+# Numeric fields usable in ranges and as sort keys
+NUMERIC_FIELDS = ['rating', 'yardage', 'latitude', 'longitude', 'established']
+SORT_KEYS = ['name', 'location', 'continent', 'type'] + NUMERIC_FIELDS
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+QUERY_PARAMS = set(
+    FACETS + FLAGS
+    + ['rating_min', 'rating_max', 'yardage_min', 'yardage_max',
+       'bbox', 'sort', 'cursor', 'limit', 'fields']
+)
+
+
+class QueryError(ValueError):
+    """Raised for malformed query parameters (reported as HTTP 400)"""
+
+
+def _number(value):
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+class CourseIndex:
+    """Precomputed per-facet indexes over one version of the course payload"""
+
+    def __init__(self, courses, version=None):
+        self.courses = courses
+        self.version = version
+        self.ids = [c.get('id') for c in courses]
+        self.position = {cid: i for i, cid in enumerate(self.ids)}
+
+        self.facets = {facet: {} for facet in FACETS}
+        # (flag, wanted) -> positions, so "isIgolf=false" is a lookup too
+        self.flags = {(flag, wanted): set() for flag in FLAGS for wanted in (True, False)}
+        for i, course in enumerate(courses):
+            for facet in FACETS:
+                value = course.get(facet)
+                if value is not None:
+                    self.facets[facet].setdefault(str(value).lower(), set()).add(i)
+            for flag in FLAGS:
+                self.flags[(flag, bool(course.get(flag)))].add(i)
+
+        # field -> (sorted values, positions in the same order)
+        self.ranges = {}
+        for field in NUMERIC_FIELDS:
+            pairs = sorted(
+                (v, i) for i, v in ((i, _number(c.get(field))) for i, c in enumerate(courses))
+                if v is not None
+            )
+            self.ranges[field] = ([v for v, _ in pairs], [i for _, i in pairs])
+
+        # Grid over latitude/longitude for bbox filters and /api/courses/near
+        self.spatial = SpatialIndex(courses)
+
+        # (sort key, descending) -> positions in order (missing values last), and rank lookup
+        self.orders = {}
+        self.ranks = {}
+        for key in SORT_KEYS:
+            present, missing = self._sorted_positions(key)
+            for descending in (False, True):
+                order = (present[::-1] if descending else present) + missing
+                rank = [0] * len(courses)
+                for r, i in enumerate(order):
+                    rank[i] = r
+                self.orders[(key, descending)] = order
+                self.ranks[(key, descending)] = rank
+
+    def _sorted_positions(self, key):
+        present, missing = [], []
+        for i, course in enumerate(self.courses):
+            value = course.get(key)
+            if key in NUMERIC_FIELDS:
+                value = _number(value)
+            elif isinstance(value, str):
+                value = value.casefold()
+            (missing if value is None else present).append((value, i))
+        present.sort()
+        return [i for _, i in present], [i for _, i in missing]
+
+    def range_positions(self, field, low=None, high=None):
+        """Positions whose numeric field lies within [low, high]"""
+        values, positions = self.ranges[field]
+        start = 0 if low is None else bisect_left(values, low)
+        end = len(values) if high is None else bisect_right(values, high)
+        return set(positions[start:end])
+
+    def bbox_positions(self, west, south, east, north):
+        """Positions inside a lng/lat bounding box (west > east crosses the antimeridian)"""
+        return set(self.spatial.bbox(west, south, east, north).tolist())
+
+    def query(self, params):
+        """Run a parsed query and return the response payload"""
+        candidates = self._candidates(params)
+        sort_key, descending = params['sort']
+        limit = params['limit']
+
+        # Without a sort key, catalog order is both the order and the rank
+        order = self.orders.get((sort_key, descending))
+        rank = self.ranks.get((sort_key, descending))
+        n = len(self.courses)
+
+        start = 0
+        cursor = params['cursor']
+        if cursor:
+            start = self._resume_rank(cursor, sort_key, descending, rank)
+
+        def rank_of(i):
+            return rank[i] if rank is not None else i
+
+        def position_at(r):
+            return order[r] if order is not None else r
+
+        page = []
+        if candidates is None:
+            for r in range(start, min(start + limit + 1, n)):
+                page.append(position_at(r))
+            total = n
+        elif len(candidates) * 8 < n:
+            # Selective filter: order the few matches by rank instead of walking the catalog
+            ranked = sorted(rank_of(i) for i in candidates)
+            begin = bisect_left(ranked, start)
+            page = [position_at(r) for r in ranked[begin:begin + limit + 1]]
+            total = len(candidates)
+        else:
+            for r in range(start, n):
+                i = position_at(r)
+                if i in candidates:
+                    page.append(i)
+                    if len(page) > limit:
+                        break
+            total = len(candidates)
+
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            last = page[-1]
+            next_cursor = encode_cursor(sort_key, descending, rank_of(last), self.ids[last])
+
+        fields = params['fields']
+        return {
+            'courses': [project(self.courses[i], fields) for i in page],
+            'total': total,
+            'nextCursor': next_cursor,
+        }
+
+    def _resume_rank(self, cursor, sort_key, descending, rank):
+        if cursor.get('s') != sort_key or cursor.get('d') != descending:
+            raise QueryError('cursor does not match sort order')
+        # Re-anchor on the last course id in case the catalog changed between pages
+        i = self.position.get(cursor.get('id'))
+        if i is not None:
+            return (rank[i] if rank is not None else i) + 1
+        try:
+            return int(cursor.get('r', -1)) + 1
+        except (TypeError, ValueError):
+            raise QueryError('invalid cursor')
+
+    def _candidates(self, params):
+        """Intersect the posting sets for every filter; None means 'everything'"""
+        sets = []
+        for facet in FACETS:
+            values = params['facets'].get(facet)
+            if values:
+                postings = set()
+                for value in values:
+                    postings |= self.facets[facet].get(value, set())
+                sets.append(postings)
+        for flag, wanted in params['flags'].items():
+            sets.append(self.flags[(flag, wanted)])
+        for field, (low, high) in params['ranges'].items():
+            sets.append(self.range_positions(field, low, high))
+        if params['bbox']:
+            sets.append(self.bbox_positions(*params['bbox']))
+
+        if not sets:
+            return None
+        sets.sort(key=len)
+        result = set(sets[0])
+        for other in sets[1:]:
+            result &= other
+            if not result:
+                break
+        return result
+
+
+def project(course, fields):
+    """Copy only the requested top-level fields (id is always included)"""
+    if not fields:
+        return course
+    return {k: course[k] for k in fields if k in course}
+
+
+def encode_cursor(sort_key, descending, rank, course_id, **anchor):
+    """Opaque page token; anchor adds backend-specific keys (e.g. the SQLite sort value and position)"""
+    raw = json.dumps(dict({'s': sort_key, 'd': descending, 'r': rank, 'id': course_id}, **anchor), separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        cursor = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        raise QueryError('invalid cursor')
+    if not isinstance(cursor, dict):
+        raise QueryError('invalid cursor')
+    return cursor
+
+
+def _parse_float(args, name):
+    value = args.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise QueryError(f'{name} must be a number')
+
+
+def _parse_bool(value, name):
+    lowered = value.lower()
+    if lowered in ('1', 'true', 'yes'):
+        return True
+    if lowered in ('0', 'false', 'no'):
+        return False
+    raise QueryError(f'{name} must be true or false')
+
+
+def wants_query(args):
+    """True if the request uses any of the filtering/pagination parameters"""
+    return any(name in args for name in QUERY_PARAMS)
+
+
+def parse_query(args):
+    """Validate request args into the dict CourseIndex.query() expects"""
+    facets = {}
+    for facet in FACETS:
+        raw = args.get(facet)
+        if raw:
+            facets[facet] = [v.strip().lower() for v in raw.split(',') if v.strip()]
+
+    flags = {}
+    for flag in FLAGS:
+        if args.get(flag):
+            flags[flag] = _parse_bool(args[flag], flag)
+
+    ranges = {}
+    for field in ('rating', 'yardage'):
+        low, high = _parse_float(args, f'{field}_min'), _parse_float(args, f'{field}_max')
+        if low is not None or high is not None:
+            ranges[field] = (low, high)
+
+    bbox = None
+    if args.get('bbox'):
+        try:
+            west, south, east, north = (float(v) for v in args['bbox'].split(','))
+        except ValueError:
+            raise QueryError('bbox must be west,south,east,north')
+        if south > north:
+            raise QueryError('bbox south must not exceed north')
+        bbox = (west, south, east, north)
+
+    sort_key, descending = None, False
+    raw_sort = args.get('sort')
+    if raw_sort:
+        descending = raw_sort.startswith('-')
+        sort_key = raw_sort[1:] if descending else raw_sort
+        if sort_key not in SORT_KEYS:
+            raise QueryError(f"sort must be one of {', '.join(SORT_KEYS)} (prefix '-' for descending)")
+
+    try:
+        limit = int(args.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise QueryError('limit must be an integer')
+    limit = max(1, min(limit, MAX_LIMIT))
+
+    fields = None
+    if args.get('fields'):
+        fields = ['id'] + [f.strip() for f in args['fields'].split(',') if f.strip() and f.strip() != 'id']
+
+    cursor = decode_cursor(args['cursor']) if args.get('cursor') else None
+
+    return {
+        'facets': facets,
+        'flags': flags,
+        'ranges': ranges,
+        'bbox': bbox,
+        'sort': (sort_key, descending),
+        'limit': limit,
+        'fields': fields,
+        'cursor': cursor,
+    }
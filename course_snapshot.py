@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+"""
+Memory-mapped binary snapshot of the course catalog.
+
+Every worker process that parses courses.json holds a private copy of the
+catalog. A snapshot is the same data as a CourseTable written into one
+file: a fixed header, a small JSON directory, then 8-byte aligned sections.
+The sections hold fixed-width NumPy columns (numbers, flags, dictionary
+codes), and an offset table plus a UTF-8 string heap for every
+variable-length column. Opening a snapshot maps the file and parses only
+the directory. Columns are NumPy views straight onto the mapping, so every
+worker shares one page-cached copy and cold start does not depend on the
+size of the catalog.
+
+Layout (little-endian):
+
+    header     MAGIC, format version, row count, directory offset/length
+    directory  JSON: source signature, key orders, per-column kind, dtype,
+               section offsets and (for categorical columns) the categories
+    sections   column data, offset tables (uint64, rows + 1) and heaps;
+               heap entries are JSON texts, so None and non-string values
+               round-trip exactly
+    id index   uint32 row numbers sorted by id, for get(id) by binary search
+
+A new snapshot is written to a temp file, fsynced and renamed over the old
+one, so readers never see a partial file. SnapshotReader reopens the file
+when it is replaced; a reader still holding the old mapping keeps a
+consistent view until it lets go.
+
+The app's catalog store is a SnapshotCourseStore. While the snapshot was
+built from courses.json as it is now, the store serves the catalog straight
+from the mapping: get() finds a course through the id index and decodes just
+that row, and all() is a sequence whose rows are decoded as they are read.
+A course becomes a dict of the worker's own only once an edit (or a logged
+edit being replayed) writes to it. When the snapshot is stale, courses.json
+is parsed as before. After the store parses the JSON or rewrites it
+(compaction), it builds a new snapshot once the store lock is released, then
+switches to serving from that snapshot if no edit came in meanwhile.
+
+    python course_snapshot.py build [courses.json] [courses.snapshot]
+    python course_snapshot.py info [courses.snapshot]
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from collections.abc import Sequence
+from pathlib import Path
+
+import numpy as np
+
+from course_store import CourseStore, fsync_dir
+from course_table import (CategoricalColumn, CourseTable, JsonColumn, LazyTextColumn, ListColumn, NumericColumn,
+                          _json_values)
+
+MAGIC = b'CRSSNAP\0'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sIIQQQ')  # magic, version, reserved, rows, directory offset, directory length
+ALIGN = 8
+
+
+def file_signature(path):
+    """Changes whenever the file is rewritten or replaced"""
+    st = os.stat(path)
+    return [st.st_ino, st.st_size, st.st_mtime_ns]
+
+
+class _Writer:
+    """Appends 8-byte aligned sections to a file and records where each one went"""
+
+    def __init__(self, f):
+        self.f = f
+        self.offset = HEADER.size
+
+    def section(self, data):
+        if isinstance(data, np.ndarray):
+            data = np.ascontiguousarray(data).astype(data.dtype.newbyteorder('<'), copy=False).tobytes()
+        padding = -self.offset % ALIGN
+        self.f.write(b'\0' * padding)
+        self.offset += padding
+        start = self.offset
+        self.f.write(data)
+        self.offset += len(data)
+        return [start, len(data)]
+
+    def heap(self, texts):
+        """Offset table + heap sections for a list of str"""
+        encoded = [t.encode('utf-8') for t in texts]
+        offsets = np.zeros(len(encoded) + 1, dtype='<u8')
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        return {'offsets': self.section(offsets), 'heap': self.section(b''.join(encoded))}
+
+
+def _column_entry(writer, key, column):
+    if isinstance(column, NumericColumn):
+        data = column.data.astype(column.data.dtype.newbyteorder('<'))
+        return {'key': key, 'kind': 'numeric', 'dtype': data.dtype.str, 'data': writer.section(data)}
+    if isinstance(column, CategoricalColumn):
+        return {'key': key, 'kind': 'categorical', 'dtype': column.codes.dtype.str,
+                'data': writer.section(column.codes), 'categories': column.categories}
+    if isinstance(column, JsonColumn):
+        entry = {'key': key, 'kind': 'json', 'dtype': column.codes.dtype.str, 'data': writer.section(column.codes)}
+        entry.update(writer.heap(column.texts))
+        return entry
+    if isinstance(column, LazyTextColumn):
+        return {'key': key, 'kind': 'text', 'offsets': writer.section(column.offsets.astype('<u8')),
+                'heap': writer.section(column.heap)}
+    if isinstance(column, ListColumn):
+        entry = {'key': key, 'kind': 'text'}
+        entry.update(writer.heap([json.dumps(v, ensure_ascii=False) for v in column.values]))
+        return entry
+    raise TypeError(f'Cannot snapshot column {key} of type {type(column).__name__}')
+
+
+def write_snapshot(courses, path, source=None):
+    """
+    Write courses (a list of dicts or a CourseTable) as a snapshot at path,
+    atomically replacing any existing one. source is stored in the
+    directory (e.g. the signature of the courses.json it was built from).
+    """
+    table = courses if isinstance(courses, CourseTable) else CourseTable(courses)
+    path = Path(path)
+    tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(b'\0' * HEADER.size)  # filled in once the directory's position is known
+            writer = _Writer(f)
+            directory = {
+                'source': source,
+                'createdAt': time.time(),
+                'keyOrders': [list(order) for order in table.key_orders],
+                'keyOrderCodes': {'dtype': table.key_order_codes.dtype.str,
+                                  'data': writer.section(table.key_order_codes)},
+                'columns': [_column_entry(writer, key, column) for key, column in table.columns.items()],
+            }
+            if 'id' in table.columns:
+                ids = [table.columns['id'].get(i) for i in range(len(table))]
+                order = np.array(sorted(range(len(ids)), key=ids.__getitem__), dtype='<u4')
+                directory['idIndex'] = writer.section(order)
+            raw = json.dumps(directory, ensure_ascii=False).encode('utf-8')
+            start, length = writer.section(raw)
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(table), start, length))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        fsync_dir(path.parent)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    return len(table)
+
+
+class _MappedCategorical(CategoricalColumn):
+    def __init__(self, codes, categories):
+        self.codes = codes
+        self.categories = categories
+
+
+class _MappedNumeric(NumericColumn):
+    def __init__(self, data):
+        self.data = data
+
+
+class _MappedText:
+    """Per-row JSON texts in a mapped heap, decoded on access"""
+
+    def __init__(self, offsets, heap):
+        self.offsets = offsets
+        self.heap = heap
+
+    def text(self, i):
+        return bytes(self.heap[self.offsets[i]:self.offsets[i + 1]]).decode('utf-8')
+
+    def get(self, i):
+        return json.loads(self.text(i))
+
+    def raw(self):
+        """Every entry's JSON text as bytes"""
+        heap, offsets = bytes(self.heap), self.offsets.tolist()
+        return [heap[start:end] for start, end in zip(offsets, offsets[1:])]
+
+    def values(self):
+        return _json_values(self.raw())
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + len(self.heap)
+
+
+class _MappedJson:
+    """Dictionary codes into a mapped heap of distinct JSON texts"""
+
+    def __init__(self, codes, texts):
+        self.codes = codes
+        self.texts = texts
+
+    def get(self, i):
+        return self.texts.get(self.codes[i])
+
+    def values(self):
+        texts = self.texts.raw()
+        return _json_values([texts[code] for code in self.codes.tolist()])
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.texts.nbytes
+
+
+class CourseSnapshot(CourseTable):
+    """A snapshot file opened read-only with mmap; same read interface as CourseTable"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            # From the open file, not the path, in case a new snapshot was swapped in meanwhile
+            st = os.fstat(f.fileno())
+            self.signature = [st.st_ino, st.st_size, st.st_mtime_ns]
+        buffer = memoryview(self._mmap)
+        magic, version, _, rows, start, length = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{self.path} is not a course snapshot')
+        if version != FORMAT_VERSION:
+            raise ValueError(f'{self.path} is snapshot format {version}; this code reads {FORMAT_VERSION}')
+        directory = json.loads(bytes(buffer[start:start + length]).decode('utf-8'))
+
+        def array(section, dtype):
+            offset, nbytes = section
+            dtype = np.dtype(dtype)
+            return np.frombuffer(buffer, dtype=dtype, count=nbytes // dtype.itemsize, offset=offset)
+
+        def heap(entry):
+            offset, nbytes = entry['heap']
+            return _MappedText(array(entry['offsets'], '<u8'), buffer[offset:offset + nbytes])
+
+        self.size = rows
+        self.source = directory.get('source')
+        self.created_at = directory.get('createdAt')
+        self.key_orders = [tuple(order) for order in directory['keyOrders']]
+        self.key_order_codes = array(directory['keyOrderCodes']['data'], directory['keyOrderCodes']['dtype'])
+        self.columns = {}
+        for entry in directory['columns']:
+            kind = entry['kind']
+            if kind == 'numeric':
+                column = _MappedNumeric(array(entry['data'], entry['dtype']))
+            elif kind == 'categorical':
+                column = _MappedCategorical(array(entry['data'], entry['dtype']), entry['categories'])
+            elif kind == 'json':
+                column = _MappedJson(array(entry['data'], entry['dtype']), heap(entry))
+            else:
+                column = heap(entry)
+            self.columns[entry['key']] = column
+        self._id_index = array(directory['idIndex'], '<u4') if 'idIndex' in directory else None
+
+    def find(self, course_id):
+        """Row number of the course with this id, or None (binary search; no id dict is built on open)"""
+        ids, order = self.columns.get('id'), self._id_index
+        if ids is None or order is None:
+            return None
+        low, high = 0, len(order)
+        while low < high:
+            mid = (low + high) // 2
+            if ids.get(order[mid]) < course_id:
+                low = mid + 1
+            else:
+                high = mid
+        if low < len(order) and ids.get(order[low]) == course_id:
+            return int(order[low])
+        return None
+
+    def get(self, course_id):
+        """The course dict with this id, or None"""
+        i = self.find(course_id)
+        return None if i is None else self.row(i)
+
+
+class SnapshotCourses(Sequence):
+    """
+    The catalog as a SnapshotCourseStore serves it: the rows of a mapped
+    snapshot, decoded when read, except for courses that were written to,
+    which are held as dicts (and changed in place) from then on
+    """
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self._edited = {}  # row -> course dict
+
+    def __len__(self):
+        return len(self.snapshot)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        course = self._edited.get(i)
+        return course if course is not None else self.snapshot.row(i)
+
+    def __iter__(self):
+        # Decoded a column at a time; only the caller holds on to the rows
+        for i, course in enumerate(self.snapshot.to_list()):
+            yield self._edited.get(i, course)
+
+    def get(self, course_id):
+        i = self.snapshot.find(course_id)
+        return None if i is None else self[i]
+
+    def edit(self, course_id):
+        """The course's dict to change in place (decoded once, then kept), or None"""
+        i = self.snapshot.find(course_id)
+        if i is None:
+            return None
+        course = self._edited.get(i)
+        if course is None:
+            course = self._edited[i] = self.snapshot.row(i)
+        return course
+
+
+class SnapshotReader:
+    """The current snapshot at a path, reopened (one stat per access) when a new one is swapped in"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def current(self):
+        """The open CourseSnapshot, or None if there is no snapshot file"""
+        try:
+            signature = file_signature(self.path)
+        except FileNotFoundError:
+            return None
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.signature != signature:
+            with self._lock:
+                if self._snapshot is None or self._snapshot.signature != signature:
+                    # The old mapping stays valid for anyone still using it
+                    self._snapshot = CourseSnapshot(self.path)
+                snapshot = self._snapshot
+        return snapshot
+
+    def is_fresh(self, source_path):
+        """True if the current snapshot was built from source_path as it is now"""
+        snapshot = self.current()
+        return snapshot is not None and snapshot.source == file_signature(source_path)
+
+
+class SnapshotCourseStore(CourseStore):
+    """CourseStore that serves courses.json from a snapshot built from it, and keeps the snapshot current"""
+
+    def __init__(self, path, snapshot_path, **kwargs):
+        self.snapshot = SnapshotReader(snapshot_path)
+        self._snapshot_due = False
+        self._snapshot_lock = threading.Lock()
+        super().__init__(path, **kwargs)
+
+    def _read(self):
+        try:
+            if self.snapshot.is_fresh(self.path):
+                return SnapshotCourses(self.snapshot.current())
+        except (OSError, ValueError) as e:
+            print(f"Ignoring snapshot {self.snapshot.path}: {e}")
+        self._snapshot_due = True
+        return super()._read()
+
+    def _on_load(self, data):
+        # Courses served from the snapshot are found through its id index, not an id dict
+        super()._on_load(() if isinstance(data, SnapshotCourses) else data)
+
+    def _course(self, course_id):
+        if isinstance(self._data, SnapshotCourses):
+            return self._data.get(course_id)
+        return super()._course(course_id)
+
+    def _edit(self, course_id):
+        if isinstance(self._data, SnapshotCourses):
+            return self._data.edit(course_id)
+        return super()._edit(course_id)
+
+    def _has_course(self, course_id):
+        if isinstance(self._data, SnapshotCourses):
+            return self._data.snapshot.find(course_id) is not None
+        return super()._has_course(course_id)
+
+    def _compact(self):
+        super()._compact()
+        self._snapshot_due = True
+
+    # The snapshot is rebuilt by whichever call parsed or rewrote courses.json, after it let go of the lock
+
+    def refresh(self):
+        super().refresh()
+        self._write_due_snapshot()
+
+    def commit(self, edits):
+        try:
+            return super().commit(edits)
+        finally:
+            self._write_due_snapshot()
+
+    def _flush(self):
+        super()._flush()
+        self._write_due_snapshot()
+
+    def save(self):
+        super().save()
+        self._write_due_snapshot()
+
+    def _write_due_snapshot(self):
+        """Build a snapshot of courses.json as it is now, then serve from it if nothing changed meanwhile"""
+        if not self._snapshot_due:
+            return
+        with self._snapshot_lock:
+            if not self._snapshot_due:
+                return
+            self._snapshot_due = False
+            try:
+                if not self.snapshot.is_fresh(self.path):
+                    signature = file_signature(self.path)
+                    courses = super()._read()
+                    # Only label the snapshot with the file's signature if the file did not change while we read it
+                    if file_signature(self.path) != signature:
+                        return
+                    write_snapshot(courses, self.snapshot.path, source=signature)
+                snapshot = self.snapshot.current()
+            except (OSError, TypeError, ValueError) as e:
+                print(f"Could not write snapshot {self.snapshot.path}: {e}")
+                return
+        with self._lock:
+            # Every logged edit is in courses.json, and courses.json in the snapshot: drop the private copies
+            if not self._wal_records and snapshot.source == file_signature(self.path) \
+                    and self._stat_signature() == self._signature:
+                self._data = SnapshotCourses(snapshot)
+                self._by_id = {}
+
+
+if __name__ == '__main__':
+    base_dir = Path(__file__).parent
+    command, args = (sys.argv[1], sys.argv[2:]) if len(sys.argv) > 1 else (None, [])
+    if command == 'build' and len(args) <= 2:
+        source = Path(args[0]) if args else base_dir / 'courses.json'
+        target = Path(args[1]) if len(args) > 1 else source.with_suffix('.snapshot')
+        with open(source, 'r', encoding='utf-8') as f:
+            courses = json.load(f)
+        count = write_snapshot(courses, target, source=file_signature(source))
+        print(f"Wrote {count} courses to {target} ({os.path.getsize(target)} bytes)")
+    elif command == 'info' and len(args) <= 1:
+        target = Path(args[0]) if args else base_dir / 'courses.snapshot'
+        start = time.perf_counter()
+        snapshot = CourseSnapshot(target)
+        opened = time.perf_counter() - start
+        print(f"{target}: {len(snapshot)} courses, format {FORMAT_VERSION}, opened in {opened * 1000:.2f} ms")
+        for key, column in snapshot.columns.items():
+            print(f"  {key:<20} {type(column).__name__.lstrip('_'):<18} {column.nbytes:>9} bytes")
+    else:
+        print("Usage: python course_snapshot.py build [courses.json] [courses.snapshot]")
+        print("       python course_snapshot.py info [courses.snapshot]")
+        sys.exit(1)
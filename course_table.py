@@ -0,0 +1,268 @@
+"""
+Columnar in-memory representation of the course catalog.
+
+A list of course dicts repeats the same handful of strings thousands of
+times (continent, type, category, batch, identical feature objects) and pays
+a dict per course plus a boxed object per number. CourseTable stores one
+column per key instead:
+
+    - categorical strings (continent, type, category, batch, and any other
+      string column with few distinct values) as small integer codes into a
+      list of distinct values,
+    - numbers (rating, yardage, latitude, longitude, established) and flags
+      as NumPy arrays,
+    - other strings as a list of interned strings,
+    - feature objects and other nested values dictionary-encoded as JSON, so
+      269 identical igolfFeatures dicts (mappingType and all) are stored once,
+    - blurbs as one UTF-8 heap plus an offset array, decoded only when a
+      blurb is actually read.
+
+Each row also keeps a code for its key order, so row(i) rebuilds exactly the
+dict it was built from; to_list() rebuilds all of them column by column
+(one JSON parse per column rather than per value), which is faster than
+json.load of the catalog. A column whose values don't all fit its kind (say,
+a rating that is a string) falls back to a plain list, so nothing is lost.
+
+Filters work on whole columns (mask(), range_mask()), touching a few bytes
+per course instead of walking every dict. See bench_course_table.py for
+memory and scan-time numbers against the dict list.
+"""
+
+import json
+import sys
+
+import numpy as np
+
+# Always dictionary-encoded
+CATEGORICAL = ('continent', 'type', 'category', 'batch')
+# Decoded on access only
+LAZY = ('blurb',)
+# Other string columns are dictionary-encoded when at most this fraction of their values are distinct
+CATEGORICAL_RATIO = 0.5
+
+_MISSING = object()
+
+
+def _json_values(texts):
+    """Parse a sequence of JSON texts (str or bytes) with one json.loads call"""
+    if texts and isinstance(texts[0], bytes):
+        return json.loads(b'[' + b','.join(texts) + b']')
+    return json.loads('[' + ','.join(texts) + ']')
+
+
+def _dictionary_encode(values):
+    """(codes array, distinct values in first-seen order)"""
+    distinct = {}
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, value in enumerate(values):
+        codes[i] = distinct.setdefault(value, len(distinct))
+    dtype = np.int8 if len(distinct) <= 127 else np.int16 if len(distinct) <= 32767 else np.int32
+    return codes.astype(dtype), list(distinct)
+
+
+class CategoricalColumn:
+    """Small integer codes into a list of distinct (interned) values"""
+
+    def __init__(self, values):
+        self.codes, self.categories = _dictionary_encode(
+            [sys.intern(v) if isinstance(v, str) else v for v in values])
+
+    def get(self, i):
+        return self.categories[self.codes[i]]
+
+    def values(self):
+        categories = self.categories
+        return [categories[code] for code in self.codes.tolist()]
+
+    def mask(self, value):
+        try:
+            return self.codes == self.categories.index(value)
+        except ValueError:
+            return np.zeros(len(self.codes), dtype=bool)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes
+
+
+class NumericColumn:
+    """A NumPy array of ints, floats or bools (0 where the key is absent)"""
+
+    def __init__(self, values, dtype):
+        self.data = np.array(values, dtype=dtype)
+
+    def get(self, i):
+        return self.data[i].item()
+
+    def values(self):
+        return self.data.tolist()
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+
+class JsonColumn:
+    """Nested values, dictionary-encoded by their JSON text; every read returns a fresh copy"""
+
+    def __init__(self, values):
+        self.codes, self.texts = _dictionary_encode([json.dumps(v, ensure_ascii=False) for v in values])
+
+    def get(self, i):
+        return json.loads(self.texts[self.codes[i]])
+
+    def values(self):
+        texts = self.texts
+        return _json_values([texts[code] for code in self.codes.tolist()])
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes
+
+
+class LazyTextColumn:
+    """JSON values in one UTF-8 heap with an offset table, parsed only when read"""
+
+    def __init__(self, values):
+        encoded = [json.dumps(v, ensure_ascii=False).encode('utf-8') for v in values]
+        self.offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=self.offsets[1:])
+        self.heap = b''.join(encoded)
+
+    def get(self, i):
+        return json.loads(self.heap[self.offsets[i]:self.offsets[i + 1]].decode('utf-8'))
+
+    def values(self):
+        heap, offsets = bytes(self.heap), self.offsets.tolist()
+        return _json_values([heap[start:end] for start, end in zip(offsets, offsets[1:])])
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + len(self.heap)
+
+
+class ListColumn:
+    """Plain Python values (interned if strings)"""
+
+    def __init__(self, values):
+        self.values = [sys.intern(v) if isinstance(v, str) else v for v in values]
+
+    def get(self, i):
+        return self.values[i]
+
+    def all(self):
+        return list(self.values)
+
+    @property
+    def nbytes(self):
+        return 8 * len(self.values)
+
+
+def build_column(key, values):
+    """
+    Pick the most compact column kind that holds every value exactly.
+    values has _MISSING where a row lacks the key; those rows get a filler
+    (the row's key order says the key is absent).
+    """
+    kept = [v for v in values if v is not _MISSING]
+    kinds = {type(v) for v in kept}
+
+    def filled(filler):
+        return [filler if v is _MISSING else v for v in values]
+
+    if key in LAZY:
+        return LazyTextColumn(filled(None))
+    if kinds == {bool}:
+        return NumericColumn(filled(False), np.bool_)
+    if kinds == {int} and all(-2**63 <= v < 2**63 for v in kept):
+        narrow = all(-2**31 <= v < 2**31 for v in kept)
+        return NumericColumn(filled(0), np.int32 if narrow else np.int64)
+    if kinds == {float}:
+        return NumericColumn(filled(0.0), np.float64)
+    if kinds <= {str, type(None)}:
+        if key in CATEGORICAL or len(set(kept)) <= CATEGORICAL_RATIO * max(len(kept), 1):
+            return CategoricalColumn(filled(None))
+        return ListColumn(filled(None))
+    if kinds <= {dict, list, type(None)}:
+        return JsonColumn(filled(None))
+    return ListColumn(filled(None))
+
+
+class CourseTable:
+    """The catalog as columns; row(i) / get(id) materialize a course dict on demand"""
+
+    def __init__(self, courses):
+        self.size = len(courses)
+        self.key_order_codes, self.key_orders = _dictionary_encode([tuple(c) for c in courses])
+        keys = list(dict.fromkeys(key for order in self.key_orders for key in order))
+        self.columns = {key: build_column(key, [c.get(key, _MISSING) for c in courses]) for key in keys}
+        ids = self.columns.get('id')
+        self._row_of = {ids.get(i): i for i in range(self.size)} if ids is not None else {}
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def __len__(self):
+        return self.size
+
+    def row(self, i):
+        """The course dict at position i, with its original key order"""
+        return {key: self.columns[key].get(i) for key in self.key_orders[self.key_order_codes[i]]}
+
+    def get(self, course_id):
+        """The course dict with this id, or None"""
+        i = self._row_of.get(course_id)
+        return None if i is None else self.row(i)
+
+    def rows(self):
+        for i in range(self.size):
+            yield self.row(i)
+
+    def to_list(self):
+        """Every course dict, in order; decodes each column in one pass instead of value by value"""
+        columns = {key: column.all() if isinstance(column, ListColumn) else column.values()
+                   for key, column in self.columns.items()}
+        orders = [[(key, columns[key]) for key in order] for order in self.key_orders]
+        return [{key: values[i] for key, values in orders[code]}
+                for i, code in enumerate(self.key_order_codes.tolist())]
+
+    def has(self, key):
+        """Boolean array: which rows have the key at all"""
+        wanted = np.array([key in order for order in self.key_orders], dtype=bool)
+        return wanted[self.key_order_codes]
+
+    def array(self, key):
+        """NumPy array of a numeric or flag column"""
+        column = self.columns[key]
+        if not isinstance(column, NumericColumn):
+            raise TypeError(f'{key} is not a numeric column')
+        return column.data
+
+    def mask(self, key, value):
+        """Boolean array: rows whose categorical column equals value"""
+        column = self.columns[key]
+        if isinstance(column, CategoricalColumn):
+            return column.mask(value) & self.has(key)
+        return np.array([column.get(i) == value for i in range(self.size)], dtype=bool) & self.has(key)
+
+    def range_mask(self, key, low=None, high=None):
+        """Boolean array: rows whose numeric column is within [low, high]"""
+        data = self.array(key)
+        result = self.has(key)
+        if low is not None:
+            result &= data >= low
+        if high is not None:
+            result &= data <= high
+        return result
+
+    def blurb(self, i):
+        """Decode just one course's blurb"""
+        column = self.columns.get('blurb')
+        return column.get(i) if column is not None and 'blurb' in self.key_orders[self.key_order_codes[i]] else None
+
+    def nbytes(self):
+        """Bytes held in column buffers (NumPy arrays and heaps; not the shared dictionaries)"""
+        return self.key_order_codes.nbytes + sum(column.nbytes for column in self.columns.values())
+
@@ -0,0 +1,137 @@
+"""
+Shared HTTP client for outbound fetches (image search and image downloads).
+
+All threads share one set of urllib3 connection pools (one per host, reused
+with keep-alive), while each thread gets its own requests.Session on top of
+them, since Session objects themselves are not thread-safe. Transient failures
+(connection errors, 429 and 5xx responses) are retried with exponential
+backoff and Retry-After support instead of ad-hoc sleeps in the callers.
+Every request that goes on the wire waits for a token from the shared
+RateLimiter (global and per-host buckets, see rate_limit.py): the adapter
+takes one before each request it sends (redirects included), and urllib3
+takes one before each of its own retries, after the backoff. A host that is
+throttling us therefore never sees more than its configured rate.
+
+Tunable through the environment:
+    HTTP_POOL_CONNECTIONS  number of per-host pools kept open (default 32)
+    HTTP_POOL_MAXSIZE      connections kept per host (default 10)
+    HTTP_RETRIES           retries for transient failures (default 2)
+    HTTP_BACKOFF           backoff factor in seconds (default 0.5)
+    HTTP_TIMEOUT           default (connect, read) timeout in seconds (default 15)
+"""
+
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from rate_limit import RateLimiter
+
+POOL_CONNECTIONS = int(os.environ.get('HTTP_POOL_CONNECTIONS', '32'))
+POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', '10'))
+RETRIES = int(os.environ.get('HTTP_RETRIES', '2'))
+BACKOFF = float(os.environ.get('HTTP_BACKOFF', '0.5'))
+TIMEOUT = float(os.environ.get('HTTP_TIMEOUT', '15'))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class RateLimitedRetry(Retry):
+    """Retry that waits for a rate-limit token for the host before every retry attempt"""
+
+    rate_limiter = None
+    host = None
+
+    def new(self, **kw):
+        retry = super().new(**kw)
+        retry.rate_limiter = self.rate_limiter
+        retry.host = self.host
+        return retry
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        retry = super().increment(method, url, response=response, error=error, _pool=_pool, _stacktrace=_stacktrace)
+        if _pool is not None:
+            retry.host = _pool.host
+        return retry
+
+    def sleep(self, response=None):
+        super().sleep(response)
+        if self.rate_limiter is not None and self.host:
+            self.rate_limiter.acquire_host(self.host)
+
+
+def make_retry(retries=RETRIES, backoff=BACKOFF, rate_limiter=None):
+    """Retry policy for idempotent requests: connection errors, 429 and 5xx"""
+    retry = RateLimitedRetry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    retry.rate_limiter = rate_limiter
+    return retry
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """HTTPAdapter that waits for a rate-limit token before sending each request"""
+
+    def __init__(self, rate_limiter=None, **kwargs):
+        self.rate_limiter = rate_limiter
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(request.url)
+        return super().send(request, **kwargs)
+
+
+def make_adapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, retry=None, rate_limiter=None):
+    return RateLimitedAdapter(
+        rate_limiter=rate_limiter,
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=retry or make_retry(rate_limiter=rate_limiter),
+        pool_block=False,
+    )
+
+
+class HttpClient:
+    """Thread-safe facade: shared connection pools, one Session per thread"""
+
+    def __init__(self, adapter=None, timeout=TIMEOUT, rate_limiter=None):
+        self.adapter = adapter or make_adapter(rate_limiter=rate_limiter)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount('http://', self.adapter)
+            session.mount('https://', self.adapter)
+            self._local.session = session
+        return session
+
+    def get(self, url, **kwargs):
+        """requests.get through the shared pools (use as a context manager when streaming)"""
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def close(self):
+        self.adapter.close()
+
+
+# Process-wide default client
+client = HttpClient(rate_limiter=RateLimiter())
+
+
+def get(url, **kwargs):
+    return client.get(url, **kwargs)
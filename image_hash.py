@@ -0,0 +1,325 @@
+"""
+Perceptual hashing for near-duplicate image detection.
+
+MD5 only catches byte-identical files; the same photo resized or re-encoded
+by a CDN hashes differently. Each image also gets a 64-bit difference hash
+(dHash): the picture is shrunk to 9x8 grayscale pixels and every bit records
+whether a pixel is brighter than its left neighbour. Visually similar images
+end up a small Hamming distance apart.
+
+FingerprintIndex keeps a fingerprint per file (md5, dhash, width, height,
+format) keyed by (filename, size, mtime), persisted in a SQLite sidecar so
+dedupe checks and audits after a restart need a stat() per file but no image
+reads. The dhashes are kept in a BK-tree so "which images are within
+distance d of this one" does not compare against every file in IMAGES_DIR.
+"""
+
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from image_store import md5_file
+
+HASH_SIZE = 8
+# Max Hamming distance (out of 64 bits) at which two images count as the same photo
+NEAR_DUPLICATE_DISTANCE = int(os.environ.get('NEAR_DUPLICATE_DISTANCE', '10'))
+
+Fingerprint = namedtuple('Fingerprint', ['md5', 'dhash', 'width', 'height', 'format'])
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+def dhash(image):
+    """64-bit difference hash of a PIL image"""
+    if image.format == 'JPEG':
+        # Let the decoder downscale by a power of two instead of decoding full size
+        image.draft('L', (HASH_SIZE * 8, HASH_SIZE * 8))
+    small = image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def image_info(path):
+    """(dhash, width, height, format) of an image file; all None if Pillow cannot decode it"""
+    try:
+        with Image.open(path) as image:
+            width, height = image.size
+            return dhash(image), width, height, image.format
+    except Exception:
+        return None, None, None, None
+
+
+def fingerprint_file(path, md5=None):
+    """Fingerprint of a file; pass md5 if it is already known (e.g. hashed while downloading)"""
+    return Fingerprint(md5 or md5_file(path), *image_info(path))
+
+
+def is_duplicate(fingerprint, others, max_distance=NEAR_DUPLICATE_DISTANCE):
+    """True if fingerprint matches any of others byte-for-byte or perceptually"""
+    for other in others:
+        if other is None:
+            continue
+        if fingerprint.md5 == other.md5:
+            return True
+        if fingerprint.dhash is not None and other.dhash is not None \
+                and hamming(fingerprint.dhash, other.dhash) <= max_distance:
+            return True
+    return False
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over 64-bit hashes under Hamming distance. Each node
+    holds a hash and the set of items that have it; children are keyed by
+    their distance to the node, so a radius query can skip whole subtrees
+    using the triangle inequality. Removal empties an item set in place;
+    the tree is rebuilt once most nodes are empty.
+    """
+
+    def __init__(self):
+        self._root = None   # [hash, items, {distance: child}]
+        self._nodes = {}    # hash -> node
+        self._empty = 0
+
+    def __len__(self):
+        return len(self._nodes) - self._empty
+
+    def add(self, value, item):
+        node = self._nodes.get(value)
+        if node is not None:
+            if not node[1]:
+                self._empty -= 1
+            node[1].add(item)
+            return
+        node = [value, {item}, {}]
+        self._nodes[value] = node
+        if self._root is None:
+            self._root = node
+            return
+        current = self._root
+        while True:
+            distance = hamming(value, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def remove(self, value, item):
+        node = self._nodes.get(value)
+        if node is None or item not in node[1]:
+            return
+        node[1].discard(item)
+        if not node[1]:
+            self._empty += 1
+            if self._empty > len(self._nodes) // 2:
+                self._rebuild()
+
+    def _rebuild(self):
+        entries = [(value, items) for value, (_, items, _) in self._nodes.items() if items]
+        self._root, self._nodes, self._empty = None, {}, 0
+        for value, items in entries:
+            for item in items:
+                self.add(value, item)
+
+    def search(self, value, max_distance):
+        """[(distance, hash, items)] for every stored hash within max_distance"""
+        found = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= max_distance and node[1]:
+                found.append((distance, node[0], set(node[1])))
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return found
+
+
+class FingerprintIndex:
+    """
+    filename -> Fingerprint for an images directory, plus a BK-tree over the
+    dhashes. With db_path the entries are persisted to (and loaded from) a
+    SQLite sidecar; an entry is trusted only while the file's size and mtime
+    still match.
+    """
+
+    def __init__(self, images_dir, db_path=None, workers=4):
+        self.images_dir = Path(images_dir)
+        self.db_path = db_path
+        self.workers = workers
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._entries = {}  # filename -> ((size, mtime_ns), Fingerprint)
+        self._tree = BKTree()
+        if db_path:
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            with self._connect() as db:
+                db.execute(
+                    'CREATE TABLE IF NOT EXISTS fingerprints ('
+                    ' name TEXT PRIMARY KEY,'
+                    ' size INTEGER NOT NULL,'
+                    ' mtime_ns INTEGER NOT NULL,'
+                    ' md5 TEXT NOT NULL,'
+                    ' dhash TEXT,'
+                    ' width INTEGER,'
+                    ' height INTEGER,'
+                    ' format TEXT)'
+                )
+            self._load()
+
+    def _connect(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=10)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    def _load(self):
+        rows = self._connect().execute(
+            'SELECT name, size, mtime_ns, md5, dhash, width, height, format FROM fingerprints'
+        )
+        with self._lock:
+            for name, size, mtime_ns, md5, dhash_hex, width, height, fmt in rows:
+                # dhashes are unsigned 64-bit, which SQLite INTEGER cannot hold; stored as hex
+                fingerprint = Fingerprint(md5, int(dhash_hex, 16) if dhash_hex else None, width, height, fmt)
+                self._store(name, (size, mtime_ns), fingerprint, persist=False)
+
+    def _write(self, name, signature, fingerprint):
+        if not self.db_path:
+            return
+        with self._connect() as db:
+            db.execute(
+                'INSERT OR REPLACE INTO fingerprints (name, size, mtime_ns, md5, dhash, width, height, format)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (name, signature[0], signature[1], fingerprint.md5,
+                 None if fingerprint.dhash is None else f'{fingerprint.dhash:016x}',
+                 fingerprint.width, fingerprint.height, fingerprint.format),
+            )
+
+    def _delete(self, name):
+        if not self.db_path:
+            return
+        with self._connect() as db:
+            db.execute('DELETE FROM fingerprints WHERE name = ?', (name,))
+
+    @staticmethod
+    def _signature(path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (st.st_size, st.st_mtime_ns)
+
+    def _store(self, name, signature, fingerprint, persist=True):
+        old = self._entries.get(name)
+        if old is not None and old[1].dhash is not None:
+            self._tree.remove(old[1].dhash, name)
+        self._entries[name] = (signature, fingerprint)
+        if fingerprint.dhash is not None:
+            self._tree.add(fingerprint.dhash, name)
+        if persist:
+            self._write(name, signature, fingerprint)
+
+    def get(self, path):
+        """Fingerprint of an image file (computed once per size/mtime), or None if missing"""
+        path = Path(path)
+        signature = self._signature(path)
+        with self._lock:
+            if signature is None:
+                self.discard(path)
+                return None
+            cached = self._entries.get(path.name)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+        fingerprint = fingerprint_file(path)
+        with self._lock:
+            self._store(path.name, signature, fingerprint)
+        return fingerprint
+
+    def add(self, path, fingerprint=None):
+        """Record a file that was just written (with its fingerprint, if already computed)"""
+        path = Path(path)
+        signature = self._signature(path)
+        if signature is None:
+            return None
+        if fingerprint is None:
+            fingerprint = fingerprint_file(path)
+        with self._lock:
+            self._store(path.name, signature, fingerprint)
+        return fingerprint
+
+    def discard(self, path):
+        name = Path(path).name
+        with self._lock:
+            old = self._entries.pop(name, None)
+            if old is not None:
+                if old[1].dhash is not None:
+                    self._tree.remove(old[1].dhash, name)
+                self._delete(name)
+
+    def entries(self):
+        """{filename: Fingerprint} snapshot of everything indexed"""
+        with self._lock:
+            return {name: fp for name, (_, fp) in self._entries.items()}
+
+    def sync(self, paths):
+        """Fingerprint every path (in parallel, skipping unchanged files) and forget the rest"""
+        paths = [Path(p) for p in paths]
+        wanted = {p.name for p in paths}
+        with self._lock:
+            for name in [name for name in self._entries if name not in wanted]:
+                self.discard(name)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(self.get, paths))
+
+    def duplicate_groups(self, max_distance=NEAR_DUPLICATE_DISTANCE):
+        """
+        Groups of filenames that are near-duplicates of each other (connected
+        components of the "within max_distance" relation), largest first
+        """
+        with self._lock:
+            entries = {name: fp for name, (_, fp) in self._entries.items()}
+            parent = {name: name for name in entries}
+
+            def find(name):
+                while parent[name] != name:
+                    parent[name] = parent[parent[name]]
+                    name = parent[name]
+                return name
+
+            def union(a, b):
+                ra, rb = find(a), find(b)
+                if ra != rb:
+                    parent[max(ra, rb)] = min(ra, rb)
+
+            by_md5 = {}
+            for name, fp in entries.items():
+                first = by_md5.setdefault(fp.md5, name)
+                if first != name:
+                    union(first, name)
+            searched = set()
+            for name, fp in entries.items():
+                if fp.dhash is None or fp.dhash in searched:
+                    continue
+                searched.add(fp.dhash)
+                for _, _, names in self._tree.search(fp.dhash, max_distance):
+                    for other in names:
+                        union(name, other)
+
+        groups = {}
+        for name in entries:
+            groups.setdefault(find(name), []).append(name)
+        return sorted((sorted(g) for g in groups.values() if len(g) > 1), key=lambda g: (-len(g), g[0]))
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Content-addressed storage for course images.
+
+Every image is stored once as a blob named by the MD5 of its bytes, in
+sharded directories: images/blobs/ab/cd/abcd...{ext}. A small mapping table,
+images/slots.json, says which blob fills each (course_id, slot). Identical
+downloads for different courses or slots share one file, swapping the hero
+with another slot only rewrites the table, and a blob's URL never changes
+meaning, so it can be served as immutable.
+
+Files under the old {course_id}_{slot}{ext} names are never touched by the
+app; moving them into the store is an explicit step (migrate_images.py runs
+it, after renaming even older {course_id}{ext} files to hero images):
+
+    python image_store.py import
+
+The table is reloaded whenever slots.json is replaced by another process. To
+get a directory of {course_id}_{slot}{ext} files back (e.g. for
+public/images), run:
+
+    python image_store.py export public/images
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+from pathlib import Path
+
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.webp']
+IMAGE_SLOTS = ['hero', '1', '2']
+BLOB_NAME = re.compile(r'^[0-9a-f]{32}\.[a-z0-9]{2,5}$')
+
+
+def parse_image_name(filename):
+    """Split '{course_id}_{slot}{ext}' into (course_id, slot, ext), or None"""
+    stem, ext = os.path.splitext(filename)
+    if ext not in IMAGE_EXTENSIONS:
+        return None
+    course_id, sep, slot = stem.rpartition('_')
+    if not sep or not course_id or slot not in IMAGE_SLOTS:
+        return None
+    return course_id, slot, ext
+
+
+def blob_name(md5, ext):
+    return f"{md5}{ext.lower()}"
+
+
+def md5_file(path):
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ImageStore:
+    """Blob files plus the (course_id, slot) -> blob table, kept in memory and persisted on change"""
+
+    def __init__(self, images_dir):
+        self.images_dir = Path(images_dir)
+        self.blobs_dir = self.images_dir / 'blobs'
+        self.table_path = self.images_dir / 'slots.json'
+        self._version = 0
+        self._lock = threading.RLock()
+        self._slots = {}  # (course_id, slot) -> blob name
+        self._refs = {}   # blob name -> {(course_id, slot)}
+        self._table_signature = None
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        self.refresh()
+
+    def _load(self):
+        self._slots, self._refs = {}, {}
+        self._table_signature = self._signature()
+        try:
+            with open(self.table_path, 'r', encoding='utf-8') as f:
+                table = json.load(f)
+        except FileNotFoundError:
+            return
+        for course_id, slots in table.items():
+            for slot, blob in slots.items():
+                self._link(course_id, slot, blob)
+
+    def _save(self):
+        table = {}
+        for (course_id, slot), blob in sorted(self._slots.items()):
+            table.setdefault(course_id, {})[slot] = blob
+        tmp = self.table_path.with_name(self.table_path.name + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(table, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, self.table_path)
+        self._version += 1
+        self._table_signature = self._signature()
+
+    def _signature(self):
+        try:
+            st = os.stat(self.table_path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def blob_path(self, blob):
+        return self.blobs_dir / blob[:2] / blob[2:4] / blob
+
+    def _link(self, course_id, slot, blob):
+        """Point a slot at a blob; returns the blob it pointed at before (or None)"""
+        key = (course_id, slot)
+        old = self._slots.get(key)
+        if old == blob:
+            return None
+        if old is not None:
+            self._refs[old].discard(key)
+            if not self._refs[old]:
+                del self._refs[old]
+        if blob is None:
+            self._slots.pop(key, None)
+        else:
+            self._slots[key] = blob
+            self._refs.setdefault(blob, set()).add(key)
+        return old
+
+    def _collect(self, blobs):
+        """Delete blobs that no slot refers to any more; returns their names"""
+        orphans = []
+        for blob in blobs:
+            if blob is not None and blob not in self._refs:
+                try:
+                    os.unlink(self.blob_path(blob))
+                except FileNotFoundError:
+                    pass
+                orphans.append(blob)
+        return orphans
+
+    # --- writers (each returns the names of blobs it deleted) ---
+
+    def put(self, course_id, slot, tmp_path, md5, ext):
+        """
+        Move a fully written temp file into the store (or drop it if that
+        content is already stored) and assign it to the slot.
+        Returns (blob name, deleted blobs).
+        """
+        blob = blob_name(md5, ext)
+        path = self.blob_path(blob)
+        with self._lock:
+            self.refresh()
+            if path.exists():
+                os.unlink(tmp_path)
+            else:
+                os.makedirs(path.parent, exist_ok=True)
+                os.replace(tmp_path, path)
+            old = self._link(course_id, slot, blob)
+            self._save()
+            return blob, self._collect([old])
+
+    def clear(self, course_id, slot):
+        """Empty a slot"""
+        with self._lock:
+            self.refresh()
+            old = self._link(course_id, slot, None)
+            if old is None:
+                return []
+            self._save()
+            return self._collect([old])
+
+    def swap(self, course_id, slot_a, slot_b):
+        """Exchange two slots (either may be empty); a metadata-only change"""
+        with self._lock:
+            self.refresh()
+            blob_a = self._slots.get((course_id, slot_a))
+            blob_b = self._slots.get((course_id, slot_b))
+            self._link(course_id, slot_a, blob_b)
+            self._link(course_id, slot_b, blob_a)
+            self._save()
+
+    # --- readers ---
+
+    @property
+    def version(self):
+        """Bumped on every change to the slot table (including ones made by other processes)"""
+        self.refresh()
+        return self._version
+
+    def find(self, course_id):
+        """
+        Find all existing images for a course (hero, 1, 2)
+        Returns dict with 'hero', '1', '2' keys containing (path, extension) or None
+        """
+        self.refresh()
+        images = {}
+        for slot in IMAGE_SLOTS:
+            blob = self._slots.get((course_id, slot))
+            images[slot] = (self.blob_path(blob), os.path.splitext(blob)[1]) if blob else None
+        return images
+
+    def files(self):
+        """Every (course_id, slot, blob path) in the table"""
+        self.refresh()
+        with self._lock:
+            return [(course_id, slot, self.blob_path(blob)) for (course_id, slot), blob in self._slots.items()]
+
+    def blobs(self):
+        """Every stored blob name with the slots that use it"""
+        self.refresh()
+        with self._lock:
+            return {blob: sorted(refs) for blob, refs in self._refs.items()}
+
+    def resolve(self, filename):
+        """Blob path behind an old-style {course_id}_{slot}{ext} name (any extension), or None"""
+        self.refresh()
+        stem = os.path.splitext(filename)[0]
+        parsed = parse_image_name(stem + '.jpg')
+        if not parsed:
+            return None
+        blob = self._slots.get(parsed[:2])
+        return self.blob_path(blob) if blob else None
+
+    def resolve_blob(self, name):
+        """Path of a blob by name, or None if the name is malformed or unknown"""
+        if not BLOB_NAME.match(name):
+            return None
+        path = self.blob_path(name)
+        return path if path.exists() else None
+
+    def refresh(self):
+        """Reload the slot table if another process replaced slots.json (one stat)"""
+        if self._signature() == self._table_signature:
+            return
+        with self._lock:
+            if self._signature() != self._table_signature:
+                self._load()
+                self._version += 1
+
+    # --- old-style files ---
+
+    def legacy_files(self):
+        """{(course_id, slot): [paths]} of {course_id}_{slot}{ext} files in the images directory"""
+        found = {}
+        with os.scandir(self.images_dir) as it:
+            for entry in it:
+                parsed = parse_image_name(entry.name) if entry.is_file() else None
+                if parsed:
+                    course_id, slot, ext = parsed
+                    found.setdefault((course_id, slot), []).append((IMAGE_EXTENSIONS.index(ext), entry.path))
+        return {key: [path for _, path in sorted(candidates)] for key, candidates in found.items()}
+
+    def import_files(self):
+        """
+        Move {course_id}_{slot}{ext} files from the images directory into the
+        store, replacing the slot's current image. When a slot has files with
+        several extensions, the first in IMAGE_EXTENSIONS order is imported
+        and the rest are left alone. Returns (imported count, deleted blobs).
+        """
+        with self._lock:
+            self.refresh()
+            found = self.legacy_files()
+            released = []
+            for (course_id, slot), candidates in found.items():
+                path = candidates[0]
+                blob = blob_name(md5_file(path), os.path.splitext(path)[1])
+                dest = self.blob_path(blob)
+                if dest.exists():
+                    os.unlink(path)
+                else:
+                    os.makedirs(dest.parent, exist_ok=True)
+                    os.replace(path, dest)
+                released.append(self._link(course_id, slot, blob))
+                if len(candidates) > 1:
+                    print(f"Imported {Path(path).name}; left {len(candidates) - 1} other file(s) for {course_id}/{slot} in place")
+            if found:
+                self._save()
+            return len(found), self._collect(released)
+
+    def export(self, dest_dir, link=True):
+        """Write {course_id}_{slot}{ext} copies (hard links where possible) of every slot into dest_dir"""
+        dest_dir = Path(dest_dir)
+        os.makedirs(dest_dir, exist_ok=True)
+        written = 0
+        for course_id, slot, path in self.files():
+            ext = path.suffix
+            # Only one file per slot, so stale files under other extensions must go
+            for other in IMAGE_EXTENSIONS:
+                stale = dest_dir / f"{course_id}_{slot}{other}"
+                if other != ext and stale.exists():
+                    stale.unlink()
+            target = dest_dir / f"{course_id}_{slot}{ext}"
+            if target.exists():
+                if os.path.samefile(target, path) or md5_file(target) == path.stem:
+                    continue
+                target.unlink()
+            try:
+                if not link:
+                    raise OSError
+                os.link(path, target)
+            except OSError:
+                shutil.copy2(path, target)
+            written += 1
+        return written
+
+
+if __name__ == '__main__':
+    images_dir = Path(__file__).parent / 'images'
+    if len(sys.argv) == 2 and sys.argv[1] == 'import':
+        count, deleted = ImageStore(images_dir).import_files()
+        print(f"Imported {count} images into {images_dir} ({len(deleted)} replaced blobs deleted)")
+    elif len(sys.argv) == 3 and sys.argv[1] == 'export':
+        count = ImageStore(images_dir).export(sys.argv[2])
+        print(f"Exported {count} images to {sys.argv[2]}")
+    else:
+        print(f"Usage: {sys.argv[0]} import")
+        print(f"       {sys.argv[0]} export <directory>")
+        sys.exit(1)
@@ -0,0 +1,304 @@
+"""
+Resized variants of course images, generated on demand and cached on disk.
+
+A variant is identified by the source file, its size/mtime (so replacing an
+image never serves a stale thumbnail), the requested box and the fit mode.
+Variants live flat in one cache directory whose total size is capped: the
+least recently used files are deleted once the cap is exceeded. Concurrent
+requests for the same missing variant share one resize instead of racing,
+and standard widths can be generated in the background right after a
+download so the first page view is already served from the cache.
+
+Variants can also be transcoded to a modern format (AVIF where Pillow
+supports it, WebP) picked from the request's Accept header; a full-size
+transcode that comes out no smaller than the original is not kept.
+"""
+
+import hashlib
+import mimetypes
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+from PIL import Image, ImageOps, features
+
+FITS = ('contain', 'cover')
+MAX_DIMENSION = 4096
+# Grid cards, 2x grid cards / carousel, detail modal
+STANDARD_WIDTHS = (400, 800, 1600)
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Source extension -> output format (GIFs become PNG stills)
+EXTENSION_FORMATS = {'.jpg': 'JPEG', '.jpeg': 'JPEG', '.png': 'PNG', '.webp': 'WEBP', '.gif': 'PNG'}
+
+# Output format -> (Pillow format, extension, save options)
+OUTPUT_FORMATS = {
+    'JPEG': ('JPEG', '.jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'PNG': ('PNG', '.png', {'optimize': True}),
+    'WEBP': ('WEBP', '.webp', {'quality': 80, 'method': 4}),
+    'AVIF': ('AVIF', '.avif', {'quality': 60, 'speed': 6}),
+}
+
+FORMAT_MIME_TYPES = {'AVIF': 'image/avif', 'WEBP': 'image/webp'}
+mimetypes.add_type('image/avif', '.avif')
+mimetypes.add_type('image/webp', '.webp')
+
+
+def _supported(fmt):
+    # AVIF needs Pillow 11.3+ built with libavif
+    return features.check(fmt.lower()) is True
+
+
+# Modern formats offered to clients, best first (IMAGE_MODERN_FORMATS=webp to skip AVIF)
+MODERN_FORMATS = tuple(
+    fmt for fmt in os.environ.get('IMAGE_MODERN_FORMATS', 'avif,webp').upper().split(',')
+    if fmt in FORMAT_MIME_TYPES and _supported(fmt)
+)
+
+
+def negotiate_format(accept, source):
+    """
+    Best modern format for a source image that the client explicitly accepts,
+    or None to serve the source format. `accept` iterates (mimetype, quality)
+    pairs, like werkzeug's request.accept_mimetypes; wildcards don't count,
+    since */* from a non-browser client says nothing about AVIF support.
+    """
+    if Path(source).suffix.lower() == '.gif':
+        return None  # keep animations intact
+    accepted = {value.lower() for value, quality in accept if quality > 0}
+    for fmt in MODERN_FORMATS:
+        if FORMAT_MIME_TYPES[fmt] in accepted:
+            if EXTENSION_FORMATS.get(Path(source).suffix.lower()) == fmt:
+                return None
+            return fmt
+    return None
+
+
+def transcode(source, dest, fmt):
+    """Full-size copy of source in another format; returns False (writing nothing) if it isn't smaller"""
+    save_format, _, options = OUTPUT_FORMATS[fmt]
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        dest = Path(dest)
+        fd, tmp = tempfile.mkstemp(dir=dest.parent, prefix=f'{dest.name}.', suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                image.save(f, save_format, **options)
+            if os.path.getsize(tmp) >= os.path.getsize(source):
+                os.unlink(tmp)
+                return False
+            os.replace(tmp, dest)
+            return True
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+
+class VariantError(ValueError):
+    """Invalid resize parameters (reported to the client as a 400)"""
+
+
+def parse_variant_params(args):
+    """
+    (width, height, fit) from ?w=&h=&fit= query args, or None when no resize
+    was asked for. Raises VariantError on bad values.
+    """
+    if not any(args.get(key) for key in ('w', 'h', 'fit')):
+        return None
+    dims = []
+    for key in ('w', 'h'):
+        raw = args.get(key)
+        if not raw:
+            dims.append(None)
+            continue
+        try:
+            value = int(raw)
+        except ValueError:
+            raise VariantError(f'{key} must be an integer')
+        if not 1 <= value <= MAX_DIMENSION:
+            raise VariantError(f'{key} must be between 1 and {MAX_DIMENSION}')
+        dims.append(value)
+    width, height = dims
+    if width is None and height is None:
+        raise VariantError('w or h is required')
+    fit = args.get('fit') or 'contain'
+    if fit not in FITS:
+        raise VariantError(f"fit must be one of: {', '.join(FITS)}")
+    if fit == 'cover' and (width is None or height is None):
+        raise VariantError('fit=cover needs both w and h')
+    return width, height, fit
+
+
+def resize(image, width, height, fit):
+    """Resized copy of a PIL image; never upscales"""
+    if fit == 'cover':
+        scale = min(1.0, image.width / width, image.height / height)
+        box = (max(1, round(width * scale)), max(1, round(height * scale)))
+        return ImageOps.fit(image, box, Image.LANCZOS)
+    box = (width or image.width, height or image.height)
+    image = image.copy()
+    image.thumbnail(box, Image.LANCZOS)
+    return image
+
+
+class VariantCache:
+    """On-disk cache of resized images, bounded by total bytes with LRU eviction"""
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES, workers=2):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._files = OrderedDict()  # name -> size, least recently used first
+        self._bytes = 0
+        self._inflight = {}  # name -> Future of the generation in progress
+        self._not_smaller = set()  # full-size transcodes that didn't beat their source
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-variants')
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        """Adopt variants left by a previous run, oldest access first"""
+        found = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.endswith('.part'):
+                    st = entry.stat()
+                    found.append((st.st_mtime, entry.name, st.st_size))
+        for _, name, size in sorted(found):
+            self._files[name] = size
+            self._bytes += size
+
+    @staticmethod
+    def _source_key(source):
+        st = os.stat(source)
+        return hashlib.sha1(f'{st.st_size}:{st.st_mtime_ns}'.encode()).hexdigest()[:10]
+
+    def variant_name(self, source, width, height, fit, fmt):
+        _, ext, _ = OUTPUT_FORMATS[fmt]
+        box = f"{width or ''}x{height or ''}"
+        return f"{Path(source).stem}.{self._source_key(source)}.{box}.{fit}{ext}"
+
+    def get(self, source, width, height, fit='contain', fmt=None):
+        """
+        Path of the variant of `source` (generating it if needed), or `source`
+        itself when the request would not make the image any smaller. fmt
+        transcodes to another output format (default: the source's own).
+        """
+        source = Path(source)
+        fmt = fmt or EXTENSION_FORMATS.get(source.suffix.lower(), 'PNG')
+        name = self.variant_name(source, width, height, fit, fmt)
+
+        with self._lock:
+            if name in self._not_smaller:
+                return source
+            if name in self._files:
+                self._files.move_to_end(name)
+                path = self.cache_dir / name
+                try:
+                    os.utime(path)  # keeps LRU order across restarts (see _scan)
+                    return path
+                except FileNotFoundError:
+                    self._forget(name)
+            future = self._inflight.get(name)
+            owner = future is None
+            if owner:
+                future = self._inflight[name] = Future()
+
+        if not owner:
+            # Someone else is already generating this variant; wait for their result
+            return future.result()
+        try:
+            path = self._generate(source, name, width, height, fit, fmt)
+            future.set_result(path)
+            return path
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(name, None)
+
+    def _generate(self, source, name, width, height, fit, fmt):
+        save_format, _, options = OUTPUT_FORMATS[fmt]
+        transcoding = fmt != EXTENSION_FORMATS.get(source.suffix.lower(), 'PNG')
+        with Image.open(source) as image:
+            full_size = (width is None or width >= image.width) and (height is None or height >= image.height)
+            if full_size and not transcoding:
+                return source  # already small enough; not worth caching a copy
+            image = ImageOps.exif_transpose(image)
+            if save_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            variant = resize(image, width, height, fit)
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, prefix=f'{name}.', suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                variant.save(f, save_format, **options)
+            if full_size and os.path.getsize(tmp) >= source.stat().st_size:
+                os.unlink(tmp)
+                with self._lock:
+                    self._not_smaller.add(name)
+                return source
+            path = self.cache_dir / name
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        size = path.stat().st_size
+        with self._lock:
+            self._forget(name)
+            self._files[name] = size
+            self._bytes += size
+            self._evict()
+        return path
+
+    def _forget(self, name):
+        size = self._files.pop(name, None)
+        if size is not None:
+            self._bytes -= size
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and len(self._files) > 1:
+            name, size = self._files.popitem(last=False)
+            self._bytes -= size
+            try:
+                os.unlink(self.cache_dir / name)
+            except FileNotFoundError:
+                pass
+
+    def discard_source(self, source):
+        """Delete every cached variant of a source image (after it is removed or renamed)"""
+        prefix = f"{Path(source).stem}."
+        with self._lock:
+            # {stem}.{source key}.{box}.{fit}{ext}
+            names = [name for name in self._files
+                     if name.startswith(prefix) and name[len(prefix):].count('.') == 3]
+            self._not_smaller = {name for name in self._not_smaller if not name.startswith(prefix)}
+            for name in names:
+                self._forget(name)
+                try:
+                    os.unlink(self.cache_dir / name)
+                except FileNotFoundError:
+                    pass
+
+    def pregenerate(self, source, widths=STANDARD_WIDTHS):
+        """Generate the standard widths (source format and modern formats) of a freshly downloaded image in the background"""
+        formats = [None] + [fmt for fmt in MODERN_FORMATS if negotiate_format([(FORMAT_MIME_TYPES[fmt], 1)], source)]
+
+        def run():
+            for width in widths:
+                for fmt in formats:
+                    try:
+                        self.get(source, width, None, fmt=fmt)
+                    except Exception as e:
+                        print(f"Could not pre-generate {width}px {fmt or 'original'} variant of {source}: {e}")
+                        return
+        self._pool.submit(run)
+
+    def stats(self):
+        with self._lock:
+            return {'files': len(self._files), 'bytes': self._bytes, 'maxBytes': self.max_bytes}
@@ -0,0 +1,567 @@
+"""
+Background jobs for long-running bulk operations.
+
+A job runs in its own thread. Its state (status, counters, timestamps) is
+saved to {state_dir}/{job_id}.json via temp file + rename whenever the
+status changes, so a crash never leaves a half-written state file. Progress
+is checkpointed per item by appending the item's id to
+{state_dir}/{job_id}.checkpoint.jsonl, so recording an item costs one short
+append however many items came before it. On load the checkpoint entries
+the state file does not count yet are folded back in, and a job that was
+running when the server stopped can be resumed from where it left off.
+Handlers check job.cancelled between items and return early when it is set.
+
+Per-item results are not kept in memory: each one is appended as a line to
+{state_dir}/{job_id}.results.jsonl, and readers either load that file or
+follow() it to stream results as they are recorded.
+
+Only one process runs a given job: a job is started only after taking an
+exclusive lock on {state_dir}/{job_id}.lock (where fcntl is available), so
+several worker processes can all call resume_interrupted() on startup.
+Starting, resuming and cancelling jobs happens under {state_dir}/jobs.lock,
+and whether another process still runs a job is read off its lock, so two
+workers never start jobs of the same kind side by side. A worker that does
+not run a job re-reads its state from disk when asked for it, and cancels it
+by creating {state_dir}/{job_id}.cancel, which the running worker polls.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: jobs are then only guarded within one process
+    fcntl = None
+
+TERMINAL_STATUSES = ('completed', 'failed', 'cancelled')
+# Seconds between re-reads of the state of a job another process runs, while following it
+FOLLOW_POLL = 1.0
+
+
+def complete_lines(path):
+    """Lines of an append-only log, without a final line that is still (or was left) half written"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return [line for line in f if line.endswith('\n')]
+    except FileNotFoundError:
+        return []
+
+
+def cut_torn_line(path):
+    """Drop a final line a crash left half written, so the next append starts a line of its own"""
+    try:
+        with open(path, 'r+b') as f:
+            data = f.read()
+            end = data.rfind(b'\n') + 1
+            if end < len(data):
+                f.truncate(end)
+    except FileNotFoundError:
+        pass
+
+
+class Job:
+    """State of one background job; mutated only by its worker thread (or refresh() in other processes)"""
+
+    def __init__(self, manager, kind, params=None, state=None):
+        self.manager = manager
+        self._cancel = threading.Event()
+        self._refresh_lock = threading.Lock()
+        state = state or {}
+        now = time.time()
+        self.id = state.get('id') or uuid.uuid4().hex[:12]
+        self.kind = state.get('kind', kind)
+        self.params = state.get('params', params or {})
+        self.status = state.get('status', 'queued')
+        self.created_at = state.get('createdAt', now)
+        self.updated_at = state.get('updatedAt', now)
+        self.total = state.get('total')
+        self.processed = state.get('processed', 0)
+        self.succeeded = state.get('succeeded', 0)
+        # Ids from state files written before the checkpoint log existed (see JobManager._load)
+        self.done_ids = set(state.get('checkpoint', []))
+        # Checkpoint log entries already counted in processed/succeeded
+        self.logged = state.get('logged', 0)
+        self.result_count = state.get('resultCount', 0)
+        self.error = state.get('error')
+        self.results_path = manager._results_path(self.id)
+        self.checkpoint_path = manager._checkpoint_path(self.id)
+        # Throughput is measured over the current run only (not over resumed checkpoints)
+        self.run_started = None
+        self.run_processed = 0
+        self._changed = threading.Condition()
+        self._change_count = 0
+        self._fold_checkpoint()
+
+    def _fold_checkpoint(self):
+        """Load checkpointed ids, counting the entries recorded after the state file was last saved"""
+        lines = complete_lines(self.checkpoint_path)
+        for position, line in enumerate(lines):
+            entry = json.loads(line)
+            self.done_ids.add(entry['id'])
+            if position >= self.logged:
+                self.processed += 1
+                self.succeeded += 1 if entry.get('ok') else 0
+        self.logged = len(lines)
+        if os.path.exists(self.results_path):
+            self.result_count = len(complete_lines(self.results_path))
+
+    def refresh(self):
+        """Re-read the state saved by the process running this job (nothing to do if it runs here or has finished)"""
+        if self.finished or self.manager._runs_here(self.id):
+            return
+        with self._refresh_lock:
+            try:
+                state = self.manager._read_state(self.id)
+            except (OSError, ValueError):
+                return
+            self.status = state.get('status', self.status)
+            self.updated_at = state.get('updatedAt', self.updated_at)
+            self.total = state.get('total')
+            self.processed = state.get('processed', 0)
+            self.succeeded = state.get('succeeded', 0)
+            self.logged = state.get('logged', 0)
+            self.error = state.get('error')
+            self._fold_checkpoint()
+
+    @property
+    def cancelled(self):
+        # Another worker process asks for cancellation through a marker file
+        if not self._cancel.is_set() and os.path.exists(self.manager._cancel_path(self.id)):
+            self._cancel.set()
+        return self._cancel.is_set()
+
+    def is_done(self, item_id):
+        """True if the item was processed before a restart (skip it on resume)"""
+        return item_id in self.done_ids
+
+    @property
+    def finished(self):
+        return self.status in TERMINAL_STATUSES
+
+    def set_total(self, total):
+        self.total = total
+        self.save()
+
+    def record(self, item_id, result, success=True):
+        """Append one processed item's result, then its checkpoint (the state file is not rewritten)"""
+        if result is not None:
+            with open(self.results_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(result, ensure_ascii=False) + '\n')
+            self.result_count += 1
+        with open(self.checkpoint_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'id': item_id, 'ok': bool(success)}, ensure_ascii=False) + '\n')
+        self.logged += 1
+        self.done_ids.add(item_id)
+        self.processed += 1
+        self.run_processed += 1
+        if success:
+            self.succeeded += 1
+        self.updated_at = time.time()
+        self._notify()
+
+    def save(self):
+        self.updated_at = time.time()
+        self.manager._persist(self)
+        self._notify()
+
+    def _notify(self):
+        with self._changed:
+            self._change_count += 1
+            self._changed.notify_all()
+
+    def progress(self):
+        """Processed/total plus throughput (items per second) and ETA in seconds for this run"""
+        rate = eta = None
+        if self.run_started is not None and self.run_processed:
+            elapsed = time.time() - self.run_started
+            if elapsed > 0:
+                rate = self.run_processed / elapsed
+                if self.total is not None and not self.finished:
+                    eta = max(self.total - self.processed, 0) / rate
+        return {
+            'processed': self.processed,
+            'total': self.total,
+            'succeeded': self.succeeded,
+            'rate': round(rate, 3) if rate is not None else None,
+            'eta': round(eta, 1) if eta is not None else None,
+        }
+
+    def _open_results(self):
+        f = open(self.results_path, 'a+', encoding='utf-8')
+        f.seek(0)
+        return f
+
+    def read_results(self):
+        """All recorded results, in the order they were recorded"""
+        with self._open_results() as f:
+            return [json.loads(line) for line in f if line.endswith('\n')]
+
+    def follow(self, after=0, heartbeat=15):
+        """
+        Yield ('result', seq, result) for every result after sequence number
+        `after` (1-based, in recording order) as it is recorded, ('progress',
+        None, None) when progress changes without a new result or every
+        `heartbeat` seconds, and finally ('done', None, None) once the job
+        has finished and every result has been delivered.
+        """
+        seq = 0
+        last_processed = None
+        with self._open_results() as f:
+            while True:
+                # Snapshot before reading: anything recorded after this point triggers another pass
+                seen = self._change_count
+                before = (self.status, self.processed, self.result_count)
+                finished = self.finished
+                delivered = False
+                while True:
+                    pos = f.tell()
+                    line = f.readline()
+                    if not line.endswith('\n'):
+                        f.seek(pos)  # partially written; retry on the next wakeup
+                        break
+                    seq += 1
+                    if seq > after:
+                        delivered = True
+                        yield 'result', seq, json.loads(line)
+                if finished:
+                    yield 'done', None, None
+                    return
+                if not delivered and self.processed != last_processed:
+                    yield 'progress', None, None
+                last_processed = self.processed
+                if self.manager._runs_here(self.id):
+                    with self._changed:
+                        changed = self._changed.wait_for(lambda: self._change_count != seen, heartbeat)
+                else:
+                    changed = self._poll(before, heartbeat)
+                if not changed:
+                    yield 'progress', None, None
+
+    def _poll(self, before, timeout):
+        """Wait up to timeout for (status, processed, result_count) of a job run elsewhere to move on from before"""
+        deadline = time.monotonic() + timeout
+        while True:
+            self.refresh()
+            if (self.status, self.processed, self.result_count) != before:
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(FOLLOW_POLL, remaining))
+
+    def summary(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'createdAt': self.created_at,
+            'updatedAt': self.updated_at,
+            'total': self.total,
+            'processed': self.processed,
+            'succeeded': self.succeeded,
+            'resultCount': self.result_count,
+            'progress': self.progress(),
+            'error': self.error,
+        }
+
+    def to_json(self, include_results=True):
+        data = self.summary()
+        data['params'] = self.params
+        if include_results:
+            data['results'] = self.read_results()
+        return data
+
+    def _state(self):
+        data = self.to_json(include_results=False)
+        del data['progress']
+        data['logged'] = self.logged
+        return data
+
+
+def process_items(job, items, item_id, work, is_success, workers=4, failed=None):
+    """
+    Run work(item) for every item not yet checkpointed, `workers` at a time.
+    Results are recorded from the job thread as they complete (in completion
+    order); at most 2 * workers items are in flight, and no new item is
+    started once the job is cancelled. An item whose work raises is recorded
+    as failed, with failed(item, error) as its result, and the job goes on.
+    """
+    if failed is None:
+        def failed(item, error):
+            return {'id': item_id(item), 'error': str(error)}
+    pending = (item for item in items if not job.is_done(item_id(item)))
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'job-{job.id}') as pool:
+        while True:
+            while not job.cancelled and len(in_flight) < workers * 2:
+                item = next(pending, None)
+                if item is None:
+                    break
+                in_flight[pool.submit(work, item)] = item
+            if not in_flight:
+                return
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                item = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Job {job.id}: {item_id(item)} failed: {e}")
+                    job.record(item_id(item), failed(item, e), success=False)
+                    continue
+                job.record(item_id(item), result, success=is_success(result))
+
+
+class JobManager:
+    """Runs registered job kinds in background threads with persisted state"""
+
+    def __init__(self, state_dir):
+        self.state_dir = state_dir
+        self._handlers = {}
+        self._jobs = {}
+        self._threads = {}
+        self._claims = {}  # job id -> open lock file, held while this process runs the job
+        self._lock = threading.Lock()
+        os.makedirs(state_dir, exist_ok=True)
+        with self._locked():
+            self._load()
+
+    def register(self, kind, handler):
+        """handler(job) processes items, calling job.record() after each one"""
+        self._handlers[kind] = handler
+
+    def _path(self, job_id):
+        return os.path.join(self.state_dir, f'{job_id}.json')
+
+    def _results_path(self, job_id):
+        return os.path.join(self.state_dir, f'{job_id}.results.jsonl')
+
+    def _checkpoint_path(self, job_id):
+        return os.path.join(self.state_dir, f'{job_id}.checkpoint.jsonl')
+
+    def _cancel_path(self, job_id):
+        return os.path.join(self.state_dir, f'{job_id}.cancel')
+
+    def _lock_path(self, job_id):
+        return os.path.join(self.state_dir, f'{job_id}.lock')
+
+    def _read_state(self, job_id):
+        with open(self._path(job_id), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _claim(self, job_id):
+        """Take the job's lock file; False if another process (or thread) is running it"""
+        f = open(self._lock_path(job_id), 'a')
+        if fcntl is not None:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                return False
+        self._claims[job_id] = f
+        return True
+
+    def _release(self, job_id):
+        f = self._claims.pop(job_id, None)
+        if f is not None:
+            f.close()
+
+    def _runs_here(self, job_id):
+        return job_id in self._claims
+
+    def _is_claimed(self, job_id):
+        """True if some process (this one included) runs the job; call with the manager lock held"""
+        if job_id in self._claims:
+            return True
+        if fcntl is None:
+            return False
+        # Only probed under the manager lock, which every claim is also taken under
+        with open(self._lock_path(job_id), 'a') as f:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return True
+        return False
+
+    @contextmanager
+    def _locked(self):
+        """Hold the manager lock: the thread lock, plus {state_dir}/jobs.lock across processes"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.state_dir, 'jobs.lock'), 'a') as f:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                yield
+
+    def _persist(self, job):
+        path = self._path(job.id)
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(job._state(), f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def _load(self):
+        for name in os.listdir(self.state_dir):
+            if not name.endswith('.json'):
+                continue
+            try:
+                state = self._read_state(name[:-len('.json')])
+                job = Job(self, state.get('kind'), state=state)
+                if 'results' in state and not os.path.exists(job.results_path):
+                    # State written before results moved out to their own file
+                    with open(job.results_path, 'w', encoding='utf-8') as f:
+                        for result in state['results']:
+                            f.write(json.dumps(result, ensure_ascii=False) + '\n')
+                    job.result_count = len(state['results'])
+                    self._persist(job)
+                if 'checkpoint' in state and not os.path.exists(job.checkpoint_path):
+                    # State written before checkpoints moved out to their own log; its counters include them
+                    with open(job.checkpoint_path, 'w', encoding='utf-8') as f:
+                        for item_id in state['checkpoint']:
+                            f.write(json.dumps({'id': item_id}, ensure_ascii=False) + '\n')
+                    job.logged = len(state['checkpoint'])
+                    self._persist(job)
+            except (OSError, ValueError) as e:
+                print(f"Skipping unreadable job state {name}: {e}")
+                continue
+            if job.status not in TERMINAL_STATUSES and not self._is_claimed(job.id):
+                # It was running when the process that ran it stopped
+                job.status = 'interrupted'
+                self._persist(job)
+            self._jobs[job.id] = job
+
+    def get(self, job_id):
+        """A job by id, as last saved by whichever process runs it; None if there is no such job"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.refresh()
+            return job
+        if os.path.basename(job_id) != job_id or job_id.startswith('.'):
+            return None
+        try:
+            # Started by another worker process since this one loaded the state directory
+            state = self._read_state(job_id)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Skipping unreadable job state {job_id}.json: {e}")
+            return None
+        return self._jobs.setdefault(job_id, Job(self, state.get('kind'), state=state))
+
+    def list(self):
+        for name in os.listdir(self.state_dir):
+            if name.endswith('.json'):
+                self.get(name[:-len('.json')])
+        return sorted(self._jobs.values(), key=lambda j: j.created_at, reverse=True)
+
+    def active(self, kind):
+        """The queued/running job of a kind in any process, if any"""
+        with self._locked():
+            return self._active(kind)
+
+    def _active(self, kind):
+        for job in self.list():
+            if job.kind != kind or job.status not in ('queued', 'running'):
+                continue
+            if fcntl is None or self._is_claimed(job.id):
+                return job
+            # Its process died without a restart since
+            job.status = 'interrupted'
+            self._persist(job)
+        return None
+
+    def submit(self, kind, params=None):
+        """Start a job, or return the one of the same kind that is already running in any process"""
+        if kind not in self._handlers:
+            raise KeyError(f'Unknown job kind: {kind}')
+        with self._locked():
+            existing = self._active(kind)
+            if existing:
+                return existing
+            job = Job(self, kind, params)
+            self._jobs[job.id] = job
+            # Claimed before its state is first saved, so other processes never see it queued but unclaimed
+            self._claim(job.id)
+            job.save()
+            self._start(job)
+            return job
+
+    def cancel(self, job_id):
+        """Ask a queued/running job (in whichever process runs it) to stop, or cancel an interrupted one"""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        with self._locked():
+            job.refresh()
+            if job.status in ('queued', 'running'):
+                open(self._cancel_path(job_id), 'a').close()
+                job._cancel.set()
+            elif job.status == 'interrupted':
+                job.status = 'cancelled'
+                job.save()
+        return job
+
+    def resume_interrupted(self):
+        """
+        Restart jobs that were running when the server last stopped. Safe to
+        call from every process and more than once: a job another process
+        (or an earlier call) already resumed is left alone.
+        """
+        resumed = []
+        with self._locked():
+            for job_id, job in list(self._jobs.items()):
+                if job.status != 'interrupted' or job.kind not in self._handlers or self._active(job.kind):
+                    continue
+                if not self._claim(job_id):
+                    continue
+                # Another process may have resumed and finished it since this one loaded its state
+                try:
+                    cut_torn_line(self._checkpoint_path(job_id))
+                    cut_torn_line(self._results_path(job_id))
+                    job = Job(self, job.kind, state=self._read_state(job_id))
+                except (OSError, ValueError) as e:
+                    print(f"Not resuming job {job_id}: {e}")
+                    self._release(job_id)
+                    continue
+                self._jobs[job_id] = job
+                if job.status in TERMINAL_STATUSES:
+                    self._release(job_id)
+                    continue
+                job.status = 'queued'
+                job.save()
+                self._start(job)
+                resumed.append(job)
+        return resumed
+
+    def _start(self, job):
+        if job.id not in self._claims and not self._claim(job.id):
+            raise RuntimeError(f'Job {job.id} is already running in another process')
+        thread = threading.Thread(target=self._run, args=(job,), name=f'job-{job.kind}-{job.id}', daemon=True)
+        self._threads[job.id] = thread
+        thread.start()
+
+    def _run(self, job):
+        job.status = 'running'
+        job.run_started = time.time()
+        job.run_processed = 0
+        job.save()
+        try:
+            self._handlers[job.kind](job)
+            job.status = 'cancelled' if job.cancelled else 'completed'
+        except Exception as e:
+            print(f"Job {job.id} ({job.kind}) failed: {e}")
+            job.status = 'failed'
+            job.error = str(e)
+        job.save()
+        try:
+            os.remove(self._cancel_path(job.id))
+        except FileNotFoundError:
+            pass
+        self._threads.pop(job.id, None)
+        self._release(job.id)
@@ -0,0 +1,198 @@
+"""
+Server-side marker clustering for the map views.
+
+Courses are projected to Web Mercator and bucketed into a grid pyramid: at
+zoom z the world is split into (256 * 2**z / CELL_PX)**2 cells, so a cluster
+covers roughly CELL_PX screen pixels. Level MAX_ZOOM is built from the points
+directly; every coarser level is the 2x2 merge of the level below, carrying
+a count, a centroid and the best-rated representative course ids.
+
+When courses move, appear or disappear, only the cells on the path from the
+affected leaf cells up to zoom 0 are recomputed.
+"""
+
+import heapq
+import math
+import threading
+
+MAX_ZOOM = 16
+CELL_PX = 64
+TILE_PX = 256
+REPRESENTATIVES = 3
+MAX_LATITUDE = 85.05112878
+
+
+def project(lat, lng):
+    """(lat, lng) in degrees -> Web Mercator (x, y) in [0, 1)"""
+    lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, lat))
+    x = (lng + 180.0) / 360.0
+    s = math.sin(math.radians(lat))
+    y = 0.5 - math.log((1 + s) / (1 - s)) / (4 * math.pi)
+    return min(max(x, 0.0), 1 - 1e-12), min(max(y, 0.0), 1 - 1e-12)
+
+
+def unproject(x, y):
+    lng = x * 360.0 - 180.0
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y))))
+    return lat, lng
+
+
+def cells_per_axis(zoom):
+    return max(1, TILE_PX * (2 ** zoom) // CELL_PX)
+
+
+class Cluster:
+    """Aggregate of the points in one grid cell"""
+
+    __slots__ = ('count', 'sum_x', 'sum_y', 'reps')
+
+    def __init__(self):
+        self.count = 0
+        self.sum_x = 0.0
+        self.sum_y = 0.0
+        self.reps = ()  # best first: ((-rating, id), ...)
+
+    def to_json(self):
+        lat, lng = unproject(self.sum_x / self.count, self.sum_y / self.count)
+        return {
+            'lat': round(lat, 6),
+            'lng': round(lng, 6),
+            'count': self.count,
+            'ids': [course_id for _, course_id in self.reps],
+        }
+
+
+class ClusterIndex:
+    """Grid pyramid of clusters, kept in sync with the catalog incrementally"""
+
+    def __init__(self):
+        self.source_key = None
+        self._lock = threading.Lock()
+        self._points = {}  # course id -> (x, y, rank key)
+        self._levels = [dict() for _ in range(MAX_ZOOM + 1)]
+        self._members = {}  # leaf cell -> {course id: (x, y, rank key)}
+
+    @staticmethod
+    def _point(course):
+        lat, lng = course.get('latitude'), course.get('longitude')
+        if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in (lat, lng)):
+            return None
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            return None
+        rating = course.get('rating')
+        rating = rating if isinstance(rating, (int, float)) else 0.0
+        x, y = project(lat, lng)
+        return (x, y, (-rating, course['id']))
+
+    @staticmethod
+    def _cell(x, y, zoom):
+        n = cells_per_axis(zoom)
+        return int(x * n), int(y * n)
+
+    def sync(self, courses, key=None):
+        """
+        Bring the pyramid in line with `courses`, recomputing only the cells
+        whose points changed. Returns the number of points that changed.
+        """
+        with self._lock:
+            if key is not None and key == self.source_key:
+                return 0
+            wanted = {}
+            for course in courses:
+                if 'id' in course:
+                    point = self._point(course)
+                    if point is not None:
+                        wanted[course['id']] = point
+
+            dirty = set()
+            changed = 0
+            for course_id, old in list(self._points.items()):
+                if wanted.get(course_id) != old:
+                    self._remove_leaf(course_id, old, dirty)
+                    changed += 1
+            for course_id, point in wanted.items():
+                if self._points.get(course_id) != point:
+                    self._add_leaf(course_id, point, dirty)
+                    if course_id not in self._points:
+                        changed += 1
+            self._points = wanted
+            self._propagate(dirty)
+            self.source_key = key
+            return changed
+
+    def _remove_leaf(self, course_id, point, dirty):
+        cell = self._cell(point[0], point[1], MAX_ZOOM)
+        members = self._members.get(cell)
+        if members is not None:
+            members.pop(course_id, None)
+            if not members:
+                del self._members[cell]
+        dirty.add(cell)
+
+    def _add_leaf(self, course_id, point, dirty):
+        cell = self._cell(point[0], point[1], MAX_ZOOM)
+        self._members.setdefault(cell, {})[course_id] = point
+        dirty.add(cell)
+
+    def _propagate(self, dirty):
+        """Recompute dirty leaf cells, then their ancestors level by level"""
+        leaves = self._levels[MAX_ZOOM]
+        for cell in dirty:
+            members = self._members.get(cell)
+            if not members:
+                leaves.pop(cell, None)
+                continue
+            cluster = Cluster()
+            for x, y, rank in members.values():
+                cluster.count += 1
+                cluster.sum_x += x
+                cluster.sum_y += y
+            cluster.reps = tuple(heapq.nsmallest(REPRESENTATIVES, (rank for _, _, rank in members.values())))
+            leaves[cell] = cluster
+
+        for zoom in range(MAX_ZOOM - 1, -1, -1):
+            # Cell sizes halve exactly between zooms, so parents are (cx // 2, cy // 2)
+            dirty = {(cx // 2, cy // 2) for cx, cy in dirty}
+            children_level = self._levels[zoom + 1]
+            level = self._levels[zoom]
+            for cx, cy in dirty:
+                cluster = Cluster()
+                reps = []
+                for child in ((2 * cx, 2 * cy), (2 * cx + 1, 2 * cy), (2 * cx, 2 * cy + 1), (2 * cx + 1, 2 * cy + 1)):
+                    sub = children_level.get(child)
+                    if sub is None:
+                        continue
+                    cluster.count += sub.count
+                    cluster.sum_x += sub.sum_x
+                    cluster.sum_y += sub.sum_y
+                    reps.extend(sub.reps)
+                if cluster.count:
+                    cluster.reps = tuple(heapq.nsmallest(REPRESENTATIVES, reps))
+                    level[(cx, cy)] = cluster
+                else:
+                    level.pop((cx, cy), None)
+
+    def query(self, west, south, east, north, zoom):
+        """Clusters at `zoom` whose cells overlap the lng/lat box"""
+        zoom = max(0, min(MAX_ZOOM, int(zoom)))
+        if west > east:  # crosses the antimeridian
+            return self.query(west, south, 180.0, north, zoom) + self.query(-180.0, south, east, north, zoom)
+        x0, y0 = project(north, west)
+        x1, y1 = project(south, east)
+        c0, r0 = self._cell(x0, y0, zoom)
+        c1, r1 = self._cell(x1, y1, zoom)
+        level = self._levels[zoom]
+        with self._lock:
+            if (c1 - c0 + 1) * (r1 - r0 + 1) > len(level):
+                cells = [
+                    cluster for (cx, cy), cluster in level.items()
+                    if c0 <= cx <= c1 and r0 <= cy <= r1
+                ]
+            else:
+                cells = [
+                    level[(cx, cy)]
+                    for cx in range(c0, c1 + 1)
+                    for cy in range(r0, r1 + 1)
+                    if (cx, cy) in level
+                ]
+            return [cluster.to_json() for cluster in cells]
@@ -0,0 +1,143 @@
+"""
+Serving images and videos with validators, cache policies and byte ranges.
+
+send_media() wraps flask.send_file with a content-addressed ETag (a digest of
+the file's bytes, not its mtime), so a client revalidating an unchanged file
+gets a 304 however often it is touched or copied, and a Range request for a
+video returns a 206 with only the requested bytes (If-Range is checked
+against the same ETag). Digests are cached per (size, mtime); files larger
+than HASH_SYNC_LIMIT are hashed in the background and use a size/mtime
+validator until their digest is ready.
+
+VideoLibrary replaces per-request probing of BASE_DIR, Videos/ and videos/
+with a filename -> path table rebuilt only when one of those directories
+changes.
+"""
+
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+from flask import send_file
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+
+HASH_SYNC_LIMIT = 32 * 1024 * 1024
+HASH_CHUNK = 1024 * 1024
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+
+def file_signature(path):
+    st = os.stat(path)
+    return (st.st_size, st.st_mtime_ns)
+
+
+class FileHasher:
+    """path -> content digest, cached until the file's size or mtime changes"""
+
+    def __init__(self, sync_limit=HASH_SYNC_LIMIT):
+        self.sync_limit = sync_limit
+        self._lock = threading.Lock()
+        self._digests = {}  # path -> (signature, digest)
+        self._pending = set()
+
+    def _hash(self, path):
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _compute(self, path, signature):
+        digest = self._hash(path)
+        with self._lock:
+            self._digests[path] = (signature, digest)
+            self._pending.discard(path)
+        return digest
+
+    def etag(self, path, known_digest=None):
+        """
+        Content ETag for a file. Pass known_digest when the content hash is
+        already known (e.g. from the image fingerprint index) to skip hashing.
+        """
+        if known_digest:
+            return known_digest
+        path = str(path)
+        signature = file_signature(path)
+        with self._lock:
+            cached = self._digests.get(path)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+            large = signature[0] > self.sync_limit
+            if large and path not in self._pending:
+                self._pending.add(path)
+                threading.Thread(target=self._compute, args=(path, signature),
+                                 name=f'hash:{Path(path).name}', daemon=True).start()
+        if large:
+            # Still a valid validator; replaced by the content digest once it is computed
+            return f'{signature[0]:x}-{signature[1]:x}'
+        return self._compute(path, signature)
+
+
+def send_media(path, hasher, cache_control=REVALIDATE, digest=None, mimetype=None):
+    """
+    send_file with a content ETag, conditional GET (304), Range/If-Range
+    (206/416) and the given Cache-Control policy
+    """
+    etag = hasher.etag(path, known_digest=digest)
+    try:
+        response = send_file(path, mimetype=mimetype, conditional=True, etag=etag)
+    except RequestedRangeNotSatisfiable as e:
+        # Carries Content-Range: bytes */<length>
+        return e.get_response()
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+class VideoLibrary:
+    """
+    filename -> path for the video directories, searched in order: *.mp4 in
+    the first directory, any file in the others (earlier directories win)
+    """
+
+    def __init__(self, root, subdirs=('Videos', 'videos')):
+        self.root = Path(root)
+        self.dirs = [self.root] + [self.root / name for name in subdirs]
+        self._lock = threading.Lock()
+        self._signature = None
+        self._paths = {}
+
+    def _dir_signature(self):
+        signature = []
+        for directory in self.dirs:
+            try:
+                signature.append(os.stat(directory).st_mtime_ns)
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _rebuild(self, signature):
+        paths = {}
+        for index, directory in enumerate(self.dirs):
+            if signature[index] is None:
+                continue
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if not entry.is_file():
+                        continue
+                    if index == 0 and not entry.name.lower().endswith('.mp4'):
+                        continue
+                    paths.setdefault(entry.name, Path(entry.path))
+        self._paths = paths
+        self._signature = signature
+
+    def find(self, filename):
+        """Path of a video, or None"""
+        signature = self._dir_signature()
+        if signature != self._signature:
+            with self._lock:
+                if signature != self._signature:
+                    self._rebuild(signature)
+        return self._paths.get(filename)
@@ -1,18 +1,26 @@
 #!/usr/bin/env python3
 """
-Migration script to convert existing single images to new 3-image structure.
-Moves existing images to hero slot.
+Migration script to move old-style image files into the image store.
+
+Single images named {course_id}{ext} (from before courses had three slots)
+are renamed to {course_id}_hero{ext}, unless the course already has a hero
+image in the store. Then every {course_id}_{slot}{ext} file in images/ is
+imported into the content-addressed store (see image_store.py), replacing
+that slot's current image. The app never does this on its own; run this
+script after copying old-style files into images/.
 """
 import json
 import shutil
 from pathlib import Path
 
+from image_store import IMAGE_EXTENSIONS, ImageStore
+
 BASE_DIR = Path(__file__).parent
 COURSES_FILE = BASE_DIR / 'courses.json'
 IMAGES_DIR = BASE_DIR / 'images'
 
 def migrate_images():
-    """Migrate existing single images to hero slot"""
+    """Migrate existing single images to hero slot, then import all old-style files into the store"""
     if not COURSES_FILE.exists():
         print(f"courses.json not found at {COURSES_FILE}")
         return
@@ -21,18 +29,16 @@ def migrate_images():
     with open(COURSES_FILE, 'r', encoding='utf-8') as f:
         courses = json.load(f)
     
+    store = ImageStore(IMAGES_DIR)
     migrated_count = 0
     
     for course in courses:
         course_id = course.get('id')
-        if not course_id:
+        if not course_id or store.find(course_id)['hero']:
             continue
         
         # Check for old format image (without _hero suffix)
-        old_image_found = False
-        extensions = ['.jpg', '.jpeg', '.png', '.gif', '.webp']
-        
-        for ext in extensions:
+        for ext in IMAGE_EXTENSIONS:
             old_path = IMAGES_DIR / f"{course_id}{ext}"
             if old_path.exists():
                 # Move to hero slot
@@ -41,22 +47,13 @@ def migrate_images():
                     shutil.move(str(old_path), str(new_path))
                     print(f"Migrated {course_id}: {old_path.name} -> {new_path.name}")
                     migrated_count += 1
-                    old_image_found = True
-                    break
-        
-        if not old_image_found:
-            # Check if already has hero image
-            hero_exists = False
-            for ext in extensions:
-                hero_path = IMAGES_DIR / f"{course_id}_hero{ext}"
-                if hero_path.exists():
-                    hero_exists = True
                     break
     
+    imported_count, deleted = store.import_files()
+    
     print(f"\nMigration complete. Migrated {migrated_count} images to hero slot.")
+    print(f"Imported {imported_count} images into {store.blobs_dir} ({len(deleted)} replaced blobs deleted).")
     print("Existing courses.json structure is compatible - no JSON changes needed.")
 
 if __name__ == '__main__':
     migrate_images()
-
-
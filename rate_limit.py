@@ -0,0 +1,85 @@
+"""
+Token-bucket rate limiting for outbound requests.
+
+A RateLimiter combines one global bucket with a bucket per host, so a pool of
+concurrent workers can run flat out overall while each origin still sees at
+most its configured request rate. acquire() blocks the calling thread until
+both buckets have a token.
+"""
+
+import os
+import threading
+import time
+import urllib.parse
+
+GLOBAL_RATE = float(os.environ.get('HTTP_GLOBAL_RATE', '20'))
+GLOBAL_BURST = float(os.environ.get('HTTP_GLOBAL_BURST', '20'))
+HOST_RATE = float(os.environ.get('HTTP_HOST_RATE', '2'))
+HOST_BURST = float(os.environ.get('HTTP_HOST_BURST', '4'))
+
+# Hosts that need to be treated more gently than the default: host -> (rate, burst)
+HOST_OVERRIDES = {
+    'www.google.com': (0.5, 2),
+}
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `capacity`"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens):
+        """Take tokens now if available, else return how long to wait"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens=1, timeout=None):
+        """Block until `tokens` are available; False if timeout expires first"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._reserve(tokens)
+            if wait <= 0:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class RateLimiter:
+    """Global bucket plus one lazily created bucket per host"""
+
+    def __init__(self, global_rate=GLOBAL_RATE, global_burst=GLOBAL_BURST,
+                 host_rate=HOST_RATE, host_burst=HOST_BURST, overrides=None):
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.host_rate = host_rate
+        self.host_burst = host_burst
+        self.overrides = dict(HOST_OVERRIDES if overrides is None else overrides)
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def bucket_for(self, host):
+        with self._lock:
+            bucket = self._hosts.get(host)
+            if bucket is None:
+                rate, burst = self.overrides.get(host, (self.host_rate, self.host_burst))
+                bucket = self._hosts[host] = TokenBucket(rate, burst)
+            return bucket
+
+    def acquire(self, url):
+        """Wait for a slot on the request's host, then on the global budget"""
+        self.acquire_host(urllib.parse.urlsplit(url).hostname or '')
+
+    def acquire_host(self, host):
+        self.bucket_for(host.lower()).acquire()
+        self.global_bucket.acquire()
@@ -0,0 +1,97 @@
+"""
+Pre-serialized JSON responses keyed by a content version.
+
+The payload is rebuilt, serialized and compressed (gzip, plus brotli when the
+optional `brotli` package is installed) only when the cheap version key changes.
+Requests are then answered from bytes in memory, or with a 304 when the client
+already holds the current ETag.
+"""
+
+import gzip
+import hashlib
+import json
+import threading
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+
+class PrecomputedEntry:
+    """One serialized version of a payload and its compressed encodings"""
+
+    def __init__(self, version, payload):
+        self.version = version
+        self.payload = payload
+        self.body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.etag = hashlib.sha1(self.body).hexdigest()[:20]
+        self.encodings = {'gzip': gzip.compress(self.body, compresslevel=9)}
+        if brotli is not None:
+            self.encodings['br'] = brotli.compress(self.body)
+
+    def matches(self, if_none_match):
+        """True if the client's If-None-Match names any encoding of this version"""
+        if not if_none_match:
+            return False
+        if if_none_match.star_tag:
+            return True
+        tags = [self.etag] + [f"{self.etag}-{enc}" for enc in self.encodings]
+        return any(if_none_match.contains_weak(tag) for tag in tags)
+
+
+class PrecomputedJSON:
+    """A JSON response built by `build()` and cached until `version()` changes"""
+
+    def __init__(self, build, version, cache_control='no-cache'):
+        self.build = build
+        self.version = version
+        self.cache_control = cache_control
+        self._lock = threading.Lock()
+        self._entry = None
+
+    def current(self):
+        """Return the entry for the current version, rebuilding it if stale"""
+        version = self.version()
+        entry = self._entry
+        if entry is not None and entry.version == version:
+            return entry
+        with self._lock:
+            entry = self._entry
+            if entry is None or entry.version != version:
+                entry = PrecomputedEntry(version, self.build())
+                self._entry = entry
+            return entry
+
+    def invalidate(self):
+        self._entry = None
+
+    def respond(self, request):
+        """Serve the current entry, honouring If-None-Match and Accept-Encoding"""
+        entry = self.current()
+        return respond_with_entry(entry, request, self.cache_control)
+
+
+def respond_with_entry(entry, request, cache_control='no-cache'):
+    """Build a Flask response for a precomputed entry"""
+    encoding = None
+    for candidate in ('br', 'gzip'):
+        if candidate in entry.encodings and request.accept_encodings[candidate]:
+            encoding = candidate
+            break
+    etag = f"{entry.etag}-{encoding}" if encoding else entry.etag
+
+    headers = {
+        'ETag': f'"{etag}"',
+        'Cache-Control': cache_control,
+        'Vary': 'Accept-Encoding',
+    }
+    if entry.matches(request.if_none_match):
+        return Response(status=304, headers=headers)
+
+    body = entry.encodings[encoding] if encoding else entry.body
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return Response(body, status=200, headers=headers, mimetype='application/json')
@@ -0,0 +1,147 @@
+"""
+Persistent cache of image search results.
+
+Every picker open, download, regenerate and bulk job used to re-run the same
+"{name} {location} golf course" search: a network round trip plus a full
+BeautifulSoup parse. Results are now kept in a small SQLite database keyed by
+the normalized query, with:
+
+    - a TTL after which an entry is stale,
+    - an optional stale-while-revalidate window during which a stale entry is
+      still served while one background thread refreshes it,
+    - an LRU cap on the number of entries (least recently read evicted first).
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_STALE_WHILE_REVALIDATE = 30 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 5000
+# Searches are always fetched at least this deep so small and large callers share entries
+MIN_DEPTH = 20
+
+
+def normalize_query(query):
+    return ' '.join(query.casefold().split())
+
+
+class SearchCache:
+    """SQLite-backed query -> [url] cache with TTL, LRU cap and stale-while-revalidate"""
+
+    def __init__(self, path, ttl=DEFAULT_TTL, stale_while_revalidate=DEFAULT_STALE_WHILE_REVALIDATE,
+                 max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.stale_while_revalidate = stale_while_revalidate
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as db:
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS search_results ('
+                ' key TEXT PRIMARY KEY,'
+                ' depth INTEGER NOT NULL,'
+                ' urls TEXT NOT NULL,'
+                ' fetched_at REAL NOT NULL,'
+                ' accessed_at REAL NOT NULL)'
+            )
+            db.execute('CREATE INDEX IF NOT EXISTS search_results_accessed ON search_results (accessed_at)')
+
+    def _connect(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    def lookup(self, query):
+        """Return (urls, depth, age_seconds) for a query, or None"""
+        db = self._connect()
+        row = db.execute(
+            'SELECT urls, depth, fetched_at FROM search_results WHERE key = ?',
+            (normalize_query(query),),
+        ).fetchone()
+        if row is None:
+            return None
+        urls, depth, fetched_at = row
+        return json.loads(urls), depth, time.time() - fetched_at
+
+    def store(self, query, depth, urls):
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                'INSERT OR REPLACE INTO search_results (key, depth, urls, fetched_at, accessed_at)'
+                ' VALUES (?, ?, ?, ?, ?)',
+                (normalize_query(query), depth, json.dumps(urls), now, now),
+            )
+            self._evict(db)
+
+    def _touch(self, query):
+        with self._connect() as db:
+            db.execute('UPDATE search_results SET accessed_at = ? WHERE key = ?', (time.time(), normalize_query(query)))
+
+    def _evict(self, db):
+        (count,) = db.execute('SELECT COUNT(*) FROM search_results').fetchone()
+        if count > self.max_entries:
+            db.execute(
+                'DELETE FROM search_results WHERE key IN ('
+                ' SELECT key FROM search_results ORDER BY accessed_at ASC LIMIT ?)',
+                (count - self.max_entries,),
+            )
+
+    def invalidate(self, query):
+        with self._connect() as db:
+            db.execute('DELETE FROM search_results WHERE key = ?', (normalize_query(query),))
+
+    def fetch(self, query, num_images, search, refresh=False):
+        """
+        Return up to num_images * 3 URLs for query, calling search(query, depth)
+        only on a miss, an entry that is too shallow, or an expired entry.
+        """
+        want = num_images * 3
+        depth = max(num_images, MIN_DEPTH)
+        cached = None if refresh else self.lookup(query)
+        if cached is not None:
+            urls, cached_depth, age = cached
+            if cached_depth >= num_images:
+                if age <= self.ttl:
+                    self._touch(query)
+                    return urls[:want]
+                if age <= self.ttl + self.stale_while_revalidate:
+                    self._touch(query)
+                    self._refresh_in_background(query, max(cached_depth, depth), search)
+                    return urls[:want]
+
+        urls = search(query, num_images=depth)
+        if urls:
+            # Failed searches come back empty; don't pin those in the cache
+            self.store(query, depth, urls)
+        elif cached is not None:
+            return cached[0][:want]
+        return urls[:want]
+
+    def _refresh_in_background(self, query, depth, search):
+        key = normalize_query(query)
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                urls = search(query, num_images=depth)
+                if urls:
+                    self.store(query, depth, urls)
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, name=f'search-refresh:{key}', daemon=True).start()
@@ -0,0 +1,201 @@
+"""
+Full-text search over course names, locations, architects and blurbs.
+
+An in-memory inverted index with BM25 ranking. Text is accent-folded
+("Château" matches "chateau") and the last query term can be matched as a
+prefix for type-ahead. Documents are added, replaced and removed individually,
+so an edited blurb only touches the terms of that one course.
+
+To keep latency flat as the catalog grows, each term's postings are turned
+into a list of (BM25 contribution, doc) sorted by impact the first time the
+term is queried, and only the top IMPACT_DEPTH entries are scored. Rare terms
+are scored exactly; very common ones ("golf", "club") contribute to their best
+matches only.
+"""
+
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'location': 2.0,
+    'architect': 2.0,
+    'description': 1.0,
+    'blurb': 1.0,
+}
+# Letters NFKD does not decompose into base + combining mark
+_FOLD_TABLE = str.maketrans({
+    'ø': 'o', 'Ø': 'o', 'æ': 'ae', 'Æ': 'ae', 'œ': 'oe', 'Œ': 'oe',
+    'ł': 'l', 'Ł': 'l', 'đ': 'd', 'Đ': 'd', 'ð': 'd', 'þ': 'th', 'ı': 'i',
+})
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+IMPACT_DEPTH = 1000
+MAX_PREFIX_TERMS = 32
+# Postings scored across all expansions of a prefix term
+PREFIX_BUDGET = 2000
+PREFIX_WEIGHT = 0.8
+
+
+def fold(text):
+    """Lowercase and strip accents: 'Vallière' -> 'valliere'"""
+    text = unicodedata.normalize('NFKD', text.translate(_FOLD_TABLE))
+    return ''.join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(fold(text))
+
+
+def _field_texts(course, field):
+    value = course.get(field)
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, list):
+        return [v for v in value if isinstance(v, str)]
+    return []
+
+
+class SearchIndex:
+    """Inverted index with BM25 scoring and prefix expansion of the last term"""
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._postings = {}    # term -> {doc_id: weighted tf}
+            self._doc_terms = {}   # doc_id -> {term: weighted tf}
+            self._doc_len = {}     # doc_id -> weighted length
+            self._total_len = 0.0
+            self._vocab = []       # sorted terms, for prefix ranges
+            self._impacts = {}     # term -> [(score, doc_id)] best first, lazily built
+            self._prefixes = {}    # prefix -> expansion terms, cleared when the vocabulary changes
+
+    def build(self, courses):
+        """Replace the whole index with the given courses"""
+        with self._lock:
+            self.clear()
+            for course in courses:
+                self.add(course)
+
+    def __len__(self):
+        return len(self._doc_len)
+
+    def add(self, course):
+        """Index one course (replacing any previous version of it)"""
+        doc_id = course.get('id')
+        if doc_id is None:
+            return
+        terms = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for text in _field_texts(course, field):
+                for term in tokenize(text):
+                    terms[term] = terms.get(term, 0.0) + weight
+        with self._lock:
+            self.remove(doc_id)
+            self._doc_terms[doc_id] = terms
+            length = sum(terms.values())
+            self._doc_len[doc_id] = length
+            self._total_len += length
+            for term, tf in terms.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    insort(self._vocab, term)
+                    self._prefixes.clear()
+                postings[doc_id] = tf
+                self._impacts.pop(term, None)
+
+    update = add
+
+    def remove(self, doc_id):
+        """Drop a course from the index if present"""
+        with self._lock:
+            terms = self._doc_terms.pop(doc_id, None)
+            if terms is None:
+                return
+            self._total_len -= self._doc_len.pop(doc_id, 0.0)
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                postings.pop(doc_id, None)
+                self._impacts.pop(term, None)
+                if not postings:
+                    del self._postings[term]
+                    i = bisect_left(self._vocab, term)
+                    if i < len(self._vocab) and self._vocab[i] == term:
+                        del self._vocab[i]
+                    self._prefixes.clear()
+
+    def _term_impacts(self, term):
+        impacts = self._impacts.get(term)
+        if impacts is not None:
+            return impacts
+        postings = self._postings.get(term, {})
+        n = len(self._doc_len)
+        df = len(postings)
+        idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+        avgdl = (self._total_len / n) if n else 1.0
+        k1, b = self.k1, self.b
+        doc_len = self._doc_len
+        scored = (
+            (idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * doc_len[doc] / avgdl)), doc)
+            for doc, tf in postings.items()
+        )
+        impacts = heapq.nlargest(IMPACT_DEPTH, scored)
+        self._impacts[term] = impacts
+        return impacts
+
+    def _prefix_terms(self, prefix):
+        """Up to MAX_PREFIX_TERMS indexed terms starting with prefix, most frequent first"""
+        terms = self._prefixes.get(prefix)
+        if terms is not None:
+            return terms
+        start = bisect_left(self._vocab, prefix)
+        end = bisect_left(self._vocab, prefix + '\uffff', start)
+        if end - start <= MAX_PREFIX_TERMS:
+            terms = self._vocab[start:end]
+        else:
+            postings = self._postings
+            terms = heapq.nlargest(MAX_PREFIX_TERMS, self._vocab[start:end], key=lambda t: len(postings[t]))
+        self._prefixes[prefix] = terms
+        return terms
+
+    def search(self, query, limit=20, prefix=True):
+        """
+        Return [(doc_id, score)] best first. With prefix=True the last query
+        term also matches any indexed term it is a prefix of.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        # A trailing space means the user finished typing the last word
+        expand_last = prefix and not query[-1:].isspace()
+        with self._lock:
+            weighted = {}  # term -> (weight, postings depth)
+            for i, term in enumerate(terms):
+                if i == len(terms) - 1 and expand_last:
+                    expansions = self._prefix_terms(term)
+                    depth = max(50, PREFIX_BUDGET // max(1, len(expansions)))
+                    for candidate in expansions:
+                        if candidate == term:
+                            weighted[candidate] = (1.0, IMPACT_DEPTH)
+                        elif candidate not in weighted:
+                            weighted[candidate] = (PREFIX_WEIGHT, depth)
+                elif term in self._postings:
+                    weighted[term] = (1.0, IMPACT_DEPTH)
+
+            scores = {}
+            for term, (weight, depth) in weighted.items():
+                for score, doc in self._term_impacts(term)[:depth]:
+                    scores[doc] = scores.get(doc, 0.0) + weight * score
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
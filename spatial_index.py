@@ -0,0 +1,137 @@
+"""
+Spatial queries over course coordinates for the map views.
+
+Points are bucketed into a fixed lat/lng grid (GRID_DEGREES per cell). A query
+only gathers the cells overlapping its box and then filters/measures those
+candidates with NumPy: haversine distances are computed for the whole
+candidate array in one vectorized pass.
+"""
+
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+GRID_DEGREES = 1.0
+
+
+def haversine_km(lat, lng, lats, lngs):
+    """Great-circle distance in km from one point to arrays of points (degrees)"""
+    lat1, lng1 = math.radians(lat), math.radians(lng)
+    lat2, lng2 = np.radians(lats), np.radians(lngs)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _coordinate(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value):
+        return float(value)
+    return None
+
+
+class SpatialIndex:
+    """Grid index over (latitude, longitude); query results are caller positions"""
+
+    def __init__(self, courses, cell_degrees=GRID_DEGREES):
+        self.cell_degrees = cell_degrees
+        positions, lats, lngs = [], [], []
+        for i, course in enumerate(courses):
+            lat, lng = _coordinate(course.get('latitude')), _coordinate(course.get('longitude'))
+            if lat is None or lng is None or not (-90 <= lat <= 90 and -180 <= lng <= 180):
+                continue
+            positions.append(i)
+            lats.append(lat)
+            lngs.append(lng)
+        self.positions = np.array(positions, dtype=np.int64)
+        self.lats = np.array(lats, dtype=np.float64)
+        self.lngs = np.array(lngs, dtype=np.float64)
+
+        # cell (row, col) -> indices into the point arrays
+        self._cells = {}
+        if len(self.positions):
+            rows = np.floor(self.lats / cell_degrees).astype(np.int64)
+            cols = np.floor(self.lngs / cell_degrees).astype(np.int64)
+            order = np.lexsort((cols, rows))
+            keys = np.stack((rows[order], cols[order]), axis=1)
+            starts = np.flatnonzero(np.any(np.diff(keys, axis=0) != 0, axis=1)) + 1
+            for chunk in np.split(order, starts):
+                self._cells[(int(rows[chunk[0]]), int(cols[chunk[0]]))] = chunk
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _candidates(self, south, north, west, east):
+        """Point indices in cells overlapping a box (west <= east, no wrap)"""
+        size = self.cell_degrees
+        r0, r1 = math.floor(south / size), math.floor(north / size)
+        c0, c1 = math.floor(west / size), math.floor(east / size)
+        if (r1 - r0 + 1) * (c1 - c0 + 1) >= len(self._cells):
+            # Box spans more cells than are populated: cheaper to filter every point
+            return np.arange(len(self.positions))
+        chunks = [
+            self._cells[(r, c)]
+            for r in range(r0, r1 + 1)
+            for c in range(c0, c1 + 1)
+            if (r, c) in self._cells
+        ]
+        return np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int64)
+
+    def _box(self, south, north, west, east):
+        idx = self._candidates(south, north, west, east)
+        lats, lngs = self.lats[idx], self.lngs[idx]
+        mask = (lats >= south) & (lats <= north) & (lngs >= west) & (lngs <= east)
+        return idx[mask]
+
+    def bbox(self, west, south, east, north):
+        """Caller positions inside a lng/lat box; west > east crosses the antimeridian"""
+        if west <= east:
+            idx = self._box(south, north, west, east)
+        else:
+            idx = np.concatenate((self._box(south, north, west, 180.0), self._box(south, north, -180.0, east)))
+        return self.positions[idx]
+
+    def near(self, lat, lng, radius_km=None, k=None):
+        """
+        Courses around a point, nearest first, as [(position, distance_km)].
+        With only k, the search radius grows until k courses are found.
+        """
+        if not len(self.positions):
+            return []
+        if radius_km is None:
+            if not k:
+                raise ValueError('radius_km or k is required')
+            radius = 50.0
+            while True:
+                found = self._within(lat, lng, radius)
+                if len(found[0]) >= k or radius >= math.pi * EARTH_RADIUS_KM:
+                    return self._nearest(found, k)
+                radius *= 4
+        return self._nearest(self._within(lat, lng, radius_km), k)
+
+    def _within(self, lat, lng, radius_km):
+        dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+        south, north = lat - dlat, lat + dlat
+        coslat = math.cos(math.radians(lat))
+        if south <= -90 or north >= 90 or coslat < 1e-6 or dlat / coslat >= 180:
+            # Circle reaches a pole or wraps the globe: every longitude is in play
+            idx = self._candidates(max(south, -90.0), min(north, 90.0), -180.0, 180.0)
+        else:
+            dlng = dlat / coslat
+            west, east = lng - dlng, lng + dlng
+            parts = [self._candidates(south, north, max(west, -180.0), min(east, 180.0))]
+            if west < -180:
+                parts.append(self._candidates(south, north, west + 360, 180.0))
+            if east > 180:
+                parts.append(self._candidates(south, north, -180.0, east - 360))
+            idx = np.unique(np.concatenate(parts)) if len(parts) > 1 else parts[0]
+        distances = haversine_km(lat, lng, self.lats[idx], self.lngs[idx])
+        mask = distances <= radius_km
+        return idx[mask], distances[mask]
+
+    def _nearest(self, found, k):
+        idx, distances = found
+        if k and len(idx) > k:
+            keep = np.argpartition(distances, k - 1)[:k]
+            idx, distances = idx[keep], distances[keep]
+        order = np.argsort(distances, kind='stable')
+        return [(int(p), float(d)) for p, d in zip(self.positions[idx[order]], distances[order])]
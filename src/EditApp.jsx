@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react'
 import { Link } from 'react-router-dom'
 import './App.css'
+import { imageVariantUrl } from './utils/imagePaths'
 
 const API_BASE = '/api'
 
@@ -8,6 +9,7 @@ function EditApp() {
   const [courses, setCourses] = useState([])
   const [loading, setLoading] = useState(true)
   const [downloading, setDownloading] = useState({})
+  const [jobProgress, setJobProgress] = useState(null)
   const [error, setError] = useState(null)
   const [pickerOpen, setPickerOpen] = useState(false)
   const [pickerCourse, setPickerCourse] = useState(null)
@@ -60,6 +62,7 @@ function EditApp() {
       const data = await response.json()
       setCourses(data)
       setError(null)
+      return data
     } catch (err) {
       setError(err.message)
       console.error('Error fetching courses:', err)
@@ -218,14 +221,20 @@ function EditApp() {
       const response = await fetch(`${API_BASE}/update-course/${infoCourse.id}`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ blurb: editedBlurb })
+        body: JSON.stringify({ blurb: editedBlurb, version: infoCourse.version })
       })
       
       const data = await response.json()
-      if (data.success) {
+      if (response.status === 409) {
+        // Someone else saved this course since it was opened; show their version instead of overwriting it
+        alert('This course was changed by another edit. Reloading it; re-apply your changes if needed.')
+        const fresh = await fetchCourses({ preserveScroll: true })
+        const current = fresh && fresh.find(c => c.id === infoCourse.id)
+        if (current) openInfo(current)
+      } else if (data.success) {
         await fetchCourses({ preserveScroll: true })
         // Update the infoCourse with new blurb
-        setInfoCourse({ ...infoCourse, blurb: editedBlurb })
+        setInfoCourse({ ...infoCourse, blurb: editedBlurb, version: data.version })
         setEditingDescription(false)
       } else {
         alert(`Failed to save description: ${data.error || 'Unknown error'}`)
@@ -238,6 +247,38 @@ function EditApp() {
     }
   }
 
+  // Bulk downloads run as server-side jobs; follow their event stream until the job finishes
+  const followJob = (jobId, onResult) => new Promise((resolve, reject) => {
+    const source = new EventSource(`${API_BASE}/jobs/${jobId}/events`)
+    const parse = (event) => JSON.parse(event.data)
+    source.addEventListener('result', (event) => {
+      const { result, progress } = parse(event)
+      onResult(result)
+      setJobProgress(progress)
+    })
+    source.addEventListener('progress', (event) => setJobProgress(parse(event).progress))
+    source.addEventListener('done', (event) => {
+      source.close()
+      setJobProgress(null)
+      const job = parse(event)
+      if (job.status === 'failed') reject(new Error(job.error || 'Job failed'))
+      else resolve(job)
+    })
+    // EventSource reconnects on its own (resuming after Last-Event-ID); give up only if it stops trying
+    source.onerror = () => {
+      if (source.readyState === EventSource.CLOSED) {
+        setJobProgress(null)
+        reject(new Error('Lost connection to job progress stream'))
+      }
+    }
+  })
+
+  const formatJobProgress = () => {
+    if (!jobProgress || !jobProgress.total) return 'Downloading...'
+    const eta = jobProgress.eta != null ? ` · ${Math.ceil(jobProgress.eta / 60)} min left` : ''
+    return `Downloading... ${jobProgress.processed}/${jobProgress.total}${eta}`
+  }
+
   const downloadAllImages = async () => {
     if (!confirm('This will download images for all courses without images. This may take a while. Continue?')) {
       return
@@ -248,9 +289,15 @@ function EditApp() {
       const response = await fetch(`${API_BASE}/download-all`, {
         method: 'POST'
       })
-      const data = await response.json()
+      const { jobId } = await response.json()
+      let attempted = 0
+      let downloaded = 0
+      await followJob(jobId, (result) => {
+        attempted += 1
+        if (result.success) downloaded += 1
+      })
 
-      alert(`Downloaded ${data.filter(r => r.success).length} of ${data.length} images`)
+      alert(`Downloaded ${downloaded} of ${attempted} images`)
       await fetchCourses()
     } catch (err) {
       alert(`Error downloading images: ${err.message}`)
@@ -285,10 +332,14 @@ function EditApp() {
       const response = await fetch(`${API_BASE}/download-secondary-images`, {
         method: 'POST'
       })
-      const data = await response.json()
+      const { jobId } = await response.json()
+      let slot1Count = 0
+      let slot2Count = 0
+      await followJob(jobId, (result) => {
+        if (result.slot1) slot1Count += 1
+        if (result.slot2) slot2Count += 1
+      })
 
-      const slot1Count = data.filter(r => r.slot1).length
-      const slot2Count = data.filter(r => r.slot2).length
       alert(`Downloaded ${slot1Count} slot 1 images and ${slot2Count} slot 2 images`)
       await fetchCourses()
     } catch (err) {
@@ -326,7 +377,7 @@ function EditApp() {
               onClick={downloadAllImages}
               disabled={downloading.all || downloading.secondary}
             >
-              {downloading.all ? 'Downloading...' : `Download All (${coursesWithoutImages})`}
+              {downloading.all ? formatJobProgress() : `Download All (${coursesWithoutImages})`}
             </button>
           )}
           {coursesWithImages > 0 && (
@@ -335,7 +386,7 @@ function EditApp() {
               onClick={downloadSecondaryImages}
               disabled={downloading.all || downloading.secondary}
             >
-              {downloading.secondary ? 'Downloading...' : 'Download Secondary Images'}
+              {downloading.secondary ? formatJobProgress() : 'Download Secondary Images'}
             </button>
           )}
           <Link to="/presentation" className="btn btn-secondary presentation-link">
@@ -396,7 +447,7 @@ function EditApp() {
                     <div className="course-image-container-small">
                       {hasImage ? (
                         <img 
-                          src={imageUrl} 
+                          src={imageVariantUrl(imageUrl, 400)} 
                           alt={`${course.name} - ${slotLabel}`}
                           className="course-image-small"
                           onError={(e) => {
@@ -1,6 +1,7 @@
 import React, { useState } from 'react'
 import StudioBadge from './StudioBadge'
 import LegacyBadge from './LegacyBadge'
+import { imageVariantSrcSet, imageVariantUrl, modernImageSources } from '../utils/imagePaths'
 import './CourseCard.css'
 
 function CourseCard({ course, onClick }) {
@@ -170,15 +171,23 @@ function CourseCard({ course, onClick }) {
           </div>
         )}
         {(course.hasImage || course.imageUrl || course.isIgolf) ? (
-          <img
-            src={course.imageUrl || (course.images?.hero)}
-            alt={course.name}
-            className="course-card-image"
-            onError={(e) => {
-              console.error(`Failed to load image for ${course.name}:`, course.imageUrl)
-              e.target.style.display = 'none'
-            }}
-          />
+          <picture className="course-card-picture">
+            {(course.imageUrl || course.images?.hero) === course.images?.hero &&
+              modernImageSources(course.images?.hero, course.images?.formats?.hero).map(source => (
+                <source key={source.type} type={source.type} srcSet={source.srcSet} />
+              ))}
+            <img
+              src={imageVariantUrl(course.imageUrl || (course.images?.hero), 800)}
+              srcSet={imageVariantSrcSet(course.imageUrl || (course.images?.hero))}
+              sizes="(max-width: 600px) 100vw, 400px"
+              alt={course.name}
+              className="course-card-image"
+              onError={(e) => {
+                console.error(`Failed to load image for ${course.name}:`, course.imageUrl)
+                e.target.style.display = 'none'
+              }}
+            />
+          </picture>
         ) : (
           <div className="course-card-placeholder">
             <span>No Image</span>
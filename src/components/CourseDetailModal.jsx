@@ -12,6 +12,7 @@ import { generateMockStats } from '../utils/mockStats'
 import { hasStudioAccess } from '../utils/subscription'
 import { shouldShowLegacyWarning } from '../utils/userPreferences'
 import { getAssetPath } from '../utils/baseUrl'
+import { modernImageSources } from '../utils/imagePaths'
 import './CourseDetailModal.css'
 
 function CourseDetailModal({ course, onClose, getBlurb, userRating = 0, onRatingChange, isPlayLater, onPlayLaterToggle, onTeeOffClick }) {
@@ -23,6 +24,12 @@ function CourseDetailModal({ course, onClose, getBlurb, userRating = 0, onRating
   const heroImage = course.images?.hero || course.imageUrl
   const additionalImages = course.images?.additional || []
   const allImages = [heroImage, ...additionalImages].filter(Boolean)
+  // Modern formats (from the static export) for each entry of allImages
+  const imageFormats = course.images?.formats
+  const allImageFormats = [
+    [heroImage, heroImage === course.images?.hero ? imageFormats?.hero : null],
+    ...additionalImages.map((img, index) => [img, imageFormats?.additional?.[index]])
+  ].filter(([img]) => img).map(([, formats]) => formats || [])
   const [selectedImageIndex, setSelectedImageIndex] = useState(0)
   const [activeTab, setActiveTab] = useState('overview')
   const [showUpgradeModal, setShowUpgradeModal] = useState(false)
@@ -212,11 +219,16 @@ function CourseDetailModal({ course, onClose, getBlurb, userRating = 0, onRating
           ) : (
             currentImage && (
               <>
-                <img 
-                  src={currentImage} 
-                  alt={course.name} 
-                  className="modal-hero-image" 
-                />
+                <picture className="modal-hero-picture">
+                  {modernImageSources(currentImage, allImageFormats[allImages.indexOf(currentImage)]).map(source => (
+                    <source key={source.type} type={source.type} srcSet={source.srcSet} />
+                  ))}
+                  <img 
+                    src={currentImage} 
+                    alt={course.name} 
+                    className="modal-hero-image" 
+                  />
+                </picture>
                 <div className="hero-disclaimer">Not actual course photography</div>
               </>
             )
@@ -46,3 +46,42 @@ export function getImageWithFallback(courseId, slot = 'hero', extensions = null)
   // Return the first extension as default
   return `/images/${courseId}${extensions[0]}`
 }
+
+/**
+ * True for images served by the Flask API (/api/blobs/... or /api/images/...)
+ */
+function isApiImage(url) {
+  return Boolean(url) && (url.startsWith('/api/blobs/') || url.startsWith('/api/images/'))
+}
+
+/**
+ * URL of a resized variant of a course image
+ * Only images served by the Flask API can be resized; any other URL
+ * (static export, remote gameplay images) is returned unchanged
+ */
+export function imageVariantUrl(url, width) {
+  if (!isApiImage(url)) return url
+  return `${url}${url.includes('?') ? '&' : '?'}w=${width}`
+}
+
+/**
+ * srcSet string offering the standard pre-generated widths, or undefined
+ */
+export function imageVariantSrcSet(url, widths = [400, 800, 1600]) {
+  if (!isApiImage(url)) return undefined
+  return widths.map(width => `${imageVariantUrl(url, width)} ${width}w`).join(', ')
+}
+
+/**
+ * <picture> sources for the modern-format copies the static export writes
+ * next to an image (images/modern/{stem}.{avif|webp}), best format first
+ */
+export function modernImageSources(url, formats) {
+  if (!url || !formats || !formats.length) return []
+  const slash = url.lastIndexOf('/')
+  const stem = url.slice(slash + 1).replace(/\.[^.]+$/, '')
+  return formats.map(format => ({
+    type: `image/${format}`,
+    srcSet: `${url.slice(0, slash)}/modern/${stem}.${format}`
+  }))
+}
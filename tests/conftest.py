@@ -0,0 +1,77 @@
+"""
+Shared fixtures. app.py keeps its state in module globals, so it is imported
+once per session against a throwaway data directory (COURSE_DATA_DIR) holding
+a small catalog.
+"""
+
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+SAMPLE_COURSES = [
+    {
+        'id': 'pebble-beach',
+        'name': 'Pebble Beach Golf Links',
+        'description': 'Iconic coastal course with stunning ocean views',
+        'location': 'Pebble Beach, California',
+        'rating': 4.9,
+        'type': 'coastal',
+        'continent': 'North America',
+        'latitude': 36.5681,
+        'longitude': -121.9494,
+        'isStudio': True,
+        'blurb': ['Cliff-top holes along Carmel Bay.'],
+    },
+    {
+        'id': 'chantilly',
+        'name': 'Golf de Chantilly',
+        'description': 'Historic heathland near the Château de Chantilly',
+        'location': 'Vineuil-Saint-Firmin, France',
+        'rating': 4.6,
+        'type': 'heathland',
+        'continent': 'Europe',
+        'architect': 'Tom Simpson',
+        'yardage': 7100,
+        'latitude': 49.2,
+        'longitude': 2.47,
+        'blurb': ['A classic 1909 design on sandy soil.'],
+    },
+    {
+        'id': 'durness',
+        'name': 'Durness Golf Club',
+        'description': 'A remote links course in the far north of Scotland',
+        'location': 'Durness, Scotland',
+        'rating': 3.7,
+        'type': 'links',
+        'continent': 'Europe',
+        'yardage': 6674,
+        'isIgolf': True,
+        'igolfFeatures': {'mappingType': 'Radar', 'accuracy': '+/-5m'},
+    },
+]
+
+DATA_DIR = Path(tempfile.mkdtemp(prefix='course-app-test-'))
+os.environ['COURSE_DATA_DIR'] = str(DATA_DIR)
+
+
+def write_courses(path, courses=SAMPLE_COURSES):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(courses, f, indent=2, ensure_ascii=False)
+
+
+write_courses(DATA_DIR / 'courses.json')
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    import app
+    app.app.testing = True
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
@@ -0,0 +1,34 @@
+import sys
+
+from autocomplete import Autocomplete
+
+
+def test_completions_ranked_by_rating():
+    index = Autocomplete([
+        {'id': 'a', 'name': 'St. Andrews Old Course', 'rating': 4.9},
+        {'id': 'b', 'name': 'Andrews Park', 'rating': 3.0},
+    ])
+    assert [index.describe(e)['id'] for e in index.complete('andr')] == ['a', 'b']
+
+
+def test_memory_usage_counts_string_payloads():
+    courses = [{'id': f'c{i}', 'name': f'Course number {i} ' + 'x' * 200} for i in range(50)]
+    usage = Autocomplete(courses).memory_usage()
+    names = sum(sys.getsizeof(c['name']) for c in courses)
+    assert usage['bytes']['entries'] > names
+    assert usage['totalBytes'] == sum(usage['bytes'].values())
+
+
+def test_only_source_field_edits_rebuild(app_module, client):
+    before = app_module.current_autocomplete()
+    assert client.post('/api/update-course/chantilly', json={'description': 'Heathland classic'}).status_code == 200
+    assert app_module.current_autocomplete() is before
+
+    name = app_module.course_store.get('chantilly')['name']
+    app_module.course_store.update('chantilly', {'name': 'Golf de Chantilly (Vineuil)'})
+    try:
+        rebuilt = app_module.current_autocomplete()
+        assert rebuilt is not before
+        assert [rebuilt.describe(e)['text'] for e in rebuilt.complete('vineuil')][0] == 'Golf de Chantilly (Vineuil)'
+    finally:
+        app_module.course_store.update('chantilly', {'name': name})
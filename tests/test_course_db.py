@@ -0,0 +1,172 @@
+import json
+import random
+from itertools import product
+
+import pytest
+
+from conftest import SAMPLE_COURSES, write_courses
+from course_backend import open_course_store, save_course_store
+from course_db import CourseDB, SqliteCourseStore
+from course_query import CourseIndex, parse_query
+
+
+def make_catalog(n=60, seed=3):
+    """Courses with ties, missing values and the odd non-number, to exercise ordering edge cases"""
+    rng = random.Random(seed)
+    courses = []
+    for i in range(n):
+        course = {
+            'id': f'course-{i:03d}',
+            'name': rng.choice(['Links', 'links', 'Äbergele', 'Zermatt', 'Old Course', 'Heath']) + f' {i % 7}',
+            'continent': rng.choice(['Europe', 'Asia', 'North America']),
+            'type': rng.choice(['links', 'parkland', 'heathland']),
+            'rating': rng.choice([3.5, 4, 4.5, 4.5, 5.0, None, 'n/a']),
+            'latitude': rng.uniform(-60, 70),
+            'longitude': rng.uniform(-180, 180),
+        }
+        if i % 4:
+            course['yardage'] = rng.choice([6500, 6800, 7100, 7100])
+        if i % 5 == 0:
+            course['isStudio'] = True
+        if i % 3 == 0:
+            course['location'] = rng.choice(['Scotland', 'france', 'Japan'])
+        if i % 9 == 0:
+            del course['rating']
+        courses.append(course)
+    return courses
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    courses = make_catalog()
+    db = CourseDB(tmp_path / 'courses.sqlite3')
+    db.import_courses(courses)
+    return courses, db
+
+
+def all_pages(run, args):
+    ids, total, cursor = [], None, None
+    while True:
+        page = run(parse_query(dict(args, cursor=cursor) if cursor else args))
+        total = page['total']
+        ids.extend(course['id'] for course in page['courses'])
+        cursor = page['nextCursor']
+        if cursor is None:
+            return ids, total
+
+
+QUERIES = [
+    {},
+    {'continent': 'europe,asia'},
+    {'isStudio': 'true'},
+    {'isStudio': 'false', 'type': 'links'},
+    {'rating_min': '4', 'rating_max': '4.5'},
+    {'yardage_min': '7000'},
+    {'bbox': '-20,0,40,70'},
+    {'bbox': '170,-60,-170,70'},
+]
+SORTS = [None, 'name', '-name', 'rating', '-rating', 'yardage', '-location', 'latitude']
+
+
+@pytest.mark.parametrize('filters,sort', list(product(QUERIES, SORTS)))
+def test_sql_query_matches_course_index(catalog, filters, sort):
+    courses, db = catalog
+    index = CourseIndex(courses)
+    args = dict(filters, limit='7')
+    if sort:
+        args['sort'] = sort
+    expected = all_pages(index.query, args)
+    assert all_pages(db.query, args) == expected
+    assert len(expected[0]) == expected[1]
+
+
+def test_cursor_survives_the_anchor_course_being_edited(catalog):
+    _, db = catalog
+    first = db.query(parse_query({'sort': '-rating', 'limit': '5'}))
+    last_id = first['courses'][-1]['id']
+    # Both backends re-anchor on the course's new place in the order
+    db.update(last_id, {'rating': 3.9})
+    args = {'sort': '-rating', 'limit': '50', 'cursor': first['nextCursor']}
+    expected = CourseIndex([course for course, _ in db.rows()]).query(parse_query(args))
+    second = db.query(parse_query(args))
+    assert [c['id'] for c in second['courses']] == [c['id'] for c in expected['courses']]
+    assert all(not isinstance(c.get('rating'), (int, float)) or c['rating'] < 3.9 for c in second['courses'])
+
+
+def test_decorate_and_fields(catalog):
+    courses, db = catalog
+    page = db.query(parse_query({'fields': 'name,version', 'limit': '2'}),
+                    decorate=lambda course, version: dict(course, version=version))
+    assert page['courses'] == [{'id': c['id'], 'name': c['name'], 'version': 0} for c in courses[:2]]
+    assert page['total'] == len(courses)
+
+
+def test_store_checks_the_generation_only_on_refresh(tmp_path):
+    path = tmp_path / 'courses.sqlite3'
+    db = CourseDB(path)
+    db.import_courses(SAMPLE_COURSES)
+    store = SqliteCourseStore(db)
+    assert store.all()[0]['id'] == 'pebble-beach'
+
+    queries = []
+    db.generation = lambda real=db.generation: queries.append(1) or real()
+    for _ in range(5):
+        store.get('durness')
+        store.course_version('durness')
+        store.signature
+    assert queries == []
+
+    # Another process edits a course: seen after the next refresh()
+    CourseDB(path).update('durness', {'description': 'Changed elsewhere'})
+    assert store.get('durness')['description'] != 'Changed elsewhere'
+    store.refresh()
+    assert store.get('durness')['description'] == 'Changed elsewhere'
+
+
+def test_commit_notices_a_foreign_change_it_has_not_refreshed_for(tmp_path):
+    path = tmp_path / 'courses.sqlite3'
+    db = CourseDB(path)
+    db.import_courses(SAMPLE_COURSES)
+    store = SqliteCourseStore(db)
+    store.all()
+    CourseDB(path).update('chantilly', {'description': 'Changed elsewhere'})
+
+    store.update('durness', {'description': 'Ours'})
+    assert store.get('chantilly')['description'] == 'Changed elsewhere'
+    assert store.get('durness')['description'] == 'Ours'
+
+    version = store.version
+    _, course_version = store.update('durness', {'description': 'Ours'})
+    assert (store.version, course_version) == (version, 1)
+
+
+def test_api_courses_pages_in_sql_with_the_sqlite_backend(client, app_module, monkeypatch, tmp_path):
+    url = '/api/courses?continent=europe&sort=-rating&limit=1&fields=name,hasImage,version'
+    from_index = client.get(url).get_json()
+
+    db = CourseDB(tmp_path / 'courses.sqlite3')
+    db.import_courses(app_module.course_store.all())
+    monkeypatch.setattr(app_module, 'COURSE_BACKEND', 'sqlite')
+    monkeypatch.setattr(app_module, 'course_store', SqliteCourseStore(db))
+    monkeypatch.setattr(app_module, 'current_course_index', lambda: pytest.fail('CourseIndex was used'))
+    first = client.get(url).get_json()
+    assert first['total'] == from_index['total'] == 2
+    assert first['courses'][0]['name'] == from_index['courses'][0]['name']
+    assert set(first['courses'][0]) == {'id', 'name', 'hasImage', 'version'}
+    rest = client.get(f"{url}&cursor={first['nextCursor']}").get_json()
+    assert [c['id'] for c in first['courses'] + rest['courses']] == ['chantilly', 'durness']
+    assert rest['nextCursor'] is None
+
+
+def test_scripts_edit_the_configured_backend(tmp_path):
+    path = tmp_path / 'courses.json'
+    write_courses(path)
+    store = open_course_store(path, 'sqlite')
+    assert isinstance(store, SqliteCourseStore)
+    store.commit([('durness', lambda course: {'description': 'From a script'}, None)])
+    save_course_store(store, path)
+
+    # The database holds the edit even though courses.json is rewritten from it
+    assert CourseDB(tmp_path / 'courses.sqlite3').get('durness')[0]['description'] == 'From a script'
+    assert json.loads(path.read_text(encoding='utf-8'))[2]['description'] == 'From a script'
+    assert open_course_store(path, 'sqlite').get('durness')['description'] == 'From a script'
@@ -0,0 +1,18 @@
+import pytest
+
+from course_query import QueryError, parse_query
+
+
+@pytest.mark.parametrize('raw,expected', [('name', ('name', False)), ('-rating', ('rating', True))])
+def test_sort_takes_one_leading_minus(raw, expected):
+    assert parse_query({'sort': raw})['sort'] == expected
+
+
+@pytest.mark.parametrize('raw', ['--name', '-', '-+name', 'blurb'])
+def test_malformed_sort_is_rejected(raw):
+    with pytest.raises(QueryError):
+        parse_query({'sort': raw})
+
+
+def test_malformed_sort_is_a_400(client):
+    assert client.get('/api/courses?sort=--name').status_code == 400
@@ -0,0 +1,132 @@
+import json
+
+import pytest
+
+from conftest import SAMPLE_COURSES, write_courses
+import course_snapshot
+from course_snapshot import (CourseSnapshot, SnapshotCourses, SnapshotCourseStore, SnapshotReader, file_signature,
+                             write_snapshot)
+from test_course_db import make_catalog
+from test_course_table import ODD_COURSES
+
+
+@pytest.mark.parametrize('courses', [SAMPLE_COURSES, ODD_COURSES, make_catalog(200)])
+def test_snapshot_round_trips_every_course_exactly(tmp_path, courses):
+    path = tmp_path / 'courses.snapshot'
+    assert write_snapshot(courses, path, source=[1, 2, 3]) == len(courses)
+    snapshot = CourseSnapshot(path)
+    assert snapshot.source == [1, 2, 3]
+    assert json.dumps(snapshot.to_list()) == json.dumps(courses)
+    assert json.dumps([snapshot.row(i) for i in range(len(snapshot))]) == json.dumps(courses)
+    for course in courses:
+        assert snapshot.get(course['id']) == course
+    assert snapshot.get('zzz') is None
+
+
+def test_reader_reopens_a_swapped_snapshot(tmp_path):
+    path = tmp_path / 'courses.snapshot'
+    write_snapshot(SAMPLE_COURSES, path)
+    reader = SnapshotReader(path)
+    old = reader.current()
+    write_snapshot(SAMPLE_COURSES[:1], path)
+    assert len(reader.current()) == 1
+    assert len(old) == 3  # the old mapping stays readable
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    path = tmp_path / 'courses.json'
+    write_courses(path)
+    return path, tmp_path / 'courses.snapshot'
+
+
+def open_store(catalog, **kwargs):
+    path, snapshot = catalog
+    return SnapshotCourseStore(path, snapshot, flush_delay=3600, max_flush_delay=3600, **kwargs)
+
+
+def test_store_writes_a_snapshot_then_loads_from_it(catalog, monkeypatch):
+    path, snapshot = catalog
+    assert list(open_store(catalog).all()) == SAMPLE_COURSES
+    assert CourseSnapshot(snapshot).source == file_signature(path)
+
+    monkeypatch.setattr(json, 'load', lambda f: pytest.fail('parsed courses.json despite a fresh snapshot'))
+    assert list(open_store(catalog).all()) == SAMPLE_COURSES
+
+
+def test_stale_snapshot_is_ignored_and_rebuilt(catalog):
+    path, snapshot = catalog
+    open_store(catalog).all()
+    write_courses(path, SAMPLE_COURSES[:2])  # a script rewrote courses.json
+    store = open_store(catalog)
+    assert [c['id'] for c in store.all()] == ['pebble-beach', 'chantilly']
+    assert CourseSnapshot(snapshot).source == file_signature(path)
+    assert len(CourseSnapshot(snapshot)) == 2
+
+
+def test_compaction_rebuilds_the_snapshot(catalog):
+    path, snapshot = catalog
+    store = open_store(catalog, compact_after=2)
+    store.update('durness', {'description': 'First'})
+    # Only logged so far: courses.json and its snapshot are untouched
+    assert CourseSnapshot(snapshot).source == file_signature(path)
+    assert CourseSnapshot(snapshot).get('durness')['description'] == SAMPLE_COURSES[2]['description']
+
+    store.update('durness', {'description': 'Compacted'})
+    assert CourseSnapshot(snapshot).source == file_signature(path)
+    assert CourseSnapshot(snapshot).get('durness')['description'] == 'Compacted'
+    assert open_store(catalog).course_version('durness') == 2
+
+
+def test_logged_edits_are_replayed_over_the_snapshot(catalog):
+    path, snapshot = catalog
+    open_store(catalog).update('durness', {'description': 'Logged only'})
+    # A restart loads the still-fresh snapshot, replays the log, and writes both out
+    store = open_store(catalog)
+    assert store.get('durness')['description'] == 'Logged only'
+    assert store.course_version('durness') == 1
+    assert CourseSnapshot(snapshot).source == file_signature(path)
+    assert CourseSnapshot(snapshot).get('durness')['description'] == 'Logged only'
+
+
+def test_a_corrupt_snapshot_falls_back_to_json(catalog, capsys):
+    path, snapshot = catalog
+    open_store(catalog).all()
+    data = bytearray(snapshot.read_bytes())
+    data[:8] = b'garbage!'
+    snapshot.write_bytes(bytes(data))
+    assert list(open_store(catalog).all()) == SAMPLE_COURSES
+    assert 'Ignoring snapshot' in capsys.readouterr().out
+
+
+def test_courses_are_served_from_the_mapping_until_written(catalog):
+    open_store(catalog).all()
+    store = open_store(catalog)
+    courses = store.all()
+    assert isinstance(courses, SnapshotCourses)
+    assert store.get('chantilly') == SAMPLE_COURSES[1]
+    assert courses[-1] == SAMPLE_COURSES[2]
+    assert courses._edited == {}
+
+    course, version = store.update('durness', {'description': 'Edited'})
+    assert (course['description'], version) == ('Edited', 1)
+    assert list(courses._edited) == [2]
+    assert store.get('durness') is course
+    assert [c['description'] for c in store.all()][1:] == [SAMPLE_COURSES[1]['description'], 'Edited']
+
+
+def test_snapshot_is_written_outside_the_store_lock(catalog, monkeypatch):
+    store = open_store(catalog, compact_after=1)
+    writes = []
+
+    def write(courses, path, source=None):
+        writes.append(store._lock.locked())
+        return write_snapshot(courses, path, source)
+
+    monkeypatch.setattr(course_snapshot, 'write_snapshot', write)
+    store.all()
+    store.update('durness', {'description': 'Compacted'})
+    assert writes == [False, False]
+    # Serving from the new snapshot again: the edit no longer needs a private copy
+    assert isinstance(store.all(), SnapshotCourses) and store.all()._edited == {}
+    assert store.get('durness')['description'] == 'Compacted'
@@ -0,0 +1,161 @@
+import json
+
+import pytest
+
+from conftest import SAMPLE_COURSES, write_courses
+from course_store import CourseStore, PatchError, VersionConflict
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / 'courses.json'
+    write_courses(path)
+    return path
+
+
+def open_store(path, **kwargs):
+    # No timer-driven compaction; tests compact explicitly
+    kwargs.setdefault('flush_delay', 3600)
+    kwargs.setdefault('max_flush_delay', 3600)
+    return CourseStore(path, **kwargs)
+
+
+def wal_lines(path):
+    return (path.parent / 'courses.json.wal').read_text(encoding='utf-8').splitlines()
+
+
+def test_edits_are_logged_and_replayed_after_a_crash(path):
+    store = open_store(path)
+    store.update('durness', {'description': 'Edited'})
+    store.update('durness', {'blurb': ['One', 'Two']})
+    assert len(wal_lines(path)) == 2
+    assert json.loads(path.read_text(encoding='utf-8'))[2]['description'] != 'Edited'
+
+    # A second process (or a restart) replays the log over the unchanged courses.json
+    reopened = open_store(path)
+    course = reopened.get('durness')
+    assert course['description'] == 'Edited'
+    assert course['blurb'] == ['One', 'Two']
+    assert reopened.course_version('durness') == 2
+
+
+def test_a_torn_final_record_is_ignored(path):
+    store = open_store(path)
+    store.update('chantilly', {'description': 'Kept'})
+    with open(path.parent / 'courses.json.wal', 'a', encoding='utf-8') as f:
+        f.write('{"id": "chantilly", "version": 2, "set": {"descr')
+    reopened = open_store(path)
+    assert reopened.get('chantilly')['description'] == 'Kept'
+    assert reopened.course_version('chantilly') == 1
+
+
+def test_compaction_rewrites_the_catalog_and_keeps_versions(path):
+    store = open_store(path, compact_after=3)
+    for i in range(3):
+        store.update('pebble-beach', {'description': f'Edit {i}'})
+    # The third edit reached compact_after: courses.json holds it, the log only the versions
+    on_disk = json.loads(path.read_text(encoding='utf-8'))
+    assert on_disk[0]['description'] == 'Edit 2'
+    assert list(on_disk[0]) == list(SAMPLE_COURSES[0])  # key order preserved
+    assert [json.loads(line) for line in wal_lines(path)] == [{'versions': {'pebble-beach': 3}}]
+    assert open_store(path).course_version('pebble-beach') == 3
+
+
+def test_stale_version_raises_conflict(path):
+    store = open_store(path)
+    _, version = store.update('durness', {'description': 'First'}, expected_version=0)
+    assert version == 1
+    with pytest.raises(VersionConflict):
+        store.update('durness', {'description': 'Lost update'}, expected_version=0)
+    assert store.get('durness')['description'] == 'First'
+
+
+def test_batch_is_all_or_nothing(path):
+    store = open_store(path)
+    patches = [
+        ('pebble-beach', [{'op': 'replace', 'path': '/description', 'value': 'Applied?'}], None),
+        ('chantilly', [{'op': 'replace', 'path': '/blurb/5', 'value': 'out of range'}], None),
+    ]
+    with pytest.raises(PatchError):
+        store.patch(patches, allowed=('blurb', 'description'))
+    with pytest.raises(KeyError):
+        store.patch([patches[0], ('no-such-course', [], None)])
+    with pytest.raises(VersionConflict):
+        store.patch([patches[0], ('chantilly', [], 7)])
+    assert store.get('pebble-beach')['description'] == SAMPLE_COURSES[0]['description']
+    assert store.course_version('pebble-beach') == 0
+    assert not (path.parent / 'courses.json.wal').exists()
+
+    results = store.patch([
+        ('pebble-beach', [{'op': 'replace', 'path': '/blurb/0', 'value': 'New first line'}], 0),
+        ('chantilly', [{'op': 'add', 'path': '/blurb/-', 'value': 'Appended'}], None),
+    ], allowed=('blurb',))
+    assert [version for _, version in results] == [1, 1]
+    assert len(wal_lines(path)) == 2
+    assert store.get('chantilly')['blurb'][-1] == 'Appended'
+
+
+def test_edits_that_change_nothing_are_not_logged(path):
+    store = open_store(path)
+    store.refresh()
+    version = store.version
+    course, course_version = store.update('durness', {'description': SAMPLE_COURSES[2]['description']})
+    assert course is store.get('durness')
+    assert course_version == 0
+    assert store.version == version
+    assert not (path.parent / 'courses.json.wal').exists()
+
+    # Same value, different JSON type: a real change
+    _, course_version = store.update('durness', {'yardage': 6674.0})
+    assert course_version == 1
+    assert len(wal_lines(path)) == 1
+
+
+def test_edits_logged_by_another_process_are_seen(path):
+    first, second = open_store(path), open_store(path)
+    first.refresh()
+    second.update('durness', {'description': 'From the other worker'})
+
+    with pytest.raises(VersionConflict):
+        first.update('durness', {'description': 'Based on version 0'}, expected_version=0)
+    assert first.get('durness')['description'] == 'From the other worker'
+    assert first.course_version('durness') == 1
+    first.save()
+    assert json.loads(path.read_text(encoding='utf-8'))[2]['description'] == 'From the other worker'
+    assert open_store(path).course_version('durness') == 1
+
+
+def test_debounced_compaction_keeps_edits_logged_by_another_process(path):
+    first, second = open_store(path), open_store(path)
+    first.update('pebble-beach', {'description': 'From the first worker'})
+    second.update('chantilly', {'description': 'From the second worker'})
+    second._flush()
+    on_disk = {c['id']: c for c in json.loads(path.read_text(encoding='utf-8'))}
+    assert on_disk['pebble-beach']['description'] == 'From the first worker'
+    assert on_disk['chantilly']['description'] == 'From the second worker'
+
+    # The first worker appends to the log the second one replaced, then compacts in turn
+    first.update('durness', {'description': 'After the compaction'})
+    first._flush()
+    on_disk = {c['id']: c for c in json.loads(path.read_text(encoding='utf-8'))}
+    assert [on_disk[course_id]['description'] for course_id in ('pebble-beach', 'chantilly', 'durness')] == [
+        'From the first worker', 'From the second worker', 'After the compaction']
+    reopened = open_store(path)
+    assert [reopened.course_version(c) for c in ('pebble-beach', 'chantilly', 'durness')] == [1, 1, 1]
+
+
+def test_update_course_endpoint(client, app_module):
+    response = client.post('/api/update-course/durness', json={'name': 'Not editable'})
+    assert response.status_code == 400
+
+    version = app_module.course_store.course_version('durness')
+    unchanged = client.post('/api/update-course/durness', json={'description': app_module.course_store.get('durness')['description']})
+    assert unchanged.get_json()['version'] == version
+
+    edited = client.post('/api/update-course/durness', json={'description': 'Windswept', 'version': version})
+    assert edited.status_code == 200
+    assert edited.get_json()['version'] == version + 1
+    stale = client.post('/api/update-course/durness', json={'description': 'Stale', 'version': version})
+    assert stale.status_code == 409
+    assert app_module.course_store.get('durness')['description'] == 'Windswept'
+    assert client.post('/api/update-course/nowhere', json={'description': 'x'}).status_code == 404
@@ -0,0 +1,30 @@
+import json
+
+import pytest
+
+from conftest import SAMPLE_COURSES
+from course_table import CourseTable
+from test_course_db import make_catalog
+
+# Mixed types in one column, nested values, unicode, key orders that differ per row
+ODD_COURSES = SAMPLE_COURSES + [
+    {'name': 'No id first', 'id': 'odd-1', 'rating': '4.5', 'yardage': 2**40, 'tags': ['a', {'b': None}]},
+    {'id': 'odd-2', 'rating': None, 'isStudio': False, 'blurb': [], 'location': 'Sankt Moritz – Engadin'},
+]
+
+
+@pytest.mark.parametrize('courses', [SAMPLE_COURSES, ODD_COURSES, make_catalog(200)])
+def test_table_round_trips_every_course_exactly(courses):
+    table = CourseTable(courses)
+    expected = json.dumps(courses)
+    assert json.dumps(table.to_list()) == expected  # same key order and JSON types
+    assert json.dumps(list(table.rows())) == expected
+    assert table.get(courses[-1]['id']) == courses[-1]
+    assert table.get('missing') is None
+
+
+def test_to_list_returns_independent_copies():
+    table = CourseTable(SAMPLE_COURSES)
+    first = table.to_list()
+    first[2]['igolfFeatures']['accuracy'] = 'changed'
+    assert table.to_list()[2]['igolfFeatures']['accuracy'] == '+/-5m'
@@ -0,0 +1,63 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from http_client import HttpClient, make_adapter, make_retry
+from rate_limit import RateLimiter
+
+
+class CountingLimiter(RateLimiter):
+    def __init__(self):
+        super().__init__(global_rate=1000, global_burst=1000, host_rate=1000, host_burst=1000)
+        self.hosts = []
+
+    def acquire_host(self, host):
+        self.hosts.append(host)
+        super().acquire_host(host)
+
+
+@pytest.fixture
+def server():
+    """Answers 503 to the first two requests on a path, then 200"""
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            status = 503 if hits.count(self.path) <= 2 else 200
+            self.send_response(status)
+            self.send_header('Content-Length', '2')
+            self.end_headers()
+            self.wfile.write(b'ok')
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_port}', hits
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_every_retry_attempt_takes_a_token(server):
+    base, hits = server
+    limiter = CountingLimiter()
+    adapter = make_adapter(retry=make_retry(retries=2, backoff=0, rate_limiter=limiter), rate_limiter=limiter)
+    client = HttpClient(adapter=adapter)
+    response = client.get(f'{base}/flaky')
+    assert response.status_code == 200
+    assert len(hits) == 3
+    assert limiter.hosts == ['127.0.0.1'] * 3
+    client.close()
+
+
+def test_a_request_that_is_not_retried_takes_one_token(server):
+    base, hits = server
+    limiter = CountingLimiter()
+    client = HttpClient(adapter=make_adapter(retry=make_retry(retries=0, rate_limiter=limiter), rate_limiter=limiter))
+    assert client.get(f'{base}/once').status_code == 503
+    assert limiter.hosts == ['127.0.0.1']
+    client.close()
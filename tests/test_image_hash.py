@@ -0,0 +1,35 @@
+import random
+
+from image_hash import BKTree, hamming
+
+
+def brute_force(entries, value, max_distance):
+    return sorted((hamming(value, h), h) for h in entries if hamming(value, h) <= max_distance)
+
+
+def test_search_matches_brute_force_hamming_distances():
+    rng = random.Random(7)
+    base = [rng.getrandbits(64) for _ in range(20)]
+    # Clusters of near copies, so small radii have something to find
+    entries = sorted({h ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64)) for h in base for _ in range(10)} | set(base))
+    tree = BKTree()
+    for h in entries:
+        tree.add(h, f'{h:016x}')
+    assert len(tree) == len(entries)
+    for value in base[:5] + [rng.getrandbits(64)]:
+        for max_distance in (0, 2, 4, 10, 64):
+            found = sorted((distance, h) for distance, h, _ in tree.search(value, max_distance))
+            assert found == brute_force(entries, value, max_distance)
+
+
+def test_remove_and_rebuild_keep_search_exact():
+    tree = BKTree()
+    values = [0, 0b1, 0b11, 0b111, 0xFF, 0xFFFF]
+    for i, value in enumerate(values):
+        tree.add(value, i)
+    tree.add(0b1, 'shared')
+    for i in range(4):
+        tree.remove(values[i], i)  # forces a rebuild once most nodes are empty
+    assert len(tree) == 3
+    assert sorted((d, h, tuple(sorted(map(str, items)))) for d, h, items in tree.search(0, 8)) == [
+        (1, 0b1, ('shared',)), (8, 0xFF, ('4',))]
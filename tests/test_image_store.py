@@ -0,0 +1,36 @@
+import hashlib
+
+from image_store import ImageStore
+
+
+def test_old_style_files_are_only_imported_on_request(tmp_path):
+    (tmp_path / 'durness_hero.jpg').write_bytes(b'hero bytes')
+    (tmp_path / 'durness_1.jpg').write_bytes(b'hero bytes')  # same content: one blob
+    store = ImageStore(tmp_path)
+    assert store.find('durness') == {'hero': None, '1': None, '2': None}
+    assert set(store.legacy_files()) == {('durness', 'hero'), ('durness', '1')}
+
+    count, deleted = store.import_files()
+    assert (count, deleted) == (2, [])
+    assert store.legacy_files() == {}
+    md5 = hashlib.md5(b'hero bytes').hexdigest()
+    hero, _ = store.find('durness')['hero']
+    assert hero.name == f'{md5}.jpg'
+    assert hero.read_bytes() == b'hero bytes'
+    assert store.find('durness')['1'][0] == hero
+    assert list(store.blobs()) == [hero.name]
+
+
+def test_table_changes_by_another_process_are_picked_up(tmp_path):
+    first, second = ImageStore(tmp_path), ImageStore(tmp_path)
+    upload = tmp_path / 'upload.jpg'
+    upload.write_bytes(b'new image')
+    blob, _ = first.put('chantilly', 'hero', str(upload), hashlib.md5(b'new image').hexdigest(), '.jpg')
+    version = second.version
+    assert second.find('chantilly')['hero'][0] == first.blob_path(blob)
+
+    # A write through the stale-looking instance keeps the other process's slot
+    second.swap('chantilly', 'hero', '1')
+    assert first.find('chantilly')['1'][0] == first.blob_path(blob)
+    assert first.find('chantilly')['hero'] is None
+    assert second.version > version
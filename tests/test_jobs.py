@@ -0,0 +1,148 @@
+import json
+import threading
+import time
+
+import pytest
+
+from jobs import Job, JobManager, process_items
+
+
+def wait_finished(job, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not job.finished:
+        assert time.monotonic() < deadline, f'job still {job.status}'
+        time.sleep(0.01)
+
+
+def counting_handler(items, calls, gate=None, fail=()):
+    def work(item):
+        if gate is not None:
+            gate.wait(10)
+        calls.append(item)
+        if item in fail:
+            raise ValueError(f'no image for {item}')
+        return {'id': item, 'success': True}
+
+    def handler(job):
+        job.set_total(len(items))
+        process_items(job, items, item_id=str, work=work,
+                      is_success=lambda result: result['success'], workers=2)
+    return handler
+
+
+def crashed_job(state_dir, kind, done):
+    """Leave the files a process that died mid-job would leave: status running, some items checkpointed"""
+    manager = JobManager(str(state_dir))
+    job = Job(manager, kind)
+    job.status = 'running'
+    job.save()
+    for item in done:
+        job.record(item, {'id': item, 'success': True})
+    return job.id
+
+
+def test_records_append_without_rewriting_state(tmp_path, monkeypatch):
+    manager = JobManager(str(tmp_path))
+    job = Job(manager, 'count')
+    job.save()
+    persisted = []
+    monkeypatch.setattr(manager, '_persist', lambda job: persisted.append(job.id))
+    for i in range(100):
+        job.record(str(i), {'id': str(i)}, success=i % 2 == 0)
+    assert persisted == []
+    with open(tmp_path / f'{job.id}.checkpoint.jsonl', encoding='utf-8') as f:
+        assert len(f.readlines()) == 100
+
+
+def test_resume_after_restart_skips_checkpointed_items(tmp_path):
+    items = [str(i) for i in range(6)]
+    job_id = crashed_job(tmp_path, 'count', items[:3])
+    with open(tmp_path / f'{job_id}.checkpoint.jsonl', 'a', encoding='utf-8') as f:
+        f.write('{"id": "3", "o')  # torn append from the crash; item 3 was never acknowledged
+
+    manager = JobManager(str(tmp_path))
+    assert manager.get(job_id).status == 'interrupted'
+    assert manager.get(job_id).processed == 3
+    calls = []
+    manager.register('count', counting_handler(items, calls))
+    [job] = manager.resume_interrupted()
+    wait_finished(job)
+
+    assert sorted(calls) == items[3:]
+    assert job.status == 'completed'
+    assert (job.processed, job.succeeded, job.result_count) == (6, 6, 6)
+    assert sorted(r['id'] for r in job.read_results()) == items
+    reloaded = JobManager(str(tmp_path)).get(job_id)
+    assert (reloaded.status, reloaded.processed, reloaded.done_ids) == ('completed', 6, set(items))
+
+
+def test_resume_is_guarded_against_double_start(tmp_path):
+    items = [str(i) for i in range(4)]
+    job_id = crashed_job(tmp_path, 'count', [])
+    gate = threading.Event()
+    calls = []
+    first, second = JobManager(str(tmp_path)), JobManager(str(tmp_path))
+    for manager in (first, second):
+        manager.register('count', counting_handler(items, calls, gate))
+    try:
+        assert [job.id for job in first.resume_interrupted()] == [job_id]
+        assert first.resume_interrupted() == []
+        assert second.resume_interrupted() == []
+    finally:
+        gate.set()
+    wait_finished(first.get(job_id))
+    assert sorted(calls) == items
+
+
+def test_failing_item_is_recorded_and_job_continues(tmp_path):
+    items = [str(i) for i in range(5)]
+    calls = []
+    manager = JobManager(str(tmp_path))
+    manager.register('count', counting_handler(items, calls, fail={'2'}))
+    job = manager.submit('count')
+    wait_finished(job)
+
+    assert job.status == 'completed'
+    assert (job.processed, job.succeeded) == (5, 4)
+    [failure] = [r for r in job.read_results() if 'error' in r]
+    assert failure == {'id': '2', 'error': 'no image for 2'}
+
+
+def test_legacy_checkpoint_in_state_is_migrated(tmp_path):
+    state = {'id': 'old', 'kind': 'count', 'status': 'running', 'processed': 2, 'succeeded': 1,
+             'checkpoint': ['0', '1']}
+    (tmp_path / 'old.json').write_text(json.dumps(state), encoding='utf-8')
+    job = JobManager(str(tmp_path)).get('old')
+    assert (job.processed, job.succeeded, job.done_ids) == (2, 1, {'0', '1'})
+    job = JobManager(str(tmp_path)).get('old')
+    assert (job.processed, job.succeeded, job.done_ids) == (2, 1, {'0', '1'})
+
+
+def test_unknown_job_kind(tmp_path):
+    with pytest.raises(KeyError):
+        JobManager(str(tmp_path)).submit('nope')
+
+
+def test_jobs_are_shared_between_worker_processes(tmp_path):
+    items = [str(i) for i in range(4)]
+    gate = threading.Event()
+    calls = []
+    first, second = JobManager(str(tmp_path)), JobManager(str(tmp_path))
+    for manager in (first, second):
+        manager.register('count', counting_handler(items, calls, gate))
+    try:
+        job = first.submit('count')
+        assert second.submit('count').id == job.id
+        seen = second.get(job.id)
+        assert seen is not None and seen.status in ('queued', 'running')
+        assert second.cancel(job.id) is seen
+    finally:
+        gate.set()
+    wait_finished(job)
+    assert job.status == 'cancelled'
+    assert second.get(job.id).status == 'cancelled'
+    assert [(event, s) for event, s, _ in seen.follow(after=job.result_count)] == [('done', None)]
+    assert not (tmp_path / f'{job.id}.cancel').exists()
+    rerun = second.submit('count')
+    assert rerun.id != job.id
+    wait_finished(rerun)
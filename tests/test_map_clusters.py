@@ -0,0 +1,12 @@
+import pytest
+
+
+def test_clusters_for_the_whole_world(client):
+    response = client.get('/api/map/clusters?bbox=-180,-90,180,90&zoom=0')
+    assert response.status_code == 200
+    assert sum(cluster['count'] for cluster in response.get_json()['clusters']) == 2
+
+
+@pytest.mark.parametrize('bbox', ['nan,0,10,10', '0,-inf,10,10', '0,0,inf,10', '0,0,10,NaN', '0,20,10,10', '0,0,10'])
+def test_bad_bbox_is_a_400(client, bbox):
+    assert client.get(f'/api/map/clusters?bbox={bbox}&zoom=3').status_code == 400
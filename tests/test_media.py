@@ -0,0 +1,98 @@
+import hashlib
+import io
+
+import pytest
+from flask import Flask
+from PIL import Image
+
+from media_files import IMMUTABLE, REVALIDATE, FileHasher, send_media
+
+PAYLOAD = bytes(range(256)) * 40  # 10240 bytes
+
+
+@pytest.fixture
+def media(tmp_path):
+    """A tiny app serving one file through send_media"""
+    path = tmp_path / 'clip.mp4'
+    path.write_bytes(PAYLOAD)
+    app = Flask(__name__)
+    hasher = FileHasher()
+
+    @app.route('/clip')
+    def clip():
+        return send_media(path, hasher, REVALIDATE)
+
+    return app.test_client(), path
+
+
+def test_etag_is_the_content_digest_and_revalidates_with_304(media):
+    client, path = media
+    first = client.get('/clip')
+    assert first.status_code == 200
+    assert first.data == PAYLOAD
+    assert first.headers['Cache-Control'] == REVALIDATE
+    etag = first.headers['ETag']
+    assert etag == f'"{hashlib.blake2b(PAYLOAD, digest_size=16).hexdigest()}"'
+    assert client.get('/clip', headers={'If-None-Match': etag}).status_code == 304
+
+    # Touching the file does not change the validator; changing the bytes does
+    path.write_bytes(PAYLOAD)
+    assert client.get('/clip', headers={'If-None-Match': etag}).status_code == 304
+    path.write_bytes(PAYLOAD[::-1])
+    changed = client.get('/clip', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+
+
+def test_range_returns_206_with_only_those_bytes(media):
+    client, _ = media
+    response = client.get('/clip', headers={'Range': 'bytes=100-199'})
+    assert response.status_code == 206
+    assert response.data == PAYLOAD[100:200]
+    assert response.headers['Content-Range'] == f'bytes 100-199/{len(PAYLOAD)}'
+    assert response.headers['Accept-Ranges'] == 'bytes'
+
+    suffix = client.get('/clip', headers={'Range': 'bytes=-10'})
+    assert suffix.status_code == 206
+    assert suffix.data == PAYLOAD[-10:]
+
+
+def test_unsatisfiable_range_returns_416(media):
+    client, _ = media
+    response = client.get('/clip', headers={'Range': f'bytes={len(PAYLOAD) + 10}-'})
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(PAYLOAD)}'
+
+
+def test_if_range_with_a_stale_etag_sends_the_whole_file(media):
+    client, _ = media
+    response = client.get('/clip', headers={'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+    assert response.status_code == 200
+    assert response.data == PAYLOAD
+
+
+def test_course_list_revalidates_with_304(client):
+    first = client.get('/api/courses')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert client.get('/api/courses', headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_blobs_are_immutable_and_named_by_their_md5(client, app_module, tmp_path):
+    buffer = io.BytesIO()
+    Image.new('RGB', (4, 4), (200, 30, 30)).save(buffer, 'PNG')
+    data = buffer.getvalue()
+    md5 = hashlib.md5(data).hexdigest()
+    tmp = tmp_path / 'upload.png'
+    tmp.write_bytes(data)
+    blob, _ = app_module.image_store.put('durness', 'hero', str(tmp), md5, '.png')
+    try:
+        response = client.get(f'/api/blobs/{blob}')
+        assert response.status_code == 200
+        assert response.data == data
+        assert response.headers['Cache-Control'] == IMMUTABLE
+        assert response.headers['ETag'] == f'"{md5}"'
+        assert client.get(f'/api/blobs/{blob}', headers={'If-None-Match': f'"{md5}"'}).status_code == 304
+        assert client.get('/api/blobs/' + '0' * 32 + '.png').status_code == 404
+    finally:
+        app_module.release_blobs(app_module.image_store.clear('durness', 'hero'))
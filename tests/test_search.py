@@ -0,0 +1,51 @@
+import search_index
+
+
+def test_accent_folding_and_prefix():
+    index = search_index.SearchIndex()
+    index.build([
+        {'id': 'a', 'name': 'Château Golf'},
+        {'id': 'b', 'name': 'Vallière Links'},
+    ])
+    assert [doc for doc, _ in index.search('chateau')] == ['a']
+    assert [doc for doc, _ in index.search('vall')] == ['b']
+    assert index.search('vall', prefix=False) == []
+
+
+def count_builds(app_module, monkeypatch):
+    builds = []
+
+    class CountingIndex(search_index.SearchIndex):
+        def __init__(self, *args, **kwargs):
+            builds.append(1)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(app_module, 'SearchIndex', CountingIndex)
+    return builds
+
+
+def search_ids(client, query):
+    return [r['id'] for r in client.get('/api/search', query_string={'q': query}).get_json()['results']]
+
+
+def test_edit_patches_the_existing_index(app_module, client, monkeypatch):
+    client.get('/api/search?q=golf')  # make sure an index is built and current
+    builds = count_builds(app_module, monkeypatch)
+
+    response = client.post('/api/update-course/durness', json={'blurb': ['Wild clifftop zyzzogeton links']})
+    assert response.status_code == 200
+    assert search_ids(client, 'zyzzogeton') == ['durness']
+    assert builds == []
+
+
+def test_batch_edit_patches_the_existing_index(app_module, client, monkeypatch):
+    client.get('/api/search?q=golf')
+    builds = count_builds(app_module, monkeypatch)
+
+    response = client.post('/api/update-courses', json=[
+        {'id': 'chantilly', 'op': 'replace', 'path': '/blurb/0', 'value': 'Quixotic heather'},
+        {'id': 'pebble-beach', 'op': 'add', 'path': '/blurb/-', 'value': 'Quixotic cliffs'},
+    ])
+    assert response.status_code == 200
+    assert sorted(search_ids(client, 'quixotic')) == ['chantilly', 'pebble-beach']
+    assert builds == []
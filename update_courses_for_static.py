@@ -2,16 +2,25 @@
 """
 Script to update courses.json with static image paths for GitHub Pages hosting.
 This replicates the backend logic that adds image paths dynamically.
+
+GitHub Pages cannot negotiate on the Accept header, so modern-format copies
+(AVIF where Pillow supports it, WebP) of every slot image are written to
+public/images/modern/ and listed per slot under images.formats; the
+frontend offers them through <picture> sources and the browser picks the
+best one it supports.
 """
 
 import json
 import os
 from pathlib import Path
 
+from image_variants import MODERN_FORMATS, OUTPUT_FORMATS, transcode
+
 BASE_DIR = Path(__file__).parent
 COURSES_FILE = BASE_DIR / 'courses.json'
 PUBLIC_COURSES_FILE = BASE_DIR / 'public' / 'courses.json'
 IMAGES_DIR = BASE_DIR / 'public' / 'images'
+MODERN_DIR = IMAGES_DIR / 'modern'
 
 def find_image_paths(course_id):
     """
@@ -31,6 +40,32 @@ def find_image_paths(course_id):
     
     return images
 
+def modern_formats(filename):
+    """
+    Write modern-format copies of a public image (re-encoding only when the
+    source is newer) and return the formats that are available and smaller
+    """
+    source = IMAGES_DIR / filename
+    stem, ext = os.path.splitext(filename)
+    if ext == '.gif':
+        return []  # keep animations intact
+    available = []
+    for fmt in MODERN_FORMATS:
+        _, fmt_ext, _ = OUTPUT_FORMATS[fmt]
+        if fmt_ext == ext:
+            continue
+        dest = MODERN_DIR / f"{stem}{fmt_ext}"
+        try:
+            if dest.exists() and dest.stat().st_mtime >= source.stat().st_mtime:
+                available.append(fmt.lower())
+            elif transcode(source, dest, fmt):
+                available.append(fmt.lower())
+            elif dest.exists():
+                dest.unlink()  # stale copy of an older, now-replaced image
+        except Exception as e:
+            print(f"Could not transcode {filename} to {fmt}: {e}")
+    return available
+
 def load_descriptions():
     """Load course descriptions from JSON file if it exists"""
     descriptions_file = BASE_DIR / 'course_descriptions.json'
@@ -48,6 +83,7 @@ def main():
         courses = json.load(f)
     
     descriptions = load_descriptions()
+    MODERN_DIR.mkdir(parents=True, exist_ok=True)
     
     # Process each course
     for course in courses:
@@ -61,17 +97,21 @@ def main():
             'hero': None,
             'additional': []
         }
+        # Modern formats available in images/modern/ for each image URL
+        formats = {}
         
         # Hero image
         if image_paths['hero']:
             filename, ext = image_paths['hero']
             images['hero'] = f"/images/{filename}"
+            formats[images['hero']] = modern_formats(filename)
         
         # Additional images from file system (slot 1 and 2)
         for slot in ['1', '2']:
             if image_paths[slot]:
                 filename, ext = image_paths[slot]
                 images['additional'].append(f"/images/{filename}")
+                formats[images['additional'][-1]] = modern_formats(filename)
         
         # Preserve any existing additional images that aren't from file system slots
         # (e.g., gameplay images that were manually added)
@@ -85,6 +125,10 @@ def main():
                         if not any(f"_{slot}" in existing_img for slot in ['1', '2']):
                             images['additional'].append(existing_img)
         
+        images['formats'] = {
+            'hero': formats.get(images['hero'], []),
+            'additional': [formats.get(img, []) for img in images['additional']],
+        }
         course['images'] = images
         
         # Preserve blurb for igolf courses (they have single-paragraph descriptions)
@@ -101,6 +145,7 @@ def main():
             # For igolf courses, use gameplay image if imageUrl is set
             if course.get('imageUrl') and 'Courses Gameplay' in course.get('imageUrl', ''):
                 images['hero'] = course['imageUrl']  # Set images.hero to gameplay image
+                images['formats']['hero'] = []
                 course['images'] = images  # Update images object
             # Preserve existing imageUrl if set (e.g., gameplay image)
             if 'imageUrl' not in course or not course.get('imageUrl'):